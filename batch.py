@@ -0,0 +1,183 @@
+"""Batched legal moves and static evaluation of many boards with NumPy.
+
+Boards are stacked into an (N, size, size) int8 array of CODES converted
+from Field.skeleton. Every function works on the whole stack at once: rays
+are followed by shifting whole arrays along Field._DIRECTIONS, so there are
+no per-square loops in Python. Extra disks stop rays like board edges.
+
+Requires numpy. Validation against Reversi.is_correct_move and the
+benchmark against it:
+
+    python batch.py --size 8 --boards 2000
+"""
+import argparse
+from collections import namedtuple
+from random import Random
+from time import perf_counter
+import numpy as np
+from driver import Reversi, Status
+from game import Field, BitField, BLACK, WHITE, EXTRA, EMPTY
+from engine import Evaluator
+
+CODES = {EMPTY: 0, BLACK: 1, WHITE: 2, EXTRA: 3}
+
+Analysis = namedtuple("Analysis", "moves flips scores")
+
+_LOOKUP = np.zeros(256, dtype=np.int8)
+for _char, _code in CODES.items():
+    _LOOKUP[ord(_char)] = _code
+
+
+def stack(skeletons):
+    """Convert skeletons of equal size to the (N, size, size) int8 array."""
+    size = len(skeletons[0]) if skeletons else 0
+    chars = "".join("".join(row) for skeleton in skeletons for row in skeleton).encode("ascii")
+    return _LOOKUP[np.frombuffer(chars, dtype=np.uint8)].reshape(len(skeletons), size, size)
+
+
+def unpack(masks, size):
+    """Convert bitboard masks to the (N, size, size) bool array."""
+    length = (size * size + 7) // 8
+    data = np.frombuffer(b"".join(mask.to_bytes(length, "little") for mask in masks), dtype=np.uint8)
+    squares = np.unpackbits(data.reshape(len(masks), length), axis=1, bitorder="little")
+    return squares[:, :size * size].reshape(len(masks), size, size).astype(bool)
+
+
+def from_games(games):
+    """Get boards and codes of the current players of Reversi games of one size.
+
+    Boards are built from Field.masks(), it is faster than stacking skeletons.
+    """
+    size = games[0].field.size if games else 0
+    masks = list(zip(*(game.field.masks() for game in games))) or [(), (), ()]
+    boards = np.zeros((len(games), size, size), dtype=np.int8)
+    for color, color_masks in zip((BLACK, WHITE, EXTRA), masks):
+        boards[unpack(color_masks, size)] = CODES[color]
+    return boards, np.array([CODES[game.current_player] for game in games], dtype=np.int8)
+
+
+def _colors(boards, colors):
+    """Broadcast a color or N colors to (N, 1, 1) codes of own and opponent players."""
+    own = np.asarray(CODES[colors] if isinstance(colors, str) else colors, dtype=np.int8)
+    own = np.broadcast_to(own, boards.shape[:1]).reshape(-1, 1, 1)
+    return own, CODES[BLACK] + CODES[WHITE] - own
+
+
+def flip_counts(own, opp, empty):
+    """Get (N, size, size) counts of disks flipped by moves on every square, zero where move is illegal.
+
+    Own and opponent squares are padded once, so squares at any distance in
+    any direction are views of the padded arrays instead of shifted copies.
+    """
+    size = own.shape[-1]
+    border = ((0, 0), (size - 1, size - 1), (size - 1, size - 1))
+    own, opp = np.pad(own, border), np.pad(opp, border)
+    flips = np.zeros(empty.shape, dtype=np.int16)
+    for dy, dx in Field._DIRECTIONS:
+        run = empty
+        for length in range(1, size):
+            y, x = size - 1 + length * dy, size - 1 + length * dx
+            if length > 1:
+                flips += (run & own[:, y:y + size, x:x + size]).astype(np.int16) * np.int16(length - 1)
+            run = run & opp[:, y:y + size, x:x + size]
+            if not run.any():
+                break
+    return flips
+
+
+def analyse(boards, colors, evaluator=None):
+    """Get legal moves, flip counts and static scores of boards for the players to move.
+
+    Colors is one color of all boards or an array of N codes. Moves are an
+    (N, size, size) bool array, flips are counts of flipped disks of every
+    move and scores are Evaluator scores for the player to move.
+    """
+    own_code, opp_code = _colors(boards, colors)
+    own, opp, empty = boards == own_code, boards == opp_code, boards == CODES[EMPTY]
+    flips = flip_counts(own, opp, empty)
+    moves = flips > 0
+    return Analysis(moves, flips, evaluate(own, opp, empty, moves, evaluator))
+
+
+def evaluate(own, opp, empty, moves, evaluator=None):
+    """Get (N,) Evaluator scores of (N, size, size) bool squares, moves are legal moves of the own player."""
+    evaluator = evaluator or Evaluator()
+    scores = evaluator.parity * (own.sum(axis=(1, 2), dtype=np.int32) - opp.sum(axis=(1, 2), dtype=np.int32))
+    if evaluator.corners:
+        corners = (slice(None), [0, 0, -1, -1], [0, -1, 0, -1])
+        scores += evaluator.corners * (own[corners].sum(axis=1, dtype=np.int32) -
+                                       opp[corners].sum(axis=1, dtype=np.int32))
+    if evaluator.mobility:
+        replies = flip_counts(opp, own, empty) > 0
+        scores += evaluator.mobility * (moves.sum(axis=(1, 2), dtype=np.int32) -
+                                        replies.sum(axis=(1, 2), dtype=np.int32))
+    return scores
+
+
+def positions(count, size, rnd, mode="Classic", backend=BitField):
+    """Get games in random positions, extra disks are placed sometimes in Extra mode."""
+    games = []
+    while len(games) < count:
+        game = Reversi(size, mode=mode, backend=backend)
+        for _ in range(rnd.randrange(size * size - 4)):
+            moves = game.get_correct_moves()
+            squares = [(y, x) for y in range(size) for x in range(size)
+                       if game.field[y, x] == EMPTY and (y, x) not in moves]
+            if mode == "Extra" and game.field.possibility_extra and squares and rnd.random() < 0.1:
+                result = game.try_extra(rnd.choice(squares))
+            else:
+                result = game.try_move(rnd.choice(moves))
+            if result.status is Status.GAME_OVER:
+                game.unmake_move()
+                break
+        games.append(game)
+    return games
+
+
+def validate(games, analysis):
+    """Compare analysis with is_correct_move square for square and return list of mismatches."""
+    mismatches = []
+    for n, game in enumerate(games):
+        size = game.field.size
+        for y in range(size):
+            for x in range(size):
+                flipped = game.is_correct_move((y, x))
+                count = len(flipped) if flipped else 0
+                if count != analysis.flips[n, y, x] or bool(flipped) != analysis.moves[n, y, x]:
+                    mismatches.append((n, (y, x), count, int(analysis.flips[n, y, x])))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate and benchmark batched move generation.")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--boards", type=int, default=2000)
+    parser.add_argument("--mode", choices=["Classic", "Extra"], default="Classic")
+    parser.add_argument("--backend", choices=["list", "bitboard"], default="bitboard")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    backend = Field if args.backend == "list" else BitField
+    games = positions(args.boards, args.size, Random(args.seed), args.mode, backend)
+    started = perf_counter()
+    boards, colors = from_games(games)
+    converted = perf_counter()
+    analysis = analyse(boards, colors)
+    batched = perf_counter()
+    for game in games:
+        game.reset_moves_cache()
+        for y in range(args.size):
+            for x in range(args.size):
+                game.is_correct_move((y, x))
+    single = perf_counter()
+    mismatches = validate(games, analysis)
+    print(f"{args.boards} boards {args.size}x{args.size} {args.mode}: conversion {converted - started:.3f} s, "
+          f"batch {batched - converted:.3f} s, is_correct_move {single - batched:.3f} s "
+          f"({(single - batched) / (batched - converted):.1f}x), {len(mismatches)} mismatches")
+    for mismatch in mismatches[:10]:
+        print("board {}, square {}: is_correct_move flips {}, batch flips {}".format(*mismatch))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+"""Bitboard primitives for square fields of any even size.
+
+Square (y, x) of a field with size n is bit y * n + x of a python int,
+so every size up to 30x30 works without fixed-width tricks.
+"""
+from functools import lru_cache
+
+DIRECTIONS = ((0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1))
+
+
+def index(coords, size):
+    """Get bit index of coords."""
+    return coords[0] * size + coords[1]
+
+
+def coords(index_, size):
+    """Get coords of bit index."""
+    return divmod(index_, size)
+
+
+def bits(mask):
+    """Iter trough indexes of set bits from the lowest one."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _count_bin(mask):
+    """Count set bits."""
+    return bin(mask).count('1')
+
+
+count = int.bit_count if hasattr(int, "bit_count") else _count_bin
+
+
+@lru_cache(maxsize=None)
+def full(size):
+    """Get mask with all squares of the field."""
+    return (1 << size * size) - 1
+
+
+@lru_cache(maxsize=None)
+def rays(size):
+    """Get (shift, mask) pairs for every direction.
+
+    Positive shift moves bits to the higher indexes, mask cuts bits
+    which were wrapped to the opposite edge of the field.
+    """
+    left = sum(1 << y * size for y in range(size))
+    right = left << size - 1
+    result = []
+    for dy, dx in DIRECTIONS:
+        mask = full(size)
+        if dx == 1:
+            mask &= ~left
+        elif dx == -1:
+            mask &= ~right
+        result.append((dy * size + dx, mask))
+    return tuple(result)
+
+
+def neighbours(mask, size):
+    """Get all squares adjacent to mask."""
+    result = 0
+    for shift, wrap in rays(size):
+        if shift > 0:
+            result |= (mask << shift) & wrap
+        else:
+            result |= (mask >> -shift) & wrap
+    return result
+
+
+def legal_moves(own, opp, empty, size):
+    """Get mask of squares where own player can move."""
+    moves = 0
+    for shift, wrap in rays(size):
+        if shift > 0:
+            run = (own << shift) & wrap & opp
+            while run:
+                run = (run << shift) & wrap
+                moves |= run & empty
+                run &= opp
+        else:
+            shift = -shift
+            run = (own >> shift) & wrap & opp
+            while run:
+                run = (run >> shift) & wrap
+                moves |= run & empty
+                run &= opp
+    return moves
+
+
+def flips(move, own, opp, size):
+    """Get mask of opponent disks flipped by own disk placed on move bit."""
+    result = 0
+    for shift, wrap in rays(size):
+        line = 0
+        if shift > 0:
+            cursor = (move << shift) & wrap
+            while cursor & opp:
+                line |= cursor
+                cursor = (cursor << shift) & wrap
+        else:
+            cursor = (move >> -shift) & wrap
+            while cursor & opp:
+                line |= cursor
+                cursor = (cursor >> -shift) & wrap
+        if cursor & own:
+            result |= line
+    return result
@@ -0,0 +1,227 @@
+"""Opening book.
+
+Book of the field size is a file of fixed-size records sorted by position
+hash and move. Positions are stored in the canonical form (see symmetry.py),
+so all orientations of a position share records, and moves are squares of
+the canonical form:
+
+    header: magic b"RVBK", version (u8), field size (u8), count of records (u32)
+    record: hash (u64), move square index (u16), score (i16), count (u32)
+
+Score is sum of results for the player who made the move (+1 win, -1 loss)
+and count is how many times the move was played. Lookup is a binary search
+over the mmap of the file, so opening a book costs nothing until it is used
+and only touched pages are read.
+
+Books are built offline from self-play JSON lines (see selfplay.py) or from
+game files (see gamefile.py):
+
+    python book.py --size 8 --selfplay games.jsonl --games archive.dat --plies 14
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+from collections import defaultdict
+from random import Random
+from driver import Reversi, Status
+from game import BitField, BLACK
+from exceptions import LoadError
+import bitboard
+import gamefile
+import symmetry
+
+MAGIC = b"RVBK"
+VERSION = 2
+HEADER = struct.Struct("<4sBBxxI")
+RECORD = struct.Struct("<QHhI")
+BOOK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "books")
+
+
+def book_path(size, directory=BOOK_DIR):
+    """Get path of the book of the field size."""
+    return os.path.join(directory, f"book{size}.bin")
+
+
+class Book:
+    """Memory-mapped opening book of one field size."""
+    def __init__(self, path):
+        self._path = path
+        self._file = None
+        self._map = None
+        self._count = 0
+        self._size = None
+
+    def _open(self):
+        """Map the file on the first lookup."""
+        if self._map is not None:
+            return
+        try:
+            self._file = open(self._path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as exception:
+            self.close()
+            raise LoadError(f"Can't open book {self._path}: {exception}")
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise LoadError(f"Book {self._path} is too short")
+        magic, version, self._size, self._count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or len(self._map) < HEADER.size + self._count * RECORD.size:
+            self.close()
+            raise LoadError(f"Book {self._path} is broken")
+
+    def close(self):
+        """Unmap the file."""
+        if self._map is not None:
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+        self._map = self._file = None
+
+    @property
+    def size(self):
+        """Get field size of the book."""
+        self._open()
+        return self._size
+
+    def __len__(self):
+        """Get count of records."""
+        self._open()
+        return self._count
+
+    def _key(self, index):
+        """Get hash of the record."""
+        return RECORD.unpack_from(self._map, HEADER.size + index * RECORD.size)[0]
+
+    def lookup(self, key):
+        """Get list of (coords, score, count) of the canonical position hash."""
+        self._open()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        result = []
+        while low < self._count:
+            hash_, move, score, count = RECORD.unpack_from(self._map, HEADER.size + low * RECORD.size)
+            if hash_ != key:
+                break
+            result.append((bitboard.coords(move, self._size), score, count))
+            low += 1
+        return result
+
+    def choose(self, game, rnd=None, min_count=1):
+        """Choose book move of the game with probability proportional to its count.
+
+        Moves which lose more often than win are never chosen. Returns None if
+        the position is out of book.
+        """
+        if game.field.size != self.size:
+            return None
+        moves = game.get_correct_moves()
+        key, transform = symmetry.canonical_hash(game.snapshot())
+        candidates = [(symmetry.to_original(coords, self._size, transform), count)
+                      for coords, score, count in self.lookup(key) if count >= min_count and score >= 0]
+        candidates = [(coords, count) for coords, count in candidates if coords in moves]
+        if not candidates:
+            return None
+        rnd = rnd or Random()
+        pick = rnd.uniform(0, sum(count for _, count in candidates))
+        for coords, count in candidates:
+            pick -= count
+            if pick <= 0:
+                return coords
+        return candidates[-1][0]
+
+
+_books = {}
+
+
+def for_size(size, directory=BOOK_DIR):
+    """Get book of the field size or None if there is no book file."""
+    path = book_path(size, directory)
+    if path not in _books:
+        _books[path] = Book(path) if os.path.exists(path) else None
+    return _books[path]
+
+
+def collect(entries, size, moves, plies, first_player=BLACK):
+    """Add first plies of the finished game to the entries: {(canonical hash, canonical index): [score, count]}.
+
+    Returns False if moves are wrong or the game is not finished.
+    """
+    game = Reversi(size, first_player, backend=BitField)
+    played = []
+    over = False
+    for coords in moves:
+        if len(played) < plies:
+            key, transform = symmetry.canonical_hash(game.snapshot())
+            played.append((key, bitboard.index(symmetry.transform_coords(coords, size, transform), size),
+                           game.current_player))
+        status = game.try_move(coords).status
+        if status is Status.ILLEGAL:
+            return False
+        if status is Status.GAME_OVER:
+            over = True
+            break
+    if not over:
+        return False
+    black, white = game.field.black_count, game.field.white_count
+    for key, index, player in played:
+        own, opp = (black, white) if player == BLACK else (white, black)
+        entry = entries[key, index]
+        entry[0] += (own > opp) - (own < opp)
+        entry[1] += 1
+    return True
+
+
+def write_book(path, size, entries):
+    """Write entries {(hash, index): [score, count]} as the book file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, size, len(entries)))
+        for (key, index), (score, count) in sorted(entries.items()):
+            file.write(RECORD.pack(key, index, max(-0x8000, min(0x7FFF, score)), min(count, 0xFFFFFFFF)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build Reversi opening book.")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--plies", type=int, default=14, help="count of opening moves to store")
+    parser.add_argument("--selfplay", nargs="*", default=[], help="JSON lines of selfplay.py")
+    parser.add_argument("--games", nargs="*", default=[], help="game files of gamefile.py")
+    parser.add_argument("--output", help="book file, books/book<size>.bin by default")
+    args = parser.parse_args(argv)
+
+    entries = defaultdict(lambda: [0, 0])
+    used = skipped = 0
+    for path in args.selfplay:
+        with open(path) as file:
+            for line in file:
+                record = json.loads(line)
+                if record["size"] != args.size or record["mode"] != "Classic":
+                    continue
+                moves = [tuple(move) for move in record["history"]]
+                if collect(entries, args.size, moves, args.plies):
+                    used += 1
+                else:
+                    skipped += 1
+    for path in args.games:
+        for record in gamefile.read_records(path):
+            if record.size != args.size or record.extra_count:
+                continue
+            moves = [bitboard.coords(code, args.size) for code in record.moves]
+            if collect(entries, args.size, moves, args.plies, record.first_player):
+                used += 1
+            else:
+                skipped += 1
+    output = args.output or book_path(args.size)
+    write_book(output, args.size, entries)
+    print(f"{output}: {len(entries)} records from {used} games, {skipped} games skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Game clock.
+
+Clock keeps remaining time of both players like a chess clock: press()
+charges the time since the last press to the player who was running and
+starts the next one, every press adds the increment. AI asks the clock for
+a budget of the move, it is the remaining time divided by the count of
+moves which are left (half of the empty squares), so the search never uses
+the whole clock on one move on any field size.
+"""
+from time import perf_counter
+from game import BLACK, WHITE
+
+MIN_MOVES = 4
+MAX_SHARE = 0.25
+MIN_BUDGET = 0.01
+
+
+class Clock:
+    """Remaining seconds of both players with increment per move."""
+    def __init__(self, seconds, increment=0.0):
+        self.increment = increment
+        self._remaining = {BLACK: float(seconds), WHITE: float(seconds)}
+        self._running = None
+        self._started = None
+
+    @property
+    def running(self):
+        """Get player whose time is running or None."""
+        return self._running
+
+    def remaining(self, player):
+        """Get remaining seconds of the player."""
+        remaining = self._remaining[player]
+        if player == self._running:
+            remaining -= perf_counter() - self._started
+        return remaining
+
+    def flagged(self, player):
+        """Said that the player has run out of time."""
+        return self.remaining(player) <= 0
+
+    def press(self, player=None):
+        """Charge time to the running player and start the player, None stops the clock."""
+        now = perf_counter()
+        if self._running is not None:
+            self._remaining[self._running] += self.increment - (now - self._started)
+        self._running, self._started = player, now
+
+    def budget(self, player, empties, limit=None):
+        """Get seconds for the move of the player with the empty squares count, not more than limit."""
+        remaining = self.remaining(player)
+        moves = max(MIN_MOVES, (empties + 1) // 2)
+        seconds = min(remaining / moves + self.increment, remaining * MAX_SHARE)
+        if limit is not None:
+            seconds = min(seconds, limit)
+        return max(MIN_BUDGET, seconds)
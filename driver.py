@@ -1,17 +1,67 @@
-from time import sleep
-from random import choice
+from collections import namedtuple
+from contextlib import nullcontext
+from enum import Enum
+from time import perf_counter
 from game import *
-from exceptions import GameOverException, NoMovesException, MoveError, SaveError, LoadError, HaveNotExtraException
+from engine import Engine, default_evaluator, parallel_search, timed_search
+from endgame import Solver
+from mcts import Mcts, parallel_mcts
+from position import Position
+from transposition import TranspositionTable
+import bitboard
+import zobrist
+from exceptions import GameOverException, NoMovesException, MoveError, HaveNotExtraException, SearchCancelled
+
+AI_LEVELS = {
+    "Easy": {"depth": 1},
+    "Medium": {"time": 0.3, "wld": 8},
+    "Hard": {"time": 1.0, "endgame": 10, "wld": 12},
+    "MCTS": {"mcts": 1.0, "endgame": 10, "wld": 12},
+}
+ENDGAME_SHARE = 0.5
+AI_TABLE = TranspositionTable(32 << 20)
+AI_TREE = Mcts()
+
+Move = namedtuple("Move", "coords disk flipped player")
+MoveResult = namedtuple("MoveResult", "status flips black white")
+
+
+def _untimed(name):
+    """Phase of the move which is not measured."""
+    return nullcontext()
+
+
+class Status(Enum):
+    """Status of the move result."""
+    OK = "ok"
+    PASS = "pass"
+    GAME_OVER = "game_over"
+    ILLEGAL = "illegal"
+    NO_EXTRA = "no_extra"
 
 
 class Reversi:
     """Main class which contains logic of the game."""
-    def __init__(self, size=8, player=BLACK, mode="Classic", opponent="Human", lvl=None):
-        self._field = Field(size)
+    def __init__(self, size=8, player=BLACK, mode="Classic", opponent="Human", lvl=None, backend=Field):
+        self._field = backend(size)
         self._current_player = player
         self._mode = mode
         self._opponent = opponent
         self._lvl = lvl
+        self._moves = None
+        self._history = []
+        self._redo = []
+
+    @classmethod
+    def from_snapshot(cls, position, mode="Classic", opponent="Human", lvl=None, backend=Field):
+        """Create game without history at the position, see snapshot."""
+        game = cls(position.size, position.player, mode, opponent, lvl, backend)
+        game._field = backend.from_masks(position.size, position.black, position.white, position.extra)
+        return game
+
+    def snapshot(self):
+        """Get immutable Position of the field and the current player (see position.py)."""
+        return Position(self._field.size, *self._field.masks(), self._current_player)
 
     @property
     def winner(self):
@@ -43,99 +93,251 @@ class Reversi:
         """Returns current field state of the game."""
         return self._field
 
+    @property
+    def hash(self):
+        """Returns Zobrist hash of the position with side to move."""
+        return self._field.hash ^ (zobrist.keys(self._field.size).side if self._current_player == WHITE else 0)
+
+    @property
+    def history(self):
+        """Returns made moves, the last one is the latest."""
+        return tuple(self._history)
+
+    @property
+    def first_player(self):
+        """Returns flag of the player who made the first move."""
+        return self._history[0].player if self._history else self._current_player
+
+    def _correct_moves(self):
+        """Returns cached correct moves of the current player with disks to flip."""
+        if self._moves is None:
+            self._moves = self._field.correct_moves(self._current_player)
+        return self._moves
+
+    def reset_moves_cache(self):
+        """Forget cached correct moves, they are generated again on the next request."""
+        self._moves = None
+
     def is_correct_move(self, coords):
         """Checks that move is correct and returns disks to flip if move is correct."""
-        try:
-            if self._field[coords] is not EMPTY or not self._field.in_range(coords):
-                return False
-
-            to_flip = []
-            other = self.get_opponent()
-            for dy, dx in self._field.directions:
-                y, x = coords
-                y += dy
-                x += dx
-
-                if self._field.in_range((y, x)) and self._field[y, x] == other:
-                    y += dy
-                    x += dx
-
-                    while self._field.in_range((y, x)) and self._field[y, x] == other:
-                        y += dy
-                        x += dx
-
-                    if self._field.in_range((y, x)) and self._field[y, x] == self._current_player:
-                        while (x, y) != coords:
-                            y -= dy
-                            x -= dx
-                            if (y, x) == coords:
-                                break
-                            to_flip.append((y, x))
-            return to_flip if to_flip else False
-        except IndexError:
-            return False
+        return self._correct_moves().get(tuple(coords)) or False
 
     def get_correct_moves(self):
         """Claim all possible correct moves."""
-        correct_moves = []
-        size = self._field.size
+        return list(self._correct_moves())
+
+    def get_moves_to_flip(self):
+        """Claim correct moves with disks to flip, it is {coords: flipped} which must not be changed."""
+        return self._correct_moves()
+
+    def _play(self, coords, disk, flipped):
+        """Put disk on the field, flip disks and remember it in history."""
+        for coord in flipped:
+            self._field.flip(coord)
+        self._field[coords] = disk
+        self._history.append(Move(tuple(coords), disk, tuple(flipped), self._current_player))
+        self._moves = None
 
-        for y in range(size):
-            for x in range(size):
-                if self.is_correct_move((y, x)):
-                    correct_moves.append((y, x))
-        return correct_moves
+    def _result(self, status, flips=0):
+        """Get result of the move."""
+        return MoveResult(status, flips, self._field.black_count, self._field.white_count)
+
+    def apply_move(self, coords, flipped, disk=None):
+        """Make move which is known to be correct: disk (current player by default) and disks to flip.
+
+        Returns MoveResult with status OK, PASS or GAME_OVER and never raises.
+        """
+        self._redo.clear()
+        self._play(coords, self._current_player if disk is None else disk, flipped)
+        return self._result(self._switch(), len(flipped))
+
+    def try_move(self, coords):
+        """Make move if it is correct and get MoveResult, status is ILLEGAL for wrong move."""
+        to_flip = self.is_correct_move(coords)
+        if not to_flip:
+            return self._result(Status.ILLEGAL)
+        return self.apply_move(coords, to_flip)
+
+    def try_extra(self, coords):
+        """Place extra disk if it is possible and get MoveResult, status is ILLEGAL or NO_EXTRA if it is not."""
+        if not self._field.in_range(coords) or self._field[coords] is not EMPTY or \
+                tuple(coords) in self._correct_moves():
+            return self._result(Status.ILLEGAL)
+        if not self._field.possibility_extra:
+            return self._result(Status.NO_EXTRA)
+        return self.apply_move(coords, (), EXTRA)
+
+    @staticmethod
+    def _raise(result, error):
+        """Raise exception of the result status, error is message of ILLEGAL status."""
+        if result.status is Status.PASS:
+            raise NoMovesException()
+        if result.status is Status.GAME_OVER:
+            raise GameOverException()
+        if result.status is Status.ILLEGAL:
+            raise MoveError(error)
+        if result.status is Status.NO_EXTRA:
+            raise HaveNotExtraException()
 
     def make_move(self, coords):
         """Make move and swap player flag."""
-        to_flip = self.is_correct_move(coords)
-        if to_flip:
-            for coord in list(to_flip):
-                self._field.flip(coord)
-            self._field[coords] = self._current_player
-            self.next_player()
-        else:
-            raise MoveError(f"{self._current_player} tried to make move with wrong coords: {coords}.")
+        self._raise(self.try_move(coords),
+                    f"{self._current_player} tried to make move with wrong coords: {coords}.")
 
     def place_extra(self, coords):
         """Place extra disk and swap flag."""
-        if self._field[coords] is EMPTY and coords not in self.get_correct_moves():
-            if self._field.possibility_extra:
-                self._field[coords] = EXTRA
-                self.next_player()
-            else:
-                raise HaveNotExtraException()
-        else:
-            raise MoveError(f"{self._current_player} tried to place extra disk to : {coords} coords.")
+        self._raise(self.try_extra(coords), f"{self._current_player} tried to place extra disk to : {coords} coords.")
+
+    def unmake_move(self):
+        """Take back the last move and return it. Flag is restored to the player who made it."""
+        if not self._history:
+            raise MoveError("There are no moves to unmake")
+        move = self._history.pop()
+        del self._field[move.coords]
+        for coord in move.flipped:
+            self._field.flip(coord)
+        self._current_player = move.player
+        self._moves = None
+        self._redo.append(move)
+        return move
+
+    def redo_move(self):
+        """Make again the last unmade move and swap player flag."""
+        if not self._redo:
+            raise MoveError("There are no moves to redo")
+        move = self._redo.pop()
+        self._play(move.coords, move.disk, move.flipped)
+        self._raise(self._result(self._switch()), None)
+
+    def can_unmake(self):
+        """Said that there are moves to unmake."""
+        return bool(self._history)
+
+    def can_redo(self):
+        """Said that there are moves to redo."""
+        return bool(self._redo)
 
     @property
     def opponent(self):
         """Returns AI flag."""
         return self._opponent
 
-    def ai_move(self):
+    @property
+    def lvl(self):
+        """Returns AI level."""
+        return self._lvl
+
+    def ai_move(self, stop=None, table=AI_TABLE, workers=1):
         """AI makes move."""
-        sleep(1)
-        if self._lvl == "Easy":
-            possible_moves = self.get_correct_moves()
-            self.make_move(possible_moves[0])
-        elif self._lvl == "Medium":
-            possible_moves = self.get_correct_moves()
-            self.make_move(choice(possible_moves))
-        else:
-            possible_moves = self.get_correct_moves()
-            good_moves = [(0, 0), (0, self._field.size - 1),
-                          (self._field.size - 1, 0), (self._field.size - 1, self._field.size - 1)]
-            moved = False
-            for coords in good_moves:
-                if coords in possible_moves:
-                    self.make_move(coords)
-                    moved = True
-                    break
-
-            if not moved:
-                greedy = dict(zip(map(lambda x: len(self.is_correct_move(x)), possible_moves), possible_moves))
-                self.make_move(greedy[max(greedy.keys())])
+        self.make_move(self.choose_move(stop, table, workers))
+
+    def choose_move(self, stop=None, table=AI_TABLE, workers=1, lvl=None, book=True, rnd=None, stats=None,
+                    clock=None, tree=AI_TREE):
+        """AI chooses move of the lvl or of the game level. Search works on a scratch copy of the field.
+
+        In Classic mode, except on the Easy level, a move of the opening book of
+        the field size is played while the position is in book (see book.py).
+        Pass book=False to always search, rnd is the random generator of the book choice.
+
+        Stop is a callable which cancels search with SearchCancelled when it returns true.
+        Table is shared by searches of all games, pass None to search without it.
+        If workers is more than one, root moves are searched in a process pool.
+        When there are at most "endgame" empty squares of the level, the position
+        is solved exactly, at most "wld" ones - only for win/draw/loss.
+        Levels with "time" search by iterative deepening for that many seconds,
+        with Clock (see clock.py) the budget is cut to the share of the remaining
+        time of the current player, other levels search to the fixed "depth".
+        With Clock the solver gets ENDGAME_SHARE of the budget, when it is not done
+        in time the rest of the budget is used by the search of the level.
+        Levels with "mcts" run Monte Carlo tree search for that many seconds (see mcts.py)
+        in the tree, it is kept between moves, pass None to search in a new tree.
+        Stats is SearchStats (see stats.py) which collects counters and timings of the move.
+        """
+        if stats is not None:
+            return stats.run(self._choose_move, stop, table, workers, lvl, book, rnd, stats, clock, tree)
+        return self._choose_move(stop, table, workers, lvl, book, rnd, None, clock, tree)
+
+    def _choose_move(self, stop, table, workers, lvl, book, rnd, stats, clock, tree):
+        """Choose move, see choose_move."""
+        phase = stats.phase if stats is not None else _untimed
+        if book and self._mode == "Classic" and (lvl or self._lvl) != "Easy":
+            with phase("book"):
+                import book as books
+                opening = books.for_size(self._field.size)
+                coords = opening and opening.choose(self, rnd)
+            if coords is not None:
+                return coords
+        black, white, extra = self._field.masks()
+        own, opp = (black, white) if self._current_player == BLACK else (white, black)
+        level = dict(AI_LEVELS.get(lvl or self._lvl, AI_LEVELS["Hard"]))
+        exact, wld = level.pop("endgame", 0), level.pop("wld", 0)
+        empty = bitboard.full(self._field.size) & ~(black | white | extra)
+        empties = bitboard.count(empty)
+        seconds, mcts_seconds = level.pop("time", None), level.pop("mcts", None)
+        budget = clock.budget(self._current_player, empties) if clock is not None else None
+        if empties <= max(exact, wld):
+            started = perf_counter()
+            deadline = None if budget is None else started + budget * ENDGAME_SHARE
+
+            def solver_stop():
+                return deadline is not None and perf_counter() >= deadline or stop is not None and stop()
+            try:
+                with phase("endgame"):
+                    result = Solver(self._field.size, empties > exact, solver_stop).solve(own, opp, extra)
+            except SearchCancelled:
+                if budget is None or stop is not None and stop():
+                    raise
+                budget -= perf_counter() - started
+            else:
+                if stats is not None:
+                    stats.nodes += result.nodes
+                    stats.max_depth = max(stats.max_depth, empties)
+                return result.move
+        if budget is not None:
+            seconds = seconds and min(seconds, budget)
+            mcts_seconds = mcts_seconds and min(mcts_seconds, budget)
+        if mcts_seconds is not None:
+            with phase("search"):
+                if workers > 1:
+                    result = parallel_mcts(self._field.size, own, opp, extra, self._current_player,
+                                           seconds=mcts_seconds, workers=workers, stop=stop)
+                else:
+                    result = (tree or Mcts()).search(self._field.size, own, opp, extra, self._current_player,
+                                                     seconds=mcts_seconds, stop=stop)
+            if stats is not None:
+                stats.nodes += result.playouts
+            return None if result.move is None else bitboard.coords(result.move, self._field.size)
+        if seconds is not None:
+            evaluator = None
+            if stats is not None and workers < 2:
+                evaluator = stats.count_leaves(default_evaluator(self._field.size), empty)
+            hits = table.hits if table is not None else 0
+            with phase("search"):
+                result = timed_search(self._field.size, own, opp, extra, self._current_player, seconds,
+                                      workers=workers, stop=stop, table=table, evaluator=evaluator, **level)
+            if stats is not None:
+                stats.nodes += result.nodes
+                stats.cutoffs += result.cutoffs
+                stats.cache_hits += table.hits - hits if table is not None else 0
+            return None if result.move is None else bitboard.coords(result.move, self._field.size)
+        if workers > 1:
+            with phase("search"):
+                _, best, nodes = parallel_search(self._field.size, own, opp, extra, self._current_player,
+                                                 workers=workers, stop=stop, **level)
+            if stats is not None:
+                stats.nodes += nodes
+            return None if best is None else bitboard.coords(best, self._field.size)
+        engine = Engine(self._field.size, stop=stop, table=table, **level)
+        if stats is not None:
+            engine.evaluator = stats.count_leaves(engine.evaluator, empty)
+            hits = table.hits if table is not None else 0
+        with phase("search"):
+            coords = engine.best_move(own, opp, extra, self._current_player)
+        if stats is not None:
+            stats.nodes += engine.nodes
+            stats.cutoffs += engine.cutoffs
+            stats.cache_hits += table.hits - hits if table is not None else 0
+        return coords
 
     def get_opponent(self):
         """Gets opponent to current player."""
@@ -144,13 +346,16 @@ class Reversi:
         else:
             return WHITE
 
+    def _switch(self):
+        """Switch flag to next player who can move and get status OK, PASS or GAME_OVER."""
+        self._current_player = self.get_opponent()
+        self._moves = None
+        if self._correct_moves():
+            return Status.OK
+        self._current_player = self.get_opponent()
+        self._moves = None
+        return Status.PASS if self._correct_moves() else Status.GAME_OVER
+
     def next_player(self):
         """Switch flag to next player."""
-        self._current_player = self.get_opponent()
-        moves = self.get_correct_moves()
-        if not moves:
-            self._current_player = self.get_opponent()
-            moves = self.get_correct_moves()
-            if not moves:
-                raise GameOverException()
-            raise NoMovesException()
+        self._raise(self._result(self._switch()), None)
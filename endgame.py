@@ -0,0 +1,179 @@
+"""Exact endgame solver.
+
+Solver searches positions to the end of the game and returns the final
+disk differential, or only win/draw/loss in the faster wld mode. Moves are
+ordered by parity of empty regions (field quadrants) and fastest-first.
+"""
+import argparse
+from collections import namedtuple
+from functools import lru_cache
+from random import Random
+from time import perf_counter
+import bitboard
+from exceptions import SearchCancelled
+
+SolveResult = namedtuple("SolveResult", "score move nodes time")
+
+
+@lru_cache(maxsize=None)
+def regions(size):
+    """Get masks of field quadrants."""
+    half = size // 2
+    result = []
+    for top in (0, half):
+        for left in (0, half):
+            result.append(sum(1 << bitboard.index((y, x), size)
+                              for y in range(top, top + half) for x in range(left, left + half)))
+    return tuple(result)
+
+
+class Solver:
+    """Exact search of positions with few empty squares.
+
+    Fastest-first ordering costs a move generation per move, so it is used
+    only while more than FASTEST_FIRST_EMPTIES squares are empty.
+    """
+    FASTEST_FIRST_EMPTIES = 5
+    STOP_CHECK = 1024
+
+    def __init__(self, size, wld=False, stop=None):
+        self._size = size
+        self.wld = wld
+        self.stop = stop
+        self.nodes = 0
+
+    @property
+    def size(self):
+        """Get size of solved field."""
+        return self._size
+
+    def solve(self, own, opp, extra):
+        """Solve position for the own player which is to move.
+
+        Score of the result is the final own - opp disk differential, in wld
+        mode it is 1, 0 or -1. Move is None if the own player has to pass.
+        """
+        started = perf_counter()
+        self.nodes = 0
+        size = self._size
+        empty = bitboard.full(size) & ~(own | opp | extra)
+        alpha, beta = (-1, 1) if self.wld else (-size * size - 1, size * size + 1)
+        moves = bitboard.legal_moves(own, opp, empty, size)
+        if not moves:
+            score = -self._solve(opp, own, empty, -beta, -alpha, True)
+            return SolveResult(self._result(score), None, self.nodes, perf_counter() - started)
+
+        best = None
+        for i in self.order(moves, own, opp, empty):
+            move = 1 << i
+            flipped = bitboard.flips(move, own, opp, size)
+            score = -self._solve(opp ^ flipped, own | flipped | move, empty ^ move, -beta, -alpha, False)
+            if best is None or score > alpha:
+                alpha, best = max(alpha, score), i
+                if alpha >= beta:
+                    break
+        return SolveResult(self._result(alpha), bitboard.coords(best, size), self.nodes, perf_counter() - started)
+
+    def _result(self, score):
+        """Convert score to the result score of the mode."""
+        if self.wld:
+            return (score > 0) - (score < 0)
+        return score
+
+    def order(self, moves, own, opp, empty):
+        """Order moves: odd empty regions first, then moves which leave less replies to the opponent."""
+        size = self._size
+        odd = 0
+        for region in regions(size):
+            if bitboard.count(empty & region) % 2:
+                odd |= region
+        if bitboard.count(empty) <= self.FASTEST_FIRST_EMPTIES:
+            return sorted(bitboard.bits(moves), key=lambda i: not odd >> i & 1)
+
+        def key(i):
+            move = 1 << i
+            flipped = bitboard.flips(move, own, opp, size)
+            replies = bitboard.legal_moves(opp ^ flipped, own | flipped | move, empty ^ move, size)
+            return not odd & move, bitboard.count(replies)
+        return sorted(bitboard.bits(moves), key=key)
+
+    def _solve(self, own, opp, empty, alpha, beta, passed):
+        """Get final disk differential of the position for the own player, fail-soft."""
+        self.nodes += 1
+        if self.stop is not None and not self.nodes % self.STOP_CHECK and self.stop():
+            raise SearchCancelled()
+        size = self._size
+        moves = bitboard.legal_moves(own, opp, empty, size)
+        if not moves:
+            if passed:
+                return bitboard.count(own) - bitboard.count(opp)
+            return -self._solve(opp, own, empty, -beta, -alpha, True)
+        if not moves & (moves - 1) and not empty & (empty - 1):
+            flipped = bitboard.flips(moves, own, opp, size)
+            self.nodes += 1
+            return bitboard.count(own) + 2 * bitboard.count(flipped) + 1 - bitboard.count(opp)
+
+        best = -size * size - 1
+        for i in self.order(moves, own, opp, empty):
+            move = 1 << i
+            flipped = bitboard.flips(move, own, opp, size)
+            score = -self._solve(opp ^ flipped, own | flipped | move, empty ^ move, -beta, -alpha, False)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+
+def random_position(size, empties, rnd):
+    """Play random moves until there are empties empty squares. Returns (own, opp, extra) or None."""
+    from game import BitField, BLACK, WHITE
+    field = BitField(size)
+    color, other = BLACK, WHITE
+    passed = False
+    while bitboard.count(field.empty) > empties:
+        moves = field.correct_moves(color)
+        if moves:
+            coords, to_flip = rnd.choice(sorted(moves.items()))
+            for flipped in to_flip:
+                field.flip(flipped)
+            field[coords] = color
+            passed = False
+        elif passed:
+            return None
+        else:
+            passed = True
+        color, other = other, color
+    black, white, extra = field.masks()
+    return (black, white, extra) if color == BLACK else (white, black, extra)
+
+
+def main():
+    """Solve random positions and report nodes and time, it helps to tune thresholds."""
+    parser = argparse.ArgumentParser(description="Reversi endgame solver benchmark.")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--empties", type=int, nargs="+", default=[8, 10, 12])
+    parser.add_argument("--positions", type=int, default=5)
+    parser.add_argument("--wld", action="store_true", help="solve only win/draw/loss")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = Random(args.seed)
+    for empties in args.empties:
+        nodes = elapsed = solved = 0
+        while solved < args.positions:
+            position = random_position(args.size, empties, rnd)
+            if position is None:
+                continue
+            result = Solver(args.size, args.wld).solve(*position)
+            nodes += result.nodes
+            elapsed += result.time
+            solved += 1
+        print(f"empties {empties}: {nodes / solved:.0f} nodes, {elapsed / solved:.3f} s per position, "
+              f"{nodes / elapsed:.0f} nodes/s")
+
+
+if __name__ == "__main__":
+    main()
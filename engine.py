@@ -0,0 +1,429 @@
+"""Alpha-beta search engine.
+
+Engine works on scratch bitboards (own, opp and extra masks) which are
+copied from the game field, so live Field is never touched by the search.
+"""
+import argparse
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+from time import perf_counter
+import bitboard
+import patterns
+import zobrist
+from game import BLACK, WHITE
+from exceptions import SearchCancelled
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+WIN_SCORE = 1 << 20
+PARALLEL_MIN_DEPTH = 4
+NEXT_ITERATION = 0.4
+
+SearchResult = namedtuple("SearchResult", "score move depth nodes cutoffs")
+
+
+@lru_cache(maxsize=None)
+def corners(size):
+    """Get mask of corner squares."""
+    last = size - 1
+    return sum(1 << bitboard.index(coords, size) for coords in ((0, 0), (0, last), (last, 0), (last, last)))
+
+
+@lru_cache(maxsize=None)
+def square_weights(size):
+    """Get static weight of every square which is used for move ordering."""
+    last = size - 1
+    weights = []
+    for y in range(size):
+        for x in range(size):
+            edge_y, edge_x = min(y, last - y), min(x, last - x)
+            if edge_y == 0 and edge_x == 0:
+                weights.append(100)
+            elif edge_y == 1 and edge_x == 1:
+                weights.append(-50)
+            elif edge_y + edge_x == 1:
+                weights.append(-20)
+            elif edge_y == 0 or edge_x == 0:
+                weights.append(10)
+            else:
+                weights.append(0)
+    return tuple(weights)
+
+
+def final_score(own, opp):
+    """Score of finished game for the own player."""
+    diff = bitboard.count(own) - bitboard.count(opp)
+    if diff > 0:
+        return WIN_SCORE + diff
+    if diff < 0:
+        return -WIN_SCORE + diff
+    return 0
+
+
+def default_evaluator(size):
+    """Get pattern evaluator of the field size or Evaluator if there are no weight tables."""
+    return patterns.evaluator(size) or Evaluator()
+
+
+class Evaluator:
+    """Static evaluation: weighted sum of mobility, corners and disk parity."""
+    def __init__(self, mobility=10, corners=50, parity=1):
+        self.mobility = mobility
+        self.corners = corners
+        self.parity = parity
+
+    def __call__(self, own, opp, empty, size):
+        """Evaluate position for the own player."""
+        score = self.parity * (bitboard.count(own) - bitboard.count(opp))
+        if self.corners:
+            mask = corners(size)
+            score += self.corners * (bitboard.count(own & mask) - bitboard.count(opp & mask))
+        if self.mobility:
+            score += self.mobility * (bitboard.count(bitboard.legal_moves(own, opp, empty, size)) -
+                                      bitboard.count(bitboard.legal_moves(opp, own, empty, size)))
+        return score
+
+
+class Engine:
+    """Negamax search with alpha-beta pruning and move ordering.
+
+    Depth is counted in moves, passes are free. When max_nodes is reached,
+    remaining nodes are evaluated statically instead of being searched deeper.
+    Stop callable is polled every STOP_CHECK nodes and SearchCancelled is
+    raised as soon as it returns true. Optional transposition table is probed
+    with Zobrist hashes which are updated incrementally along the search.
+    Default evaluator uses pattern weight tables of the field size (see
+    patterns.py) and falls back to Evaluator when there are no tables.
+    """
+    STOP_CHECK = 256
+
+    def __init__(self, size, depth=4, evaluator=None, max_nodes=None, stop=None, table=None):
+        self._size = size
+        self._keys = zobrist.keys(size)
+        self.depth = depth
+        self.evaluator = evaluator or default_evaluator(size)
+        self.max_nodes = max_nodes
+        self.stop = stop
+        self.table = table
+        self.nodes = 0
+        self.cutoffs = 0
+
+    @property
+    def size(self):
+        """Get size of searched field."""
+        return self._size
+
+    def order(self, moves, first=None):
+        """Order moves mask, best candidates first. First move is tried before others."""
+        weights = square_weights(self._size)
+        ordered = sorted(bitboard.bits(moves), key=lambda i: -weights[i])
+        if first is not None and moves >> first & 1:
+            ordered.remove(first)
+            ordered.insert(0, first)
+        return ordered
+
+    def child_key(self, key, move, flipped, color):
+        """Get hash of the position after the color has moved."""
+        keys = self._keys
+        key ^= keys.side ^ (keys.black[move] if color == BLACK else keys.white[move])
+        for i in bitboard.bits(flipped):
+            key ^= keys.flip[i]
+        return key
+
+    def _exhausted(self):
+        """Said that node budget is over."""
+        return self.max_nodes is not None and self.nodes >= self.max_nodes
+
+    def search(self, own, opp, extra, color=BLACK, first=None):
+        """Search position and return (score, index of best move) for the own player of the color.
+
+        Index is None if the own player has no moves. First move index is searched before
+        others, by default it is the best move of the table entry.
+        """
+        self.nodes = 0
+        self.cutoffs = 0
+        if self.table is not None:
+            self.table.new_search()
+        size = self._size
+        other = WHITE if color == BLACK else BLACK
+        black, white = (own, opp) if color == BLACK else (opp, own)
+        key = zobrist.hash_masks(black, white, extra, size, color == WHITE)
+        empty = bitboard.full(size) & ~(own | opp | extra)
+        moves = bitboard.legal_moves(own, opp, empty, size)
+        alpha, beta = -WIN_SCORE * 2, WIN_SCORE * 2
+        if not moves:
+            return -self._negamax(opp, own, empty, self.depth, -beta, -alpha, True, key ^ self._keys.side, other), None
+
+        entry = self.table.get(key) if self.table is not None else None
+        best = None
+        if first is None and entry is not None:
+            first = entry.move
+        for i in self.order(moves, first):
+            move = 1 << i
+            flipped = bitboard.flips(move, own, opp, size)
+            score = -self._negamax(opp ^ flipped, own | flipped | move, empty ^ move, self.depth - 1,
+                                   -beta, -alpha, False, self.child_key(key, i, flipped, color), other)
+            if best is None or score > alpha:
+                alpha, best = max(alpha, score), i
+        if self.table is not None and not self._exhausted():
+            self.table.put(key, self.depth, EXACT, alpha, best)
+        return alpha, best
+
+    def search_move(self, own, opp, extra, color, move, alpha=-WIN_SCORE * 2, beta=WIN_SCORE * 2):
+        """Get score of the root move index for the own player of the color, searched in (alpha, beta) window."""
+        size = self._size
+        black, white = (own, opp) if color == BLACK else (opp, own)
+        key = zobrist.hash_masks(black, white, extra, size, color == WHITE)
+        empty = bitboard.full(size) & ~(own | opp | extra)
+        flipped = bitboard.flips(1 << move, own, opp, size)
+        return -self._negamax(opp ^ flipped, own | flipped | 1 << move, empty ^ 1 << move, self.depth - 1,
+                              -beta, -alpha, False, self.child_key(key, move, flipped, color),
+                              WHITE if color == BLACK else BLACK)
+
+    def best_move(self, own, opp, extra, color=BLACK):
+        """Get coords of the best move or None."""
+        _, best = self.search(own, opp, extra, color)
+        return None if best is None else bitboard.coords(best, self._size)
+
+    def _negamax(self, own, opp, empty, depth, alpha, beta, passed, key, color):
+        """Get score of the position for the own player of the color which is to move."""
+        self.nodes += 1
+        if self.stop is not None and not self.nodes % self.STOP_CHECK and self.stop():
+            raise SearchCancelled()
+        size = self._size
+        other = WHITE if color == BLACK else BLACK
+        moves = bitboard.legal_moves(own, opp, empty, size)
+        if not moves:
+            if passed:
+                return final_score(own, opp)
+            return -self._negamax(opp, own, empty, depth, -beta, -alpha, True, key ^ self._keys.side, other)
+        if depth <= 0 or self._exhausted():
+            return self.evaluator(own, opp, empty, size)
+
+        table = self.table
+        first = None
+        alpha_orig = alpha
+        if table is not None:
+            entry = table.get(key)
+            if entry is not None:
+                first = entry.move
+                if entry.depth >= depth:
+                    if entry.bound == EXACT:
+                        return entry.score
+                    if entry.bound == LOWER:
+                        alpha = max(alpha, entry.score)
+                    else:
+                        beta = min(beta, entry.score)
+                    if alpha >= beta:
+                        return entry.score
+
+        best_score, best = -WIN_SCORE * 2, None
+        for i in self.order(moves, first):
+            move = 1 << i
+            flipped = bitboard.flips(move, own, opp, size)
+            score = -self._negamax(opp ^ flipped, own | flipped | move, empty ^ move, depth - 1,
+                                   -beta, -alpha, False, self.child_key(key, i, flipped, color), other)
+            if score > best_score:
+                best_score, best = score, i
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.cutoffs += 1
+                        break
+
+        if table is not None and not self._exhausted():
+            if best_score <= alpha_orig:
+                bound = UPPER
+            elif best_score >= beta:
+                bound = LOWER
+            else:
+                bound = EXACT
+            table.put(key, depth, bound, best_score, best)
+        return best_score
+
+
+_worker_state = None
+_pools = {}
+
+
+def _init_worker(alpha, generation, table_bytes):
+    """Keep shared alpha, search generation and own transposition table in the worker process."""
+    global _worker_state
+    _worker_state = alpha, generation, TranspositionTable(table_bytes) if table_bytes else None
+
+
+def _search_root_move(position, move, depth, options, search):
+    """Search one root move of the search generation in the worker process and return (move, score, nodes).
+
+    The move is cancelled as soon as the shared generation is not the search one.
+    """
+    size, own, opp, extra, color = position
+    alpha, generation, table = _worker_state
+    if table is not None:
+        table.new_search()
+    engine = Engine(size, depth, stop=lambda: generation.value != search, table=table, **options)
+    score = engine.search_move(own, opp, extra, color, move, alpha.value)
+    return move, score, engine.nodes
+
+
+def _pool(workers, table_bytes):
+    """Get process pool of the workers count and table size. Pools live until the interpreter exits."""
+    if (workers, table_bytes) not in _pools:
+        context = multiprocessing.get_context("spawn")
+        alpha = context.Value('q', -WIN_SCORE * 2)
+        generation = context.Value('q', 0)
+        executor = ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                       initargs=(alpha, generation, table_bytes))
+        _pools[workers, table_bytes] = executor, alpha, generation
+    return _pools[workers, table_bytes]
+
+
+def _wait(futures, stop, generation):
+    """Wait for any of futures, cancel all of them if stop returns true.
+
+    Running futures are cancelled by the next generation, so they never see
+    their own generation again, even when the next search starts at once.
+    """
+    while True:
+        done, pending = wait(futures, timeout=0.05, return_when=FIRST_COMPLETED)
+        if stop is not None and stop():
+            generation.value += 1
+            for future in pending:
+                future.cancel()
+            raise SearchCancelled()
+        if done:
+            return done, pending
+
+
+def parallel_search(size, own, opp, extra, color=BLACK, depth=4, workers=None, stop=None,
+                    evaluator=None, max_nodes=None, table_bytes=16 << 20):
+    """Search root moves in a process pool and return (score, index of best move, nodes).
+
+    The best ordered move is searched first, its score becomes the shared alpha
+    bound of the rest moves. Alpha is raised when a move finishes with a better
+    score, a move search reads it only when it starts, so moves which are
+    already running keep their window. Node budget is
+    split between root moves. Searches shallower than PARALLEL_MIN_DEPTH are
+    done in this process.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    options = {"evaluator": evaluator}
+    empty = bitboard.full(size) & ~(own | opp | extra)
+    moves = Engine(size).order(bitboard.legal_moves(own, opp, empty, size))
+    if workers < 2 or depth < PARALLEL_MIN_DEPTH or len(moves) < 2:
+        engine = Engine(size, depth, evaluator, max_nodes, stop)
+        score, best = engine.search(own, opp, extra, color)
+        return score, best, engine.nodes
+    if max_nodes is not None:
+        options["max_nodes"] = max(1, max_nodes // len(moves))
+
+    executor, alpha, generation = _pool(workers, table_bytes)
+    alpha.value = -WIN_SCORE * 2
+    generation.value += 1
+    search = generation.value
+    position = (size, own, opp, extra, color)
+    first = {executor.submit(_search_root_move, position, moves[0], depth, options, search)}
+    _, best_score, nodes = _wait(first, stop, generation)[0].pop().result()
+    best = moves[0]
+    alpha.value = best_score
+
+    pending = {executor.submit(_search_root_move, position, move, depth, options, search) for move in moves[1:]}
+    while pending:
+        done, pending = _wait(pending, stop, generation)
+        for future in done:
+            move, score, count = future.result()
+            nodes += count
+            if score > best_score:
+                best_score, best = score, move
+                alpha.value = score
+    return best_score, best, nodes
+
+
+def timed_search(size, own, opp, extra, color=BLACK, seconds=1.0, max_depth=None, workers=1, stop=None,
+                 table=None, evaluator=None):
+    """Deepen search one move at a time until the time budget is over and return SearchResult.
+
+    Depth 1 is searched without the deadline, so there is a move for any budget.
+    Deeper iterations are stopped hard at the deadline and the result of the last
+    completed iteration is returned. Next iteration is not started if the previous
+    one took more than NEXT_ITERATION of the budget, because it would not finish.
+    Best move of an iteration is searched first in the next one. Nodes and cutoffs
+    of all iterations are counted. Stop callable cancels the search with SearchCancelled.
+    """
+    started = perf_counter()
+    deadline = started + seconds
+    empty = bitboard.full(size) & ~(own | opp | extra)
+    max_depth = min(max_depth or size * size, bitboard.count(empty))
+
+    def timed_out():
+        return perf_counter() >= deadline
+
+    def halt():
+        return timed_out() or stop is not None and stop()
+
+    result = None
+    nodes = cutoffs = 0
+    for depth in range(1, max(max_depth, 1) + 1):
+        engine = Engine(size, depth, evaluator, stop=halt if result else stop, table=table)
+        try:
+            if workers > 1:
+                score, best, count = parallel_search(size, own, opp, extra, color, depth, workers, engine.stop,
+                                                     evaluator)
+            else:
+                score, best = engine.search(own, opp, extra, color, result and result.move)
+                count = engine.nodes
+        except SearchCancelled:
+            if stop is not None and stop():
+                raise
+            nodes, cutoffs = nodes + engine.nodes, cutoffs + engine.cutoffs
+            break
+        nodes, cutoffs = nodes + count, cutoffs + engine.cutoffs
+        result = SearchResult(score, best, depth, nodes, cutoffs)
+        if best is None or abs(score) >= WIN_SCORE or perf_counter() - started > seconds * NEXT_ITERATION:
+            break
+    return result._replace(nodes=nodes, cutoffs=cutoffs)
+
+
+def main():
+    """Search the position after random opening and compare parallel search with serial one."""
+    parser = argparse.ArgumentParser(description="Reversi search engine.")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--opening", type=int, default=4, help="count of random opening moves")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--serial", action="store_true", help="also run serial search for comparison")
+    args = parser.parse_args()
+
+    from random import Random
+    from game import BitField
+    rnd = Random(args.seed)
+    field = BitField(args.size)
+    color, other = BLACK, WHITE
+    for _ in range(args.opening):
+        moves = field.correct_moves(color)
+        if moves:
+            coords, to_flip = rnd.choice(sorted(moves.items()))
+            for flipped in to_flip:
+                field.flip(flipped)
+            field[coords] = color
+        color, other = other, color
+    black, white, extra = field.masks()
+    own, opp = (black, white) if color == BLACK else (white, black)
+    print(field)
+
+    if args.workers > 1:
+        executor = _pool(args.workers, 16 << 20)[0]
+        list(executor.map(abs, range(args.workers * 4)))
+    runs = [("parallel", args.workers)] + ([("serial", 1)] if args.serial else [])
+    for name, workers in runs:
+        started = perf_counter()
+        score, best, nodes = parallel_search(args.size, own, opp, extra, color, args.depth, workers)
+        elapsed = perf_counter() - started
+        print(f"{name}: move {bitboard.coords(best, args.size)}, score {score}, nodes {nodes}, "
+              f"{elapsed:.2f} s, {nodes / elapsed:.0f} nodes/s")
+
+
+if __name__ == "__main__":
+    main()
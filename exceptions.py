@@ -52,3 +52,7 @@ class HaveNotExtraException(Exception):
     """It throws when player havn't extra disks anymore."""
     pass
 
+
+class SearchCancelled(Exception):
+    """It throws when AI search was stopped before it has found a move."""
+    pass
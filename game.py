@@ -1,4 +1,7 @@
 from exceptions import IllegalArgumentError
+import bitboard
+import patterns
+import zobrist
 
 EXTRA = 'E'
 BLACK = 'X'
@@ -19,8 +22,22 @@ class Field:
         self._black_count = 0
         self._white_count = 0
         self._extra_count = 0
+        self._frontier = set()
+        self._keys = zobrist.keys(size)
+        self._hash = self._keys.base
         self.set_up()
 
+    @classmethod
+    def from_masks(cls, size, black, white, extra):
+        """Create field with the disks masks."""
+        field = cls(size)
+        for y, x in [(y, x) for y, row in enumerate(field) for x, disk in enumerate(row) if disk != EMPTY]:
+            del field[y, x]
+        for mask, color in ((black, BLACK), (white, WHITE), (extra, EXTRA)):
+            for i in bitboard.bits(mask):
+                field[bitboard.coords(i, size)] = color
+        return field
+
     def set_up(self):
         """Set disks on start positions."""
         self[self._size // 2 - 1, self._size // 2 - 1] = WHITE
@@ -43,6 +60,32 @@ class Field:
         """Get directions."""
         return self._DIRECTIONS
 
+    @property
+    def hash(self):
+        """Get Zobrist hash of disks on the field."""
+        return self._hash
+
+    def _key(self, coords, color):
+        """Get Zobrist key of the disk on coords."""
+        if color == BLACK:
+            return self._keys.black[bitboard.index(coords, self._size)]
+        if color == WHITE:
+            return self._keys.white[bitboard.index(coords, self._size)]
+        if color == EXTRA:
+            return self._keys.extra[bitboard.index(coords, self._size)]
+        return 0
+
+    @property
+    def pattern_indices(self):
+        """Get base-3 indices of evaluation patterns (see patterns.py), they are computed from the masks."""
+        black, white, _ = self.masks()
+        return patterns.indices(black, white, self._size)
+
+    @property
+    def frontier(self):
+        """Get empty squares which are adjacent to disks."""
+        return self._frontier
+
     @property
     def possibility_extra(self):
         """Said that we can or not place extra disk."""
@@ -63,6 +106,44 @@ class Field:
         """Check, that coordinates are correct."""
         return 0 <= coords[0] < self._size and 0 <= coords[1] < self._size
 
+    def masks(self):
+        """Get bitmasks of black, white and extra disks."""
+        masks = {BLACK: 0, WHITE: 0, EXTRA: 0, EMPTY: 0}
+        for y, row in enumerate(self._skeleton):
+            for x, disk in enumerate(row):
+                masks[disk] |= 1 << bitboard.index((y, x), self._size)
+        return masks[BLACK], masks[WHITE], masks[EXTRA]
+
+    def to_flip(self, coords, color):
+        """Get disks which will be flipped if disk of the color is placed on coords."""
+        try:
+            if self[coords] is not EMPTY or not self.in_range(coords):
+                return []
+
+            to_flip = []
+            other = BLACK if color == WHITE else WHITE
+            for dy, dx in self._DIRECTIONS:
+                y, x = coords[0] + dy, coords[1] + dx
+                line = []
+                while self.in_range((y, x)) and self[y, x] == other:
+                    line.append((y, x))
+                    y += dy
+                    x += dx
+                if line and self.in_range((y, x)) and self[y, x] == color:
+                    to_flip.extend(line)
+            return to_flip
+        except IndexError:
+            return []
+
+    def correct_moves(self, color):
+        """Get all correct moves of the color with disks to flip. Only frontier squares are checked."""
+        moves = {}
+        for coords in sorted(self._frontier):
+            to_flip = self.to_flip(coords, color)
+            if to_flip:
+                moves[coords] = to_flip
+        return moves
+
     @property
     def white_count(self):
         """Get count of white disks."""
@@ -84,10 +165,40 @@ class Field:
 
     def __setitem__(self, coords, color):
         """Set disk on the field and inc score."""
+        old = self._skeleton[coords[0]][coords[1]]
+        was_empty = old == EMPTY
         self._skeleton[coords[0]][coords[1]] = color
+        self._hash ^= self._key(coords, old) ^ self._key(coords, color)
         self._white_count += 1 if color == WHITE else 0
         self._black_count += 1 if color == BLACK else 0
         self._extra_count += 1 if color == EXTRA else 0
+        if was_empty and color != EMPTY:
+            self._frontier.discard(tuple(coords))
+            for y, x in self._neighbours(coords):
+                if self._skeleton[y][x] == EMPTY:
+                    self._frontier.add((y, x))
+
+    def __delitem__(self, coords):
+        """Remove disk from the field and dec score."""
+        color = self._skeleton[coords[0]][coords[1]]
+        self._skeleton[coords[0]][coords[1]] = EMPTY
+        self._hash ^= self._key(coords, color)
+        self._white_count -= 1 if color == WHITE else 0
+        self._black_count -= 1 if color == BLACK else 0
+        self._extra_count -= 1 if color == EXTRA else 0
+        if color != EMPTY:
+            for coords_ in [tuple(coords)] + self._neighbours(coords):
+                if self._skeleton[coords_[0]][coords_[1]] != EMPTY:
+                    continue
+                if any(self._skeleton[y][x] != EMPTY for y, x in self._neighbours(coords_)):
+                    self._frontier.add(coords_)
+                else:
+                    self._frontier.discard(coords_)
+
+    def _neighbours(self, coords):
+        """Get coords of squares adjacent to coords."""
+        return [(coords[0] + dy, coords[1] + dx) for dy, dx in self._DIRECTIONS
+                if self.in_range((coords[0] + dy, coords[1] + dx))]
 
     def __str__(self):
         """String representation of field."""
@@ -101,3 +212,180 @@ class Field:
     def __iter__(self):
         """Iter trough the field."""
         return self._skeleton.__iter__()
+
+
+class BitField:
+    """Game field which keeps disks as integer bitmasks, one mask per disk type."""
+    _DIRECTIONS = Field._DIRECTIONS
+
+    def __init__(self, size):
+        """Initialize game field."""
+        if size % 2 or size < 4:
+            raise IllegalArgumentError("Field can't be not even or less than 4.")
+        self._size = size
+        self._black = 0
+        self._white = 0
+        self._extra = 0
+        self._keys = zobrist.keys(size)
+        self._hash = self._keys.base
+        self.set_up()
+
+    @classmethod
+    def from_masks(cls, size, black, white, extra):
+        """Create field with the disks masks."""
+        field = cls(size)
+        field._black, field._white, field._extra = black, white, extra
+        field._hash = zobrist.hash_masks(black, white, extra, size)
+        return field
+
+    set_up = Field.set_up
+
+    @property
+    def size(self):
+        """Get size of field."""
+        return self._size
+
+    @property
+    def skeleton(self):
+        """Get skeleton of field. It is built on every call."""
+        return [[self[y, x] for x in range(self._size)] for y in range(self._size)]
+
+    @property
+    def directions(self):
+        """Get directions."""
+        return self._DIRECTIONS
+
+    @property
+    def hash(self):
+        """Get Zobrist hash of disks on the field."""
+        return self._hash
+
+    _key = Field._key
+
+    pattern_indices = Field.pattern_indices
+
+    @property
+    def black(self):
+        """Get mask of black disks."""
+        return self._black
+
+    @property
+    def white(self):
+        """Get mask of white disks."""
+        return self._white
+
+    @property
+    def extra(self):
+        """Get mask of extra disks."""
+        return self._extra
+
+    @property
+    def empty(self):
+        """Get mask of empty squares."""
+        return bitboard.full(self._size) & ~(self._black | self._white | self._extra)
+
+    @property
+    def frontier(self):
+        """Get empty squares which are adjacent to disks."""
+        mask = bitboard.neighbours(self._black | self._white | self._extra, self._size) & self.empty
+        return {bitboard.coords(i, self._size) for i in bitboard.bits(mask)}
+
+    @property
+    def possibility_extra(self):
+        """Said that we can or not place extra disk."""
+        return self.extra_count < self._size // 2
+
+    def flip(self, coords):
+        """Flip disk. It mean that disk changes its color."""
+        i = bitboard.index(coords, self._size)
+        bit = 1 << i
+        if self._white & bit or self._black & bit:
+            self._white ^= bit
+            self._black ^= bit
+            self._hash ^= self._keys.flip[i]
+        else:
+            raise TypeError("Can't flip EMPTY or another type of disk.")
+
+    in_range = Field.in_range
+
+    def masks(self):
+        """Get bitmasks of black, white and extra disks."""
+        return self._black, self._white, self._extra
+
+    def _masks(self, color):
+        """Get own and opponent masks for the color."""
+        if color == BLACK:
+            return self._black, self._white
+        return self._white, self._black
+
+    def to_flip(self, coords, color):
+        """Get disks which will be flipped if disk of the color is placed on coords."""
+        if not self.in_range(coords):
+            return []
+        bit = 1 << bitboard.index(coords, self._size)
+        if not self.empty & bit:
+            return []
+        own, opp = self._masks(color)
+        return [bitboard.coords(i, self._size) for i in bitboard.bits(bitboard.flips(bit, own, opp, self._size))]
+
+    def correct_moves(self, color):
+        """Get all correct moves of the color with disks to flip."""
+        own, opp = self._masks(color)
+        moves = {}
+        for i in bitboard.bits(bitboard.legal_moves(own, opp, self.empty, self._size)):
+            to_flip = bitboard.flips(1 << i, own, opp, self._size)
+            moves[bitboard.coords(i, self._size)] = [bitboard.coords(j, self._size) for j in bitboard.bits(to_flip)]
+        return moves
+
+    @property
+    def white_count(self):
+        """Get count of white disks."""
+        return bitboard.count(self._white)
+
+    @property
+    def black_count(self):
+        """Get count of black disks."""
+        return bitboard.count(self._black)
+
+    @property
+    def extra_count(self):
+        """Get count of extra disks."""
+        return bitboard.count(self._extra)
+
+    def __getitem__(self, coords):
+        """Get disk from field."""
+        if not self.in_range(coords):
+            raise IndexError("Field index out of range.")
+        bit = 1 << bitboard.index(coords, self._size)
+        if self._black & bit:
+            return BLACK
+        if self._white & bit:
+            return WHITE
+        if self._extra & bit:
+            return EXTRA
+        return EMPTY
+
+    def __setitem__(self, coords, color):
+        """Set disk on the field."""
+        old = self[coords]
+        self._hash ^= self._key(coords, old) ^ self._key(coords, color)
+        bit = 1 << bitboard.index(coords, self._size)
+        self._black &= ~bit
+        self._white &= ~bit
+        self._extra &= ~bit
+        if color == BLACK:
+            self._black |= bit
+        elif color == WHITE:
+            self._white |= bit
+        elif color == EXTRA:
+            self._extra |= bit
+
+    def __delitem__(self, coords):
+        """Remove disk from the field."""
+        self[coords] = EMPTY
+
+    __str__ = Field.__str__
+
+    def __iter__(self):
+        """Iter trough the field."""
+        return iter(self.skeleton)
@@ -0,0 +1,336 @@
+"""Local game database.
+
+Games are kept in an SQLite file as move lists with metadata, and the
+position hash (Reversi.hash) before every ply is indexed, so "all games
+which reached this position" is one index lookup:
+
+    games:     id, size, mode, opponent, level, first player, black and white
+               counts, winner (X, O or draw), finished flag, count of moves,
+               moves (u16 per move as in gamefile.py), source
+    positions: hash, game id, ply - primary key, so lookups by hash are
+               index range scans
+
+Games are imported from game files of gamefile.py and from text move lists,
+one game per line:
+
+    # size mode first-player moves, "e" marks an extra disk
+    8 Classic X 2,3 2,2 e0,0 3,2
+
+    python gamedb.py games.db import-dat saves/*.dat
+    python gamedb.py games.db import-text games.txt
+    python gamedb.py games.db query --size 8 --winner X
+    python gamedb.py games.db find --size 8 --moves "2,3 2,2"
+    python gamedb.py games.db export-text all.txt
+"""
+import argparse
+import sqlite3
+import sys
+from array import array
+from collections import namedtuple
+from time import perf_counter
+from driver import Reversi, Status
+from game import BitField, BLACK, WHITE, EXTRA
+from exceptions import LoadError, SaveError
+import bitboard
+import gamefile
+import symmetry
+
+DRAW = "draw"
+BATCH = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    opponent TEXT NOT NULL,
+    lvl TEXT,
+    first_player TEXT NOT NULL,
+    black INTEGER NOT NULL,
+    white INTEGER NOT NULL,
+    winner TEXT NOT NULL,
+    finished INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    moves BLOB NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS games_by_size ON games (size, mode, winner);
+CREATE TABLE IF NOT EXISTS positions (
+    hash INTEGER NOT NULL,
+    game INTEGER NOT NULL,
+    ply INTEGER NOT NULL,
+    PRIMARY KEY (hash, game, ply)
+) WITHOUT ROWID;
+"""
+
+GameRow = namedtuple("GameRow", "id size mode opponent lvl first_player black white winner finished moves source")
+FILTERS = ("size", "mode", "opponent", "lvl", "first_player", "winner", "finished", "source")
+
+
+def _signed(key):
+    """Get 64-bit hash as SQLite integer."""
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def parse_line(line):
+    """Parse text game line into (size, mode, first player, move codes) or None for blank and comment lines."""
+    words = line.split()
+    if not words or words[0].startswith("#"):
+        return None
+    if len(words) < 3 or not words[0].isdigit() or words[1] not in gamefile.MODES or words[2] not in (BLACK, WHITE):
+        raise LoadError(f"Wrong game line: {line.strip()}")
+    size = int(words[0])
+    if size % 2 or not 4 <= size <= 30:
+        raise LoadError(f"Wrong field size: {size}")
+    codes = []
+    for word in words[3:]:
+        extra = word.startswith("e")
+        try:
+            y, x = map(int, word[extra:].split(","))
+        except ValueError:
+            raise LoadError(f"Wrong move: {word}")
+        if not (0 <= y < size and 0 <= x < size):
+            raise LoadError(f"Wrong move: {word}")
+        codes.append(bitboard.index((y, x), size) | (gamefile.EXTRA_FLAG if extra else 0))
+    return size, words[1], words[2], codes
+
+
+def format_line(row):
+    """Get text game line of the GameRow."""
+    moves = []
+    for code in row.moves:
+        y, x = bitboard.coords(code & ~gamefile.EXTRA_FLAG, row.size)
+        moves.append(f"{'e' if code & gamefile.EXTRA_FLAG else ''}{y},{x}")
+    return " ".join([str(row.size), row.mode, row.first_player] + moves)
+
+
+def replay(size, mode, first_player, codes, opponent="Human", lvl=None):
+    """Make moves of the codes and get (game, hashes before every ply and after the last one, finished)."""
+    game = Reversi(size, first_player, mode, opponent, lvl, backend=BitField)
+    hashes = [game.hash]
+    finished = False
+    for ply, code in enumerate(codes):
+        if finished:
+            raise LoadError(f"Move after the end of the game at ply {ply}")
+        coords = bitboard.coords(code & ~gamefile.EXTRA_FLAG, size)
+        status = (game.try_extra(coords) if code & gamefile.EXTRA_FLAG else game.try_move(coords)).status
+        if status in (Status.ILLEGAL, Status.NO_EXTRA):
+            raise LoadError(f"Wrong move {coords} at ply {ply}")
+        finished = status is Status.GAME_OVER
+        hashes.append(game.hash)
+    return game, hashes, finished
+
+
+class GameDatabase:
+    """SQLite database of games with the position index."""
+    def __init__(self, path=":memory:"):
+        self._path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(SCHEMA)
+
+    def close(self):
+        """Commit and close the database."""
+        self._connection.commit()
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        """Get count of games."""
+        return self._connection.execute("SELECT count(*) FROM games").fetchone()[0]
+
+    def _insert(self, size, mode, opponent, lvl, first_player, codes, source):
+        """Replay and insert one game without commit, get its id."""
+        game, hashes, finished = replay(size, mode, first_player, codes, opponent, lvl)
+        black, white = game.field.black_count, game.field.white_count
+        winner = BLACK if black > white else WHITE if white > black else DRAW
+        cursor = self._connection.execute(
+            "INSERT INTO games (size, mode, opponent, lvl, first_player, black, white, winner, finished, length, "
+            "moves, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (size, mode, opponent, lvl, first_player, black, white, winner, finished, len(codes),
+             array("H", codes).tobytes(), source))
+        game_id = cursor.lastrowid
+        self._connection.executemany("INSERT OR IGNORE INTO positions VALUES (?, ?, ?)",
+                                     ((_signed(key), game_id, ply) for ply, key in enumerate(hashes)))
+        return game_id
+
+    def add_game(self, game, source=None):
+        """Add game with its history and get its id."""
+        codes = [bitboard.index(move.coords, game.field.size) | (gamefile.EXTRA_FLAG if move.disk == EXTRA else 0)
+                 for move in game.history]
+        game_id = self._insert(game.field.size, game.mode, game.opponent, game.lvl, game.first_player, codes, source)
+        self._connection.commit()
+        return game_id
+
+    def import_games(self, games, source=None):
+        """Add (size, mode, opponent, lvl, first player, move codes) games in batches, get (added, skipped).
+
+        None games could not be read and are skipped. When reading of games fails with
+        LoadError, games which were read are kept and the rest of them count as one skipped.
+        """
+        added = skipped = 0
+        games = iter(games)
+        while True:
+            try:
+                game = next(games)
+                if game is None:
+                    raise LoadError("Unreadable game")
+                self._insert(*game, source)
+                added += 1
+            except StopIteration:
+                break
+            except LoadError:
+                skipped += 1
+            if not (added + skipped) % BATCH:
+                self._connection.commit()
+        self._connection.commit()
+        return added, skipped
+
+    def import_dat(self, path):
+        """Import games of the game file (see gamefile.py), games without moves are skipped."""
+        return self.import_games(((record.size, record.mode, record.opponent, record.lvl, record.first_player,
+                                   record.moves) for record in gamefile.read_records(path) if record.moves), path)
+
+    def import_text(self, path):
+        """Import games of the text file, see parse_line."""
+        def games(file):
+            for line in file:
+                try:
+                    game = parse_line(line)
+                except LoadError:
+                    yield None
+                    continue
+                if game is not None:
+                    size, mode, first_player, codes = game
+                    yield size, mode, "Human", None, first_player, codes
+        try:
+            with open(path) as file:
+                return self.import_games(games(file), path)
+        except OSError as exception:
+            raise LoadError(str(exception))
+
+    @staticmethod
+    def _row(values):
+        """Get GameRow of the selected values."""
+        values = list(values)
+        moves = array("H")
+        moves.frombytes(values[10])
+        values[10] = moves.tolist()
+        values[9] = bool(values[9])
+        return GameRow(*values)
+
+    def games(self, limit=None, **filters):
+        """Iter trough GameRows with the metadata values, e.g. games(size=8, winner="X")."""
+        unknown = set(filters) - set(FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+        where = " AND ".join(f"{name} = ?" for name in filters) or "1"
+        query = f"SELECT {', '.join(GameRow._fields)} FROM games WHERE {where} ORDER BY id"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        for values in self._connection.execute(query, tuple(filters.values())):
+            yield self._row(values)
+
+    def game(self, game_id):
+        """Get GameRow of the id or None."""
+        values = self._connection.execute(f"SELECT {', '.join(GameRow._fields)} FROM games WHERE id = ?",
+                                          (game_id,)).fetchone()
+        return None if values is None else self._row(values)
+
+    def find(self, position, symmetric=False, limit=None):
+        """Get (game id, ply) of games which reached the Position (see Reversi.snapshot).
+
+        With symmetric games which reached any rotation or reflection of the
+        position are found as well.
+        """
+        transforms = range(len(symmetry.TRANSFORMS)) if symmetric else (symmetry.IDENTITY,)
+        positions = {symmetry.transform_position(position, transform) for transform in transforms}
+        keys = [_signed(position_.hash) for position_ in positions]
+        query = f"SELECT game, ply FROM positions WHERE hash IN ({', '.join('?' * len(keys))}) ORDER BY game, ply"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return self._connection.execute(query, keys).fetchall()
+
+    def load(self, game_id):
+        """Build game of the id with its history."""
+        row = self.game(game_id)
+        if row is None:
+            raise LoadError(f"There is no game {game_id}")
+        return replay(row.size, row.mode, row.first_player, row.moves, row.opponent, row.lvl)[0]
+
+    def export_text(self, file, **filters):
+        """Write games with the metadata values as text lines, get count of games."""
+        count = 0
+        for row in self.games(**filters):
+            file.write(format_line(row) + "\n")
+            count += 1
+        return count
+
+    def export_dat(self, path, **filters):
+        """Write games with the metadata values as a game file (see gamefile.py)."""
+        gamefile.write_games(path, (self.load(row.id) for row in self.games(**filters)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reversi game database.")
+    parser.add_argument("database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("import-dat").add_argument("paths", nargs="+")
+    commands.add_parser("import-text").add_argument("paths", nargs="+")
+    export = commands.add_parser("export-text")
+    export.add_argument("path", help="- is stdout")
+    query = commands.add_parser("query")
+    find = commands.add_parser("find")
+    for command in (export, query):
+        command.add_argument("--size", type=int)
+        command.add_argument("--mode", choices=gamefile.MODES)
+        command.add_argument("--winner", choices=(BLACK, WHITE, DRAW))
+    find.add_argument("--size", type=int, default=8)
+    find.add_argument("--mode", choices=gamefile.MODES, default="Classic")
+    find.add_argument("--first-player", choices=(BLACK, WHITE), default=BLACK)
+    find.add_argument("--moves", default="", help='moves of the position, e.g. "2,3 2,2"')
+    find.add_argument("--symmetric", action="store_true")
+    args = parser.parse_args(argv)
+
+    with GameDatabase(args.database) as database:
+        try:
+            if args.command in ("import-dat", "import-text"):
+                method = database.import_dat if args.command == "import-dat" else database.import_text
+                for path in args.paths:
+                    started = perf_counter()
+                    added, skipped = method(path)
+                    print(f"{path}: {added} games added, {skipped} skipped in {perf_counter() - started:.2f} s")
+                return
+            if args.command == "find":
+                _, _, _, codes = parse_line(f"{args.size} {args.mode} {args.first_player} {args.moves}")
+                game = replay(args.size, args.mode, args.first_player, codes)[0]
+                started = perf_counter()
+                found = database.find(game.snapshot(), args.symmetric)
+                for game_id, ply in found:
+                    print(f"game {game_id} ply {ply}")
+                print(f"{len(found)} positions in {(perf_counter() - started) * 1000:.2f} ms")
+                return
+            filters = {name: value for name, value in (("size", args.size), ("mode", args.mode),
+                                                       ("winner", args.winner)) if value is not None}
+            if args.command == "export-text":
+                if args.path == "-":
+                    print(f"{database.export_text(sys.stdout, **filters)} games", file=sys.stderr)
+                else:
+                    with open(args.path, "w") as file:
+                        print(f"{database.export_text(file, **filters)} games")
+                return
+            started = perf_counter()
+            rows = list(database.games(**filters))
+            for row in rows:
+                print(f"{row.id}: {format_line(row)} -> {row.black}:{row.white}")
+            print(f"{len(rows)} games in {(perf_counter() - started) * 1000:.2f} ms")
+        except (LoadError, SaveError) as exception:
+            sys.exit(str(exception))
+
+
+if __name__ == "__main__":
+    main()
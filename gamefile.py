@@ -0,0 +1,178 @@
+"""Compact versioned binary game format.
+
+File is a header followed by game records:
+
+    file header: magic b"RVSI", version (u8), reserved (u8), count of games (u32)
+    game header: size, mode, opponent, level, side to move, first player (u8 each),
+                 count of extra disks (u16), count of moves (u16)
+    board:       two bit planes of size * size bits each, little endian;
+                 low plane has black and extra disks, high plane has white and extra disks
+    moves:       u16 per move - square index y * size + x, EXTRA_FLAG for extra disks
+
+Version 2 adds the MCTS level code, version 1 files are still read and older
+readers reject version 2 files by the version byte. All numbers are little
+endian. Files are read through mmap and memoryview, board planes become masks
+with int.from_bytes, so there is no per-square work.
+"""
+import mmap
+import struct
+from collections import namedtuple
+from driver import Reversi, Status
+from game import BitField, BLACK, WHITE, EXTRA
+from exceptions import SaveError, LoadError
+from position import Position, plane_bytes
+import bitboard
+
+MAGIC = b"RVSI"
+VERSION = 2
+READ_VERSIONS = (1, 2)
+EXTRA_FLAG = 0x8000
+
+FILE_HEADER = struct.Struct("<4sBxI")
+GAME_HEADER = struct.Struct("<6BHH")
+
+MODES = ("Classic", "Extra")
+OPPONENTS = ("Human", "Ai")
+LEVELS = (None, "Easy", "Medium", "Hard", "MCTS")
+PLAYERS = (BLACK, WHITE)
+
+GameRecord = namedtuple("GameRecord", "size mode opponent lvl player first_player extra_count black white extra moves")
+
+
+def _code(values, value, name):
+    """Get index of the value or raise SaveError."""
+    try:
+        return values.index(value)
+    except ValueError:
+        raise SaveError(f"Unsupported {name}: {value}")
+
+
+def _value(values, code, name):
+    """Get value of the code or raise LoadError."""
+    if code >= len(values):
+        raise LoadError(f"Unknown {name} code: {code}")
+    return values[code]
+
+
+def record_of(game):
+    """Get GameRecord of the game."""
+    field = game.field
+    black, white, extra = field.masks()
+    size = field.size
+    moves = [bitboard.index(move.coords, size) | (EXTRA_FLAG if move.disk == EXTRA else 0) for move in game.history]
+    return GameRecord(size, game.mode, game.opponent, game.lvl, game.current_player, game.first_player,
+                      field.extra_count, black, white, extra, moves)
+
+
+def dump_game(game):
+    """Get bytes of the game record."""
+    record = record_of(game)
+    if len(record.moves) > 0xFFFF:
+        raise SaveError("Too many moves")
+    header = GAME_HEADER.pack(record.size, _code(MODES, record.mode, "mode"),
+                              _code(OPPONENTS, record.opponent, "opponent"), _code(LEVELS, record.lvl, "level"),
+                              _code(PLAYERS, record.player, "player"), _code(PLAYERS, record.first_player, "player"),
+                              record.extra_count, len(record.moves))
+    planes = plane_bytes(record.size)
+    low = (record.black | record.extra).to_bytes(planes, "little")
+    high = (record.white | record.extra).to_bytes(planes, "little")
+    return header + low + high + struct.pack(f"<{len(record.moves)}H", *record.moves)
+
+
+def write_games(path, games):
+    """Write all games into the file."""
+    try:
+        with open(path, "wb") as file:
+            file.write(FILE_HEADER.pack(MAGIC, VERSION, 0))
+            count = 0
+            for game in games:
+                file.write(dump_game(game))
+                count += 1
+            file.seek(0)
+            file.write(FILE_HEADER.pack(MAGIC, VERSION, count))
+    except OSError as exception:
+        raise SaveError(str(exception))
+
+
+def parse_records(buffer):
+    """Iter trough GameRecords of the bytes-like buffer."""
+    with memoryview(buffer) as view:
+        if len(view) < FILE_HEADER.size:
+            raise LoadError("File is too short")
+        magic, version, count = FILE_HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise LoadError("It is not a game file")
+        if version not in READ_VERSIONS:
+            raise LoadError(f"Unsupported version: {version}, the newest known one is {VERSION}")
+        offset = FILE_HEADER.size
+        for _ in range(count):
+            if offset + GAME_HEADER.size > len(view):
+                raise LoadError("Game record is truncated")
+            size, mode, opponent, lvl, player, first, extra_count, moves_count = GAME_HEADER.unpack_from(view, offset)
+            if size % 2 or not 4 <= size <= 30:
+                raise LoadError(f"Wrong field size: {size}")
+            offset += GAME_HEADER.size
+            planes = plane_bytes(size)
+            end = offset + 2 * planes + 2 * moves_count
+            if end > len(view):
+                raise LoadError("Game record is truncated")
+            low = int.from_bytes(view[offset:offset + planes], "little")
+            high = int.from_bytes(view[offset + planes:offset + 2 * planes], "little")
+            moves = list(struct.unpack_from(f"<{moves_count}H", view, offset + 2 * planes))
+            offset = end
+            yield GameRecord(size, _value(MODES, mode, "mode"), _value(OPPONENTS, opponent, "opponent"),
+                             _value(LEVELS, lvl, "level"), _value(PLAYERS, player, "player"),
+                             _value(PLAYERS, first, "player"), extra_count, low & ~high, high & ~low, low & high, moves)
+
+
+def read_records(path):
+    """Iter trough GameRecords of the file without building games."""
+    try:
+        with open(path, "rb") as file:
+            try:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise LoadError("File is empty")
+    except OSError as exception:
+        raise LoadError(str(exception))
+    with buffer:
+        yield from parse_records(buffer)
+
+
+def load_game(record, replay=True):
+    """Build game of the record.
+
+    With replay moves are made again from the start, so the game has history
+    for undo, and the result is checked with the stored board. Without replay
+    the game is built right from the stored board and has no history.
+    """
+    if not replay:
+        position = Position(record.size, record.black, record.white, record.extra, record.player)
+        return Reversi.from_snapshot(position, record.mode, record.opponent, record.lvl, BitField)
+    game = Reversi(record.size, record.first_player, record.mode, record.opponent, record.lvl, backend=BitField)
+    for code in record.moves:
+        coords = bitboard.coords(code & ~EXTRA_FLAG, record.size)
+        result = game.try_extra(coords) if code & EXTRA_FLAG else game.try_move(coords)
+        if result.status in (Status.ILLEGAL, Status.NO_EXTRA):
+            raise LoadError(f"Wrong move in the record: {coords}")
+    if game.field.masks() != (record.black, record.white, record.extra) or game.current_player != record.player:
+        raise LoadError("Moves of the record don't lead to its board")
+    return game
+
+
+def read_games(path, replay=True):
+    """Iter trough games of the file."""
+    for record in read_records(path):
+        yield load_game(record, replay)
+
+
+def save(path, game):
+    """Save one game into the file."""
+    write_games(path, [game])
+
+
+def load(path):
+    """Load the first game of the file."""
+    for game in read_games(path):
+        return game
+    raise LoadError("File has no games")
@@ -0,0 +1,85 @@
+"""Logging of the game.
+
+Text log and the structured game-event stream are written by a
+QueueListener thread, so GUI and engine threads only put records into a
+queue. Both files are rotated by size. The event stream is JSON lines:
+
+    {"time": 1700000000.0, "event": "move", "player": "X", "coords": [2, 3], "flips": 1, ...}
+
+Nothing is logged until setup() is called, so headless runs (self-play,
+perft, benchmarks) pay only for a level check; event() returns at once
+while the stream is disabled.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+
+LOGGER = logging.getLogger("reversi")
+EVENTS = logging.getLogger("reversi.events")
+LOGGER.addHandler(logging.NullHandler())
+EVENTS.propagate = False
+EVENTS.setLevel(logging.CRITICAL + 1)
+
+LOG_FILE = "reversi.log"
+EVENTS_FILE = "reversi-events.jsonl"
+MAX_BYTES = 1 << 20
+BACKUPS = 3
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format event record as a JSON line."""
+    def format(self, record):
+        return json.dumps({"time": round(record.created, 3), "event": record.getMessage(),
+                           **getattr(record, "fields", {})})
+
+
+def setup(level=logging.INFO, path=LOG_FILE, events_path=EVENTS_FILE, max_bytes=MAX_BYTES, backups=BACKUPS):
+    """Start writing the text log of the level and the event stream. Pass None path to skip the file."""
+    global _listener
+    shutdown()
+    records = queue.SimpleQueue()
+    handlers = []
+    if path:
+        text = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        text.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        text.addFilter(lambda record: record.name != EVENTS.name)
+        handlers.append(text)
+    if events_path:
+        events = logging.handlers.RotatingFileHandler(events_path, maxBytes=max_bytes, backupCount=backups)
+        events.setFormatter(JsonFormatter())
+        events.addFilter(logging.Filter(EVENTS.name))
+        handlers.append(events)
+    _listener = logging.handlers.QueueListener(records, *handlers)
+    for logger in (LOGGER, EVENTS):
+        logger.addHandler(logging.handlers.QueueHandler(records))
+    LOGGER.setLevel(level if path else logging.CRITICAL + 1)
+    EVENTS.setLevel(logging.INFO if events_path else logging.CRITICAL + 1)
+    _listener.start()
+
+
+def shutdown():
+    """Flush queued records and stop logging to files."""
+    global _listener
+    for logger in (LOGGER, EVENTS):
+        for handler in [handler for handler in logger.handlers if isinstance(handler, logging.handlers.QueueHandler)]:
+            logger.removeHandler(handler)
+    EVENTS.setLevel(logging.CRITICAL + 1)
+    LOGGER.setLevel(logging.NOTSET)
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown)
+
+
+def event(name, **fields):
+    """Put game event into the event stream if it is enabled."""
+    if EVENTS.isEnabledFor(logging.INFO):
+        EVENTS.info(name, extra={"fields": fields})
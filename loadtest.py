@@ -0,0 +1,89 @@
+"""Load test of the game server.
+
+Opens concurrent connections, every connection plays random games through
+MOVES and MOVE requests (and AI requests with --ai-every) for the duration,
+then requests per second and latency percentiles are reported:
+
+    python server.py --port 7777 &
+    python loadtest.py --port 7777 --connections 500 --duration 10
+"""
+import argparse
+import asyncio
+import json
+from random import Random
+from time import perf_counter
+
+
+def percentile(values, fraction):
+    """Get percentile of sorted values."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def request(reader, writer, line, latencies):
+    """Send request line and get its response."""
+    started = perf_counter()
+    writer.write(line.encode() + b"\n")
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    latencies.append(perf_counter() - started)
+    return response
+
+
+async def client(host, port, size, deadline, ai_every, seed, latencies):
+    """Play random games until the deadline."""
+    rnd = Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while perf_counter() < deadline:
+            await request(reader, writer, f"NEW size={size}", latencies)
+            over = False
+            ply = 0
+            while not over and perf_counter() < deadline:
+                ply += 1
+                if ai_every and not ply % ai_every:
+                    response = await request(reader, writer, "AI", latencies)
+                else:
+                    moves = (await request(reader, writer, "MOVES", latencies))["moves"]
+                    response = await request(reader, writer, "MOVE {} {}".format(*rnd.choice(moves)), latencies)
+                if not response["ok"]:
+                    raise RuntimeError(response["error"])
+                over = response["status"] == "game_over"
+        writer.write(b"QUIT\n")
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def run(host, port, connections, duration, size, ai_every, seed):
+    """Run clients and get sorted latencies and elapsed time."""
+    latencies = []
+    started = perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(client(host, port, size, deadline, ai_every, seed + number, latencies)
+                           for number in range(connections)))
+    return sorted(latencies), perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test of the Reversi game server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--ai-every", type=int, default=0, help="every n-th move is AI request, 0 is never")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    latencies, elapsed = asyncio.run(run(args.host, args.port, args.connections, args.duration, args.size,
+                                         args.ai_every, args.seed))
+    print(f"{len(latencies)} requests in {elapsed:.2f} s: {len(latencies) / elapsed:.0f} req/s")
+    for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0)):
+        value = percentile(latencies, fraction)
+        print(f"{name}: {value * 1000:.2f} ms" if value is not None else f"{name}: -")
+
+
+if __name__ == "__main__":
+    main()
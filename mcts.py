@@ -0,0 +1,282 @@
+"""Monte Carlo tree search engine.
+
+Mcts grows a UCT tree from the position to move: children are selected by
+win rate plus the UCB exploration term, one new child is expanded per
+playout and the playout result is backed up to the root. Playouts play
+random moves on bitboards to the end of the game. A random move is found
+without computing all legal moves: a random empty square next to opponent
+disks is tried and rejected if it flips nothing, so a ply costs a few
+flips() calls instead of a full legal_moves() scan of the field. Squares
+are drawn by the first candidate at or after a random bit, it is uniform
+enough for playouts and costs no iteration over bits.
+
+Tree is kept between searches: if the new position is the root or is up
+to two plies below it (own move and the reply), that subtree becomes the
+root and its playouts are reused. With workers > 1 independent trees are
+grown in a process pool (root parallelism) and visits of root moves are
+summed. Extra disks block like edges, playouts never place them.
+
+    python mcts.py --size 8 --seconds 2 --workers 4
+"""
+import argparse
+import math
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from random import Random
+from time import perf_counter
+import bitboard
+from game import BLACK, WHITE
+from exceptions import SearchCancelled
+
+EXPLORATION = 1.4
+STOP_CHECK = 16
+
+MctsResult = namedtuple("MctsResult", "score move playouts time")
+
+
+def _apply(move, own, opp, empty, size):
+    """Get (own, opp, empty) of the position after the move index or pass (None), own is to move."""
+    if move is None:
+        return opp, own, empty
+    bit = 1 << move
+    flipped = bitboard.flips(bit, own, opp, size)
+    return opp ^ flipped, own | flipped | bit, empty ^ bit
+
+
+def random_move(own, opp, empty, size, rnd):
+    """Get (move bit, flipped mask) of a random legal move of the own player or (0, 0) if there is none."""
+    near = 0
+    for shift, wrap in bitboard.rays(size):
+        near |= (opp << shift) & wrap if shift > 0 else (opp >> -shift) & wrap
+    candidates = near & empty
+    squares = size * size
+    while candidates:
+        start = rnd.randrange(squares)
+        high = candidates >> start
+        move = (high & -high) << start if high else candidates & -candidates
+        flipped = bitboard.flips(move, own, opp, size)
+        if flipped:
+            return move, flipped
+        candidates ^= move
+    return 0, 0
+
+
+def playout(own, opp, empty, size, rnd):
+    """Play random moves to the end of the game and get disk differential for the own player who is to move."""
+    sign = 1
+    passed = False
+    while True:
+        move, flipped = random_move(own, opp, empty, size, rnd)
+        if move:
+            own, opp, empty = opp ^ flipped, own | flipped | move, empty ^ move
+            passed = False
+        elif passed:
+            break
+        else:
+            own, opp = opp, own
+            passed = True
+        sign = -sign
+    return sign * (bitboard.count(own) - bitboard.count(opp))
+
+
+class Node:
+    """Tree node. Wins are counted for the player who made the move to the node."""
+    __slots__ = ("move", "parent", "children", "untried", "visits", "wins")
+
+    def __init__(self, move=None, parent=None):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = None
+        self.visits = 0
+        self.wins = 0.0
+
+
+class Mcts:
+    """UCT search which keeps its tree between moves."""
+    def __init__(self, exploration=EXPLORATION, seed=None):
+        self.exploration = exploration
+        self._rnd = Random(seed)
+        self._root = None
+        self._position = None
+
+    @property
+    def root(self):
+        """Get root node of the last search or None."""
+        return self._root
+
+    def _moves(self, own, opp, empty, size):
+        """Get move indexes of the node, [None] if the own player must pass and [] if the game is over."""
+        moves = bitboard.legal_moves(own, opp, empty, size)
+        if moves:
+            return list(bitboard.bits(moves))
+        return [None] if bitboard.legal_moves(opp, own, empty, size) else []
+
+    def _reuse(self, position):
+        """Find the position at most two plies below the kept root and make it the root."""
+        if self._root is None or self._position[0] != position[0]:
+            return None
+        size = position[0]
+        nodes = [(self._root, self._position)]
+        for _ in range(3):
+            found = [node for node, node_position in nodes if node_position == position]
+            if found:
+                found[0].parent = None
+                return found[0]
+            nodes = [(child, (size, *_apply(child.move, *node_position[1:4], size),
+                              WHITE if node_position[4] == BLACK else BLACK))
+                     for node, node_position in nodes for child in node.children]
+        return None
+
+    def search(self, size, own, opp, extra, color=BLACK, playouts=None, seconds=None, stop=None):
+        """Grow the tree of the position for the playouts count or seconds and return MctsResult.
+
+        Move of the result is the index of the most visited root move or None if the own
+        player has no moves, score is its win rate. At least one playout is played, without
+        budget 1000 playouts are played. Stop callable cancels the search with SearchCancelled.
+        """
+        started = perf_counter()
+        if playouts is None and seconds is None:
+            playouts = 1000
+        empty = bitboard.full(size) & ~(own | opp | extra)
+        position = (size, own, opp, empty, color)
+        self._root = self._reuse(position) or Node()
+        self._position = position
+        root, rnd, exploration = self._root, self._rnd, self.exploration
+        done = 0
+        while not done or (playouts is None or done < playouts) and (seconds is None or
+                                                                     perf_counter() - started < seconds):
+            if stop is not None and not done % STOP_CHECK and stop():
+                raise SearchCancelled()
+            node, node_own, node_opp, node_empty = root, own, opp, empty
+            while True:
+                if node.untried is None:
+                    node.untried = self._moves(node_own, node_opp, node_empty, size)
+                if node.untried or not node.children:
+                    break
+                scale = exploration * math.sqrt(math.log(node.visits))
+                node = max(node.children, key=lambda child: child.wins / child.visits +
+                           scale / math.sqrt(child.visits))
+                node_own, node_opp, node_empty = _apply(node.move, node_own, node_opp, node_empty, size)
+            if node.untried:
+                move = node.untried.pop(rnd.randrange(len(node.untried)))
+                node_own, node_opp, node_empty = _apply(move, node_own, node_opp, node_empty, size)
+                child = Node(move, node)
+                node.children.append(child)
+                node = child
+            diff = playout(node_own, node_opp, node_empty, size, rnd)
+            reward = 1.0 if diff < 0 else 0.0 if diff > 0 else 0.5
+            while node is not None:
+                node.visits += 1
+                node.wins += reward
+                reward = 1.0 - reward
+                node = node.parent
+            done += 1
+        elapsed = perf_counter() - started
+        if not root.children or root.children[0].move is None:
+            return MctsResult(0.0, None, done, elapsed)
+        best = max(root.children, key=lambda child: child.visits)
+        return MctsResult(best.wins / best.visits, best.move, done, elapsed)
+
+    def root_moves(self):
+        """Get {move index: (visits, wins)} of the root children."""
+        return {child.move: (child.visits, child.wins) for child in self._root.children} if self._root else {}
+
+
+_worker_generation = None
+_pools = {}
+
+
+def _init_worker(generation):
+    """Keep shared search generation in the worker process."""
+    global _worker_generation
+    _worker_generation = generation
+
+
+def _search_root(position, playouts, seconds, seed, search):
+    """Grow a tree of the search generation in the worker process and return (root moves, playouts).
+
+    The tree is cancelled as soon as the shared generation is not the search one.
+    """
+    tree = Mcts(seed=seed)
+    result = tree.search(*position, playouts=playouts, seconds=seconds,
+                         stop=lambda: _worker_generation.value != search)
+    return tree.root_moves(), result.playouts
+
+
+def _pool(workers):
+    """Get process pool of the workers count. Pools live until the interpreter exits."""
+    if workers not in _pools:
+        context = multiprocessing.get_context("spawn")
+        generation = context.Value('q', 0)
+        _pools[workers] = ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                              initargs=(generation,)), generation
+    return _pools[workers]
+
+
+def parallel_mcts(size, own, opp, extra, color=BLACK, playouts=None, seconds=None, workers=None, stop=None,
+                  seed=None):
+    """Grow independent trees in a process pool and return MctsResult of summed root visits.
+
+    Playouts budget is split between workers, time budget is the same for all of them.
+    """
+    started = perf_counter()
+    workers = workers or multiprocessing.cpu_count()
+    if playouts is None and seconds is None:
+        playouts = 1000
+    executor, generation = _pool(workers)
+    generation.value += 1
+    search = generation.value
+    seeds = Random(seed)
+    share = None if playouts is None else max(1, playouts // workers)
+    pending = {executor.submit(_search_root, (size, own, opp, extra, color), share, seconds, seeds.getrandbits(32),
+                               search) for _ in range(workers)}
+    moves = {}
+    done_playouts = 0
+    while pending:
+        done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+        if stop is not None and stop():
+            generation.value += 1
+            for future in pending:
+                future.cancel()
+            raise SearchCancelled()
+        for future in done:
+            root_moves, count = future.result()
+            done_playouts += count
+            for move, (visits, wins) in root_moves.items():
+                total = moves.setdefault(move, [0, 0.0])
+                total[0] += visits
+                total[1] += wins
+    elapsed = perf_counter() - started
+    if not moves or None in moves:
+        return MctsResult(0.0, None, done_playouts, elapsed)
+    best = max(moves, key=lambda move: moves[move][0])
+    return MctsResult(moves[best][1] / moves[best][0], best, done_playouts, elapsed)
+
+
+def main():
+    """Search the start position and report playouts per second."""
+    parser = argparse.ArgumentParser(description="Reversi Monte Carlo tree search.")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--playouts", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from game import BitField
+    black, white, extra = BitField(args.size).masks()
+    seconds = None if args.playouts else args.seconds
+    if args.workers > 1:
+        list(_pool(args.workers)[0].map(abs, range(args.workers * 4)))
+        result = parallel_mcts(args.size, black, white, extra, BLACK, args.playouts, seconds, args.workers,
+                               seed=args.seed)
+    else:
+        result = Mcts(seed=args.seed).search(args.size, black, white, extra, BLACK, args.playouts, seconds)
+    print(f"move {bitboard.coords(result.move, args.size)}, win rate {result.score:.3f}, "
+          f"{result.playouts} playouts in {result.time:.2f} s, {result.playouts / result.time:.0f} playouts/s")
+
+
+if __name__ == "__main__":
+    main()
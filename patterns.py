@@ -0,0 +1,243 @@
+"""Pattern-table evaluation.
+
+Patterns are groups of squares anchored at corners: edges, diagonals,
+corner 3x3 and 2x5 regions. Squares of a pattern are read from its corner,
+so all patterns of one kind share one weight table. Index of a pattern is
+a base-3 number of its squares: 0 is empty (extra disks are taken as empty),
+1 is black and 2 is white. Indices are computed from the disk masks by
+precomputed row segments of every pattern, so search leaves and fields are
+evaluated the same way and moves pay nothing for patterns.
+
+Weight tables of a field size are read lazily from weights/patterns<size>.bin:
+
+    header: magic b"RVPW", version (u8), field size (u8), count of kinds (u8)
+    table:  count of squares (u8), 3 ** count weights (i16)
+
+Weights are scores for black in 1/SCALE of a disk, tables are antisymmetric
+(swapping colors of a pattern negates its weight), so score for white is the
+negated score for black. Tables are fitted to final disk differentials of
+self-play games (see selfplay.py):
+
+    python patterns.py --size 8 --selfplay games.jsonl
+"""
+import argparse
+import json
+import os
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+import struct
+import bitboard
+
+MAGIC = b"RVPW"
+VERSION = 1
+HEADER = struct.Struct("<4sBBB")
+KINDS = ("edge", "diagonal", "corner3x3", "corner2x5")
+LINE_LENGTH = 8
+SCALE = 16
+WEIGHTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights")
+
+Geometry = namedtuple("Geometry", "size kinds lengths instances segments")
+
+
+@lru_cache(maxsize=None)
+def geometry(size):
+    """Get patterns of the field size.
+
+    Instances are (kind, bit indexes) pairs and segments are (shift, mask,
+    powers) row runs of every instance which are used to get indices from masks.
+    """
+    length = min(size, LINE_LENGTH)
+    last = size - 1
+    shapes = {
+        "edge": [[(0, k)] for k in range(length)],
+        "diagonal": [[(k, k)] for k in range(length)],
+        "corner3x3": [[(a, b) for b in range(3)] for a in range(3)],
+        "corner2x5": [[(a, b) for b in range(5)] for a in range(2)] if size >= 5 else [],
+    }
+    instances = []
+    seen = set()
+    for kind in KINDS:
+        squares = [square for row in shapes[kind] for square in row]
+        if not squares:
+            continue
+        for corner_y, corner_x in ((0, 0), (0, last), (last, 0), (last, last)):
+            sign_y, sign_x = (1 if corner_y == 0 else -1), (1 if corner_x == 0 else -1)
+            for transpose in (False, True):
+                coords = [(corner_y + sign_y * (b if transpose else a), corner_x + sign_x * (a if transpose else b))
+                          for a, b in squares]
+                indexes = tuple(bitboard.index(square, size) for square in coords)
+                if frozenset(indexes) not in seen:
+                    seen.add(frozenset(indexes))
+                    instances.append((kind, indexes))
+    segments = []
+    for _, indexes in instances:
+        runs = {}
+        for power, i in enumerate(indexes):
+            runs.setdefault(i // size, {})[i] = 3 ** power
+        instance_segments = []
+        for row in runs.values():
+            first, width = min(row), max(row) - min(row) + 1
+            powers = tuple(sum(row.get(first + j, 0) for j in range(width) if bits >> j & 1)
+                           for bits in range(1 << width))
+            instance_segments.append((first, (1 << width) - 1, powers))
+        segments.append(tuple(instance_segments))
+    lengths = {kind: len(indexes) for kind, indexes in instances}
+    return Geometry(size, tuple(kind for kind in KINDS if kind in lengths), lengths, tuple(instances),
+                    tuple(segments))
+
+
+def indices(black, white, size):
+    """Get indices of all patterns of the field masks."""
+    result = []
+    for instance_segments in geometry(size).segments:
+        index = 0
+        for shift, mask, powers in instance_segments:
+            index += powers[black >> shift & mask] + 2 * powers[white >> shift & mask]
+        result.append(index)
+    return result
+
+
+def swapped(index, length):
+    """Get index of the pattern with swapped colors."""
+    result, power = 0, 1
+    for _ in range(length):
+        index, digit = divmod(index, 3)
+        result += (3 - digit) % 3 * power
+        power *= 3
+    return result
+
+
+class PatternEvaluator:
+    """Static evaluation by pattern weight tables of one field size."""
+    def __init__(self, size, tables):
+        self._size = size
+        self._geometry = geometry(size)
+        self.tables = tables
+        self._instance_tables = tuple(tables[kind] for kind, _ in self._geometry.instances)
+
+    @property
+    def size(self):
+        """Get field size of tables."""
+        return self._size
+
+    def score(self, pattern_indices):
+        """Get score for black of pattern indices."""
+        return sum(table[index] for table, index in zip(self._instance_tables, pattern_indices))
+
+    def evaluate(self, field, color):
+        """Evaluate field for the color with indices kept by the field."""
+        from game import BLACK
+        score = self.score(field.pattern_indices)
+        return score if color == BLACK else -score
+
+    def __call__(self, own, opp, empty, size):
+        """Evaluate position for the own player, it is Engine evaluator."""
+        return self.score(indices(own, opp, size))
+
+
+def weights_path(size, directory=WEIGHTS_DIR):
+    """Get path of weight tables of the field size."""
+    return os.path.join(directory, f"patterns{size}.bin")
+
+
+def read_tables(path, size):
+    """Read weight tables {kind: array} of the field size."""
+    from exceptions import LoadError
+    kinds = geometry(size).lengths
+    try:
+        with open(path, "rb") as file:
+            magic, version, file_size, count = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or file_size != size or count != len(kinds):
+                raise LoadError(f"Weights {path} are broken")
+            tables = {}
+            for kind in geometry(size).kinds:
+                length = file.read(1)
+                if not length or length[0] != kinds[kind]:
+                    raise LoadError(f"Weights {path} are broken")
+                table = array("h")
+                table.frombytes(file.read(3 ** length[0] * table.itemsize))
+                if len(table) != 3 ** length[0]:
+                    raise LoadError(f"Weights {path} are broken")
+                tables[kind] = table
+    except (OSError, struct.error) as exception:
+        raise LoadError(f"Can't read weights {path}: {exception}")
+    return tables
+
+
+def write_tables(path, size, tables):
+    """Write weight tables {kind: sequence of weights} of the field size."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    kinds = geometry(size).kinds
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, size, len(kinds)))
+        for kind in kinds:
+            length = geometry(size).lengths[kind]
+            file.write(bytes((length,)))
+            file.write(array("h", (max(-0x8000, min(0x7FFF, round(w))) for w in tables[kind])).tobytes())
+
+
+_evaluators = {}
+
+
+def evaluator(size, directory=WEIGHTS_DIR):
+    """Get pattern evaluator of the field size or None if there are no weight tables of the size."""
+    path = weights_path(size, directory)
+    if path not in _evaluators:
+        _evaluators[path] = PatternEvaluator(size, read_tables(path, size)) if os.path.exists(path) else None
+    return _evaluators[path]
+
+
+def samples(record, skip=4):
+    """Get (pattern indices, final black - white disks) of positions of the self-play record."""
+    from driver import Reversi, Status
+    from game import BitField
+    game = Reversi(record["size"], backend=BitField)
+    positions = []
+    for ply, coords in enumerate(record["history"]):
+        if game.try_move(tuple(coords)).status is Status.GAME_OVER:
+            break
+        if ply >= skip:
+            positions.append(list(game.field.pattern_indices))
+    result = record["black_count"] - record["white_count"]
+    return [(position, result) for position in positions]
+
+
+def fit(data, size, epochs=5, rate=0.005):
+    """Fit antisymmetric weight tables {kind: list} to (pattern indices, result) samples by SGD."""
+    geometry_ = geometry(size)
+    tables = {kind: [0.0] * 3 ** geometry_.lengths[kind] for kind in geometry_.kinds}
+    instance_kinds = [(tables[kind], len(indexes)) for kind, indexes in geometry_.instances]
+    for _ in range(epochs):
+        for pattern_indices, result in data:
+            error = result - sum(table[index] for (table, _), index in zip(instance_kinds, pattern_indices))
+            for (table, length), index in zip(instance_kinds, pattern_indices):
+                step = rate * error
+                table[index] += step
+                table[swapped(index, length)] -= step
+    return {kind: [weight * SCALE for weight in table] for kind, table in tables.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit Reversi pattern weight tables.")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--selfplay", nargs="+", required=True, help="JSON lines of selfplay.py")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=0.005)
+    parser.add_argument("--output", help="weights file, weights/patterns<size>.bin by default")
+    args = parser.parse_args(argv)
+
+    data = []
+    for path in args.selfplay:
+        with open(path) as file:
+            for line in file:
+                record = json.loads(line)
+                if record["size"] == args.size and record["mode"] == "Classic":
+                    data.extend(samples(record))
+    output = args.output or weights_path(args.size)
+    write_tables(output, args.size, fit(data, args.size, args.epochs, args.rate))
+    print(f"{output}: fitted to {len(data)} positions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Perft and move generation benchmark.
+
+Perft counts leaf positions of the game tree to the fixed depth through the
+Reversi API (try_move/try_extra and unmake_move). Passes are made inside
+try_move, so they are not plies; finished games are leaves. In Extra mode
+every empty square which is not a correct move is a move too while extra
+disks are left.
+
+Counts are checked against REFERENCE, which was computed with the list
+Field. Results are written as JSON and can be compared with a baseline:
+
+    python perft.py --output bench.json
+    python perft.py --baseline bench.json
+"""
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+from time import perf_counter
+from driver import Reversi, Status
+from game import Field, BitField, EMPTY
+
+BACKENDS = {"list": Field, "bitboard": BitField}
+
+CASES = (
+    (4, "Classic", 10), (6, "Classic", 6), (8, "Classic", 6), (16, "Classic", 5), (30, "Classic", 5),
+    (4, "Extra", 5), (6, "Extra", 3), (8, "Extra", 2), (16, "Extra", 2), (30, "Extra", 1),
+)
+
+REFERENCE = {
+    (4, "Classic", 10): 41636, (6, "Classic", 6): 7604, (8, "Classic", 6): 8200,
+    (16, "Classic", 5): 1396, (30, "Classic", 5): 1396,
+    (4, "Extra", 5): 13676, (6, "Extra", 3): 29760, (8, "Extra", 2): 3540,
+    (16, "Extra", 2): 63252, (30, "Extra", 1): 896,
+}
+
+
+def play(move, coords):
+    """Make move with try_move or try_extra and say that game is over."""
+    return move(coords).status is Status.GAME_OVER
+
+
+def extra_moves(game, moves):
+    """Get squares where extra disk can be placed."""
+    field = game.field
+    if game.mode != "Extra" or not field.possibility_extra:
+        return []
+    return [(y, x) for y in range(field.size) for x in range(field.size)
+            if field[y, x] == EMPTY and (y, x) not in moves]
+
+
+def perft(game, depth):
+    """Count leaves of the game tree."""
+    if depth == 0:
+        return 1
+    moves = game.get_moves_to_flip()
+    nodes = 0
+    for coords, flipped in moves.items():
+        over = game.apply_move(coords, flipped).status is Status.GAME_OVER
+        nodes += 1 if over or depth == 1 else perft(game, depth - 1)
+        game.unmake_move()
+    for coords in extra_moves(game, moves):
+        over = play(game.try_extra, coords)
+        nodes += 1 if over or depth == 1 else perft(game, depth - 1)
+        game.unmake_move()
+    return nodes
+
+
+def run_case(size, mode, depth, backend, memory=True):
+    """Run perft case and return its result record."""
+    game = Reversi(size, mode=mode, backend=backend)
+    started = perf_counter()
+    nodes = perft(game, depth)
+    elapsed = perf_counter() - started
+    peak = None
+    if memory:
+        tracemalloc.start()
+        perft(Reversi(size, mode=mode, backend=backend), depth)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    expected = REFERENCE.get((size, mode, depth))
+    return {
+        "case": f"{size}x{size} {mode} depth {depth}",
+        "nodes": nodes,
+        "expected": expected,
+        "ok": expected is None or nodes == expected,
+        "seconds": elapsed,
+        "nodes_per_second": nodes / elapsed if elapsed else None,
+        "peak_bytes": peak,
+    }
+
+
+def midgame(size, backend, plies=10):
+    """Get game after plies of the first correct moves."""
+    game = Reversi(size, backend=backend)
+    for ply in range(plies):
+        moves = game.get_correct_moves()
+        if play(game.try_move, moves[ply % len(moves)]):
+            game.unmake_move()
+            break
+    return game
+
+
+def time_calls(function, repeat):
+    """Get seconds per call."""
+    started = perf_counter()
+    for _ in range(repeat):
+        function()
+    return (perf_counter() - started) / repeat
+
+
+def function_timings(size, backend, repeat=200):
+    """Time the move generation functions on the middle game position."""
+    game = midgame(size, backend)
+    moves = game.get_correct_moves()
+    coords = moves[0]
+    corner = (0, 0)
+    disk = game.is_correct_move(coords)[0]
+
+    def get_correct_moves():
+        game.reset_moves_cache()
+        game.get_correct_moves()
+
+    def is_correct_move():
+        game.reset_moves_cache()
+        game.is_correct_move(coords)
+        game.is_correct_move(corner)
+
+    def make_move():
+        play(game.try_move, coords)
+        game.unmake_move()
+
+    def flip():
+        game.field.flip(disk)
+        game.field.flip(disk)
+
+    return {name: time_calls(function, repeat) for name, function in (
+        ("get_correct_moves", get_correct_moves), ("is_correct_move", is_correct_move),
+        ("make_move+unmake_move", make_move), ("Field.flip x2", flip))}
+
+
+def compare(results, baseline, tolerance):
+    """Print ratios to the baseline and return list of regressions."""
+    regressions = []
+    old_cases = {case["case"]: case for case in baseline["cases"]}
+    for case in results["cases"]:
+        old = old_cases.get(case["case"])
+        if old and old["seconds"]:
+            ratio = case["seconds"] / old["seconds"]
+            print(f"{case['case']}: {ratio:.2f}x of baseline time")
+            if ratio > 1 + tolerance:
+                regressions.append(case["case"])
+    for size, timings in results["functions"].items():
+        for name, seconds in timings.items():
+            old = baseline["functions"].get(size, {}).get(name)
+            if old:
+                ratio = seconds / old
+                print(f"{size}x{size} {name}: {ratio:.2f}x of baseline time")
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{size}x{size} {name}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reversi perft and move generation benchmark.")
+    parser.add_argument("--backend", choices=BACKENDS, default="bitboard")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 6, 8, 16, 30])
+    parser.add_argument("--modes", nargs="+", default=["Classic", "Extra"], choices=["Classic", "Extra"])
+    parser.add_argument("--no-memory", action="store_true", help="skip peak memory measurement")
+    parser.add_argument("--output", help="file to save JSON results")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown, 0.1 is 10%%")
+    args = parser.parse_args(argv)
+
+    backend = BACKENDS[args.backend]
+    results = {"python": platform.python_version(), "backend": args.backend, "cases": [], "functions": {}}
+    for size, mode, depth in CASES:
+        if size in args.sizes and mode in args.modes:
+            case = run_case(size, mode, depth, backend, not args.no_memory)
+            results["cases"].append(case)
+            memory = "" if case["peak_bytes"] is None else f", peak {case['peak_bytes']} B"
+            print(f"{case['case']}: {case['nodes']} nodes {'ok' if case['ok'] else 'MISMATCH'}, "
+                  f"{case['seconds']:.3f} s, {case['nodes_per_second']:.0f} nodes/s{memory}")
+    for size in args.sizes:
+        results["functions"][str(size)] = function_timings(size, backend)
+        for name, seconds in results["functions"][str(size)].items():
+            print(f"{size}x{size} {name}: {seconds * 1e6:.1f} us")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    failed = [case["case"] for case in results["cases"] if not case["ok"]]
+    if args.baseline:
+        with open(args.baseline) as file:
+            failed += compare(results, json.load(file), args.tolerance)
+    if failed:
+        print(f"Failed: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Pondering: AI search on the opponent's time.
+
+While the human thinks, Ponderer plays the likeliest human replies on a
+copy of the game in a background thread and searches AI answer to each of
+them. Replies are ordered by a shallow search from the human's side. Answers
+are kept by position hash (Reversi.hash), so when the human plays one of the
+replies the answer is ready at once. Searches share the transposition table
+with the AI, so even when the reply was not pondered or its search was not
+finished the next search starts from a filled table. MCTS answers are searched
+in new trees, so the tree kept by the AI is not touched.
+"""
+import threading
+from copy import deepcopy
+from driver import AI_TABLE, Status
+from engine import Engine
+from game import BLACK
+from exceptions import SearchCancelled
+import bitboard
+
+REPLIES = 3
+ORDER_DEPTH = 2
+
+
+class Ponderer:
+    """Background search of AI answers to likely replies of the player to move."""
+    def __init__(self, game, replies=REPLIES, table=AI_TABLE):
+        self._game = deepcopy(game)
+        self._replies = replies
+        self._table = table
+        self._stop = threading.Event()
+        self._results = {}
+        self._thread = threading.Thread(target=self._run, name="ponder", daemon=True)
+
+    def start(self):
+        """Start pondering and return self."""
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Ask pondering to stop, search in progress is thrown away."""
+        self._stop.set()
+
+    def join(self, timeout=None):
+        """Wait for the end of pondering."""
+        self._thread.join(timeout)
+
+    @property
+    def done(self):
+        """Said that all replies were pondered or pondering was cancelled."""
+        return not self._thread.is_alive()
+
+    def replies(self):
+        """Get likely replies of the player to move, the likeliest one is the first."""
+        size = self._game.field.size
+        black, white, extra = self._game.field.masks()
+        color = self._game.current_player
+        own, opp = (black, white) if color == BLACK else (white, black)
+        engine = Engine(size, ORDER_DEPTH, stop=self._stop.is_set)
+        scores = {coords: engine.search_move(own, opp, extra, color, bitboard.index(coords, size))
+                  for coords in self._game.get_correct_moves()}
+        return sorted(scores, key=lambda coords: -scores[coords])[:self._replies]
+
+    def _run(self):
+        try:
+            for coords in self.replies():
+                game = deepcopy(self._game)
+                if game.try_move(coords).status is not Status.OK:
+                    continue
+                self._results[game.hash] = game.choose_move(stop=self._stop.is_set, table=self._table, tree=None)
+        except SearchCancelled:
+            pass
+
+    def result(self, game):
+        """Get pondered AI move of the game or None if the position was not pondered."""
+        coords = self._results.get(game.hash)
+        return coords if coords is not None and game.is_correct_move(coords) else None
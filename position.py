@@ -0,0 +1,144 @@
+"""Compact immutable positions.
+
+Position is a slotted named tuple of the field size, disk masks and side to
+move, so it is hashable, comparable and costs one tuple of ints. Count of
+extra disks is the count of bits of the extra mask. Packed position uses the
+board planes of gamefile.py:
+
+    size (u8), side to move (u8, 0 is black), low plane, high plane
+
+Low plane has black and extra disks, high plane has white and extra disks,
+each plane is size * size bits, little endian. PositionArray keeps packed
+positions of one field size without the size byte in one bytearray, an 8x8
+position takes 17 bytes, so millions of positions fit in tens of megabytes.
+"""
+from collections import namedtuple
+from game import BLACK, WHITE
+from exceptions import IllegalArgumentError, LoadError
+import bitboard
+import zobrist
+
+PLAYERS = (BLACK, WHITE)
+
+
+def plane_bytes(size):
+    """Get count of bytes of one board plane."""
+    return (size * size + 7) // 8
+
+
+class Position(namedtuple("Position", "size black white extra player")):
+    """Immutable position: field size, black, white and extra masks and side to move."""
+    __slots__ = ()
+
+    @property
+    def black_count(self):
+        """Get count of black disks."""
+        return bitboard.count(self.black)
+
+    @property
+    def white_count(self):
+        """Get count of white disks."""
+        return bitboard.count(self.white)
+
+    @property
+    def extra_count(self):
+        """Get count of extra disks."""
+        return bitboard.count(self.extra)
+
+    @property
+    def empty(self):
+        """Get mask of empty squares."""
+        return bitboard.full(self.size) & ~(self.black | self.white | self.extra)
+
+    @property
+    def hash(self):
+        """Get Zobrist hash of the position with side to move, it is the same as Reversi.hash."""
+        return zobrist.hash_masks(self.black, self.white, self.extra, self.size, self.player == WHITE)
+
+    def record(self):
+        """Get packed position without the size byte."""
+        planes = plane_bytes(self.size)
+        return (bytes((PLAYERS.index(self.player),)) + (self.black | self.extra).to_bytes(planes, "little")
+                + (self.white | self.extra).to_bytes(planes, "little"))
+
+    def pack(self):
+        """Get packed position."""
+        return bytes((self.size,)) + self.record()
+
+    @classmethod
+    def from_record(cls, size, data):
+        """Get position of the packed bytes-like data without the size byte."""
+        planes = plane_bytes(size)
+        if len(data) != 1 + 2 * planes or data[0] >= len(PLAYERS):
+            raise LoadError("Packed position is broken")
+        low = int.from_bytes(data[1:1 + planes], "little")
+        high = int.from_bytes(data[1 + planes:], "little")
+        return cls(size, low & ~high, high & ~low, low & high, PLAYERS[data[0]])
+
+    @classmethod
+    def unpack(cls, data):
+        """Get position of the packed bytes-like data."""
+        if not data or data[0] % 2 or not 4 <= data[0] <= 30:
+            raise LoadError("Packed position is broken")
+        return cls.from_record(data[0], memoryview(data)[1:])
+
+
+class PositionArray:
+    """Packed positions of one field size in a bytearray."""
+    __slots__ = ("_size", "_width", "_data")
+
+    def __init__(self, size, positions=()):
+        self._size = size
+        self._width = 1 + 2 * plane_bytes(size)
+        self._data = bytearray()
+        self.extend(positions)
+
+    @classmethod
+    def frombytes(cls, size, data):
+        """Create array of packed records of the field size, see tobytes."""
+        array_ = cls(size)
+        if len(data) % array_._width:
+            raise LoadError("Packed positions are truncated")
+        array_._data = bytearray(data)
+        return array_
+
+    @property
+    def size(self):
+        """Get field size of positions."""
+        return self._size
+
+    @property
+    def nbytes(self):
+        """Get count of bytes of packed positions."""
+        return len(self._data)
+
+    def append(self, position):
+        """Add position to the end."""
+        if position.size != self._size:
+            raise IllegalArgumentError(f"Position of size {position.size} can't be stored with size {self._size}")
+        self._data += position.record()
+
+    def extend(self, positions):
+        """Add positions to the end."""
+        for position in positions:
+            self.append(position)
+
+    def tobytes(self):
+        """Get packed records of all positions."""
+        return bytes(self._data)
+
+    def __len__(self):
+        return len(self._data) // self._width
+
+    def __getitem__(self, index):
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("position index out of range")
+        start = index * self._width
+        return Position.from_record(self._size, self._data[start:start + self._width])
+
+    def __iter__(self):
+        for start in range(0, len(self._data), self._width):
+            yield Position.from_record(self._size, self._data[start:start + self._width])
@@ -1,12 +1,20 @@
 import sys
+import argparse
 import logging
-import pickle
-
-LOGGER = logging.getLogger("reversi")
-logging.basicConfig(filename="reversi.log", level=logging.INFO)
+import threading
+from copy import deepcopy
+from time import monotonic
+import gamelog
+from gamelog import LOGGER
 
 try:
     from driver import *
+    import bitboard
+    import gamefile
+    from stats import SearchStats
+    from clock import Clock
+    from ponder import Ponderer
+    from exceptions import SaveError, LoadError
 except Exception as e:
     LOGGER.error(e)
     sys.exit(f"Game modules not found: \"{e}\"")
@@ -46,10 +54,17 @@ class MainWindow(QtWidgets.QWidget):
 
         button_new_game = QtWidgets.QPushButton("New game")
         button_restart = QtWidgets.QPushButton("Restart")
+        button_undo = QtWidgets.QPushButton("Undo")
+        button_redo = QtWidgets.QPushButton("Redo")
         button_save_game = QtWidgets.QPushButton("Save")
         button_load_game = QtWidgets.QPushButton("Load")
         button_about = QtWidgets.QPushButton("About")
         button_exit = QtWidgets.QPushButton("Exit")
+        stats_box = QtWidgets.QCheckBox("AI stats")
+        ponder_box = QtWidgets.QCheckBox("Ponder")
+        stats_label = QtWidgets.QLabel(self)
+        stats_label.setStyleSheet("font-size: 8pt")
+        self._frame.stats_msg[str].connect(stats_label.setText)
 
         layout = QtWidgets.QGridLayout()
 
@@ -65,19 +80,30 @@ class MainWindow(QtWidgets.QWidget):
 
         self._frame.setFocusPolicy(QtCore.Qt.StrongFocus)
 
-        layout.addWidget(button_new_game, 25, 50, 3, 9)
-        layout.addWidget(button_restart, 28, 50, 3, 9)
-        layout.addWidget(button_save_game, 31, 50, 3, 9)
-        layout.addWidget(button_load_game, 34, 50, 3, 9)
-        layout.addWidget(button_about, 37, 50, 3, 9)
-        layout.addWidget(button_exit, 40, 50, 3, 9)
+        layout.addWidget(button_new_game, 24, 50, 3, 9)
+        layout.addWidget(button_restart, 27, 50, 3, 9)
+        layout.addWidget(button_undo, 30, 50, 3, 4)
+        layout.addWidget(button_redo, 30, 55, 3, 4)
+        layout.addWidget(button_save_game, 33, 50, 3, 9)
+        layout.addWidget(button_load_game, 36, 50, 3, 9)
+        layout.addWidget(button_about, 39, 50, 3, 9)
+        layout.addWidget(button_exit, 42, 50, 3, 9)
+        layout.addWidget(stats_box, 45, 50, 1, 5)
+        layout.addWidget(ponder_box, 45, 55, 1, 4)
+        layout.addWidget(stats_label, 46, 50, 4, 9)
 
         button_new_game.clicked.connect(self._dialog.show)
         button_restart.clicked.connect(self._restart)
+        button_undo.clicked.connect(self._frame.undo)
+        button_redo.clicked.connect(self._frame.redo)
         button_save_game.clicked.connect(self._save)
         button_load_game.clicked.connect(self._load)
         button_about.clicked.connect(self._about)
         button_exit.clicked.connect(self.close)
+        stats_box.toggled.connect(self._toggle_stats)
+        ponder_box.toggled.connect(self._toggle_pondering)
+        stats_box.toggled.connect(stats_label.setVisible)
+        stats_label.hide()
 
         self.setLayout(layout)
 
@@ -93,28 +119,25 @@ class MainWindow(QtWidgets.QWidget):
         self._dialog.show()
         self._start_params = self._dialog.params
         self._dialog.hide()
-        self._frame._game = Reversi(**self._start_params)
-        self._frame.send_messages()
+        self._frame.set_game(Reversi(backend=BitField, **self._start_params))
         self.update()
         self.show()
 
     def _restart(self):
         """Restart game with start parameters."""
-        self._frame._game = Reversi(**self._start_params)
-        self._frame.send_messages()
+        self._frame.set_game(Reversi(backend=BitField, **self._start_params))
         self.update()
         LOGGER.info(f"Game was restarted with {self._start_params} parameters.")
 
     def _save(self):
         """Save game to .dat file."""
         filename, _ = QtWidgets.QFileDialog(self).getSaveFileName(self, "Save game",
-                                                                  f"game_name",
+                                                                  "game_name",
                                                                   "DAT files (*.dat)")
         try:
             if filename:
-                with open(filename, 'wb') as file:
-                    pickle.dump(self._frame.game, file)
-                    LOGGER.info(f"Game was saved into {filename} file.")
+                gamefile.save(filename, self._frame.game)
+                LOGGER.info(f"Game was saved into {filename} file.")
         except SaveError as exception:
             LOGGER.warning(exception)
             QtWidgets.QMessageBox.warning(self, "Error", f"Save error: {exception}.", QtWidgets.QMessageBox.Ok)
@@ -122,21 +145,30 @@ class MainWindow(QtWidgets.QWidget):
     def _load(self):
         """Load game from .dat file"""
         filename, _ = QtWidgets.QFileDialog(self).getOpenFileName(self, "Load game",
-                                                                  f"game_name",
+                                                                  "game_name",
                                                                   "DAT files (*.dat)")
         try:
             if filename:
-                with open(filename, 'rb') as file:
-                    object_ = pickle.load(file)
-                    if not type(object_) == Reversi:
-                        raise LoadError("Incorrect .dat game file.")
-                    self._frame._game = object_
-                    self._frame.send_messages()
-                    self.update()
-                    LOGGER.info(f"Game was loaded from {filename} file.")
+                self._frame.set_game(gamefile.load(filename))
+                self.update()
+                LOGGER.info(f"Game was loaded from {filename} file.")
         except LoadError as exception:
             LOGGER.warning(exception)
-            QtWidgets.QMessageBox.warning(self, "Error", f"Save error: {exception}.", QtWidgets.QMessageBox.Ok)
+            QtWidgets.QMessageBox.warning(self, "Error", f"Load error: {exception}.", QtWidgets.QMessageBox.Ok)
+
+    def closeEvent(self, event):
+        self._frame.shutdown()
+        super().closeEvent(event)
+
+    def _toggle_stats(self, enabled):
+        """Collect search stats of the next AI moves."""
+        self._frame.ai_stats = enabled
+
+    def _toggle_pondering(self, enabled):
+        """Search AI answers while the human thinks."""
+        self._frame.pondering = enabled
+        if not enabled:
+            self._frame.cancel_pondering()
 
     def _about(self):
         QtWidgets.QMessageBox.information(self, "About the game",
@@ -149,15 +181,77 @@ class MainWindow(QtWidgets.QWidget):
                                           QtWidgets.QMessageBox.Ok)
 
 
+class AiWorker(QtCore.QThread):
+    """Thread which searches AI move on a snapshot of the game. Move found by pondering is sent without search."""
+    move_found = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, game, workers=1, stats=False, clock=None, move=None, parent=None):
+        super().__init__(parent)
+        self._move = move
+        self._game = deepcopy(game)
+        self._workers = workers
+        self._clock = clock
+        self.stats = SearchStats() if stats else None
+        self._stop = threading.Event()
+        self.started_at = monotonic()
+        self.elapsed = None
+
+    def cancel(self):
+        """Ask search to stop. Result of cancelled search is never sent."""
+        self._stop.set()
+
+    def run(self):
+        if self._move is not None:
+            self.elapsed = monotonic() - self.started_at
+            self.move_found.emit(self, self._move)
+            return
+        try:
+            coords = self._game.choose_move(stop=self._stop.is_set, workers=self._workers, stats=self.stats,
+                                            clock=self._clock)
+        except SearchCancelled:
+            return
+        self.elapsed = monotonic() - self.started_at
+        if not self._stop.is_set():
+            self.move_found.emit(self, coords)
+
+
 class Frame(QtWidgets.QFrame):
-    """Game widget."""
+    """Game widget.
+
+    Field is drawn in layers: grid pixmap is rendered once per widget or field
+    size, board pixmap keeps the grid with disks and only squares which changed
+    since the last frame are redrawn on it with cached disk sprites. Move
+    hints are drawn over the board from the game's move cache. Changes are
+    painted through update() of the dirty squares only.
+    """
+    BACKGROUND_COLOR = (255, 255, 204)
+    HINT_COLOR = (255, 255, 153)
+    DISK_COLORS = {WHITE: (255, 255, 255), BLACK: (0, 0, 0), EXTRA: (178, 34, 34)}
+
     white_score_msg = QtCore.pyqtSignal(str)
     black_score_msg = QtCore.pyqtSignal(str)
     current_player_msg = QtCore.pyqtSignal(str)
+    stats_msg = QtCore.pyqtSignal(str)
 
-    def __init__(self, parent=None, **params):
+    def __init__(self, parent=None, ai_delay=1.0, ai_workers=1, clock_seconds=600.0,
+                 **params):
         super().__init__(parent)
-        self._game = Reversi(**params)
+        self._game = Reversi(backend=BitField, **params)
+        self.clock_seconds = clock_seconds
+        self._clock = Clock(clock_seconds)
+        self._worker = None
+        self._cancelled = set()
+        self.ai_delay = ai_delay
+        self.ai_workers = ai_workers
+        self.ai_stats = False
+        self.pondering = False
+        self._ponderer = None
+        self._grid = None
+        self._board = None
+        self._board_key = None
+        self._sprites = {}
+        self._shown = (0, 0, 0)
+        self._hints = set()
         self.setFixedSize(460, 460)
         LOGGER.info(f"Game frame was initialized with {params} parameters.")
 
@@ -166,64 +260,267 @@ class Frame(QtWidgets.QFrame):
         """Game property"""
         return self._game
 
+    def set_game(self, game):
+        """Replace game, search of the previous one is cancelled. AI starts if it is to move in the game."""
+        self.cancel_ai()
+        self._game = game
+        self._clock = Clock(self.clock_seconds)
+        gamelog.event("new_game", size=game.field.size, mode=game.mode, opponent=game.opponent, lvl=game.lvl,
+                      first_player=game.first_player, moves=len(game.history))
+        self.send_messages()
+        self.refresh()
+        self.resume_ai()
+
+    def start_ai(self):
+        """Start AI search in the worker thread, the move is ready at once if the position was pondered."""
+        move = self._ponderer.result(self._game) if self._ponderer is not None else None
+        if move is not None:
+            LOGGER.info(f"AI move {move} was found by pondering.")
+        self.cancel_ai()
+        self._worker = AiWorker(self._game, self.ai_workers, self.ai_stats, self._clock, move, self)
+        self._worker.move_found.connect(self._ai_move_found)
+        self._worker.finished.connect(self._worker.deleteLater)
+        self._worker.start()
+        self.current_player_msg.emit(f"{self._game.str_player} is thinking...")
+
+    def resume_ai(self):
+        """Start AI search if it is the turn of the AI opponent."""
+        if self._game.opponent == "Ai" and self._game.current_player != self._game.first_player:
+            self.start_ai()
+
+    def cancel_pondering(self):
+        """Cancel pondering if it is in progress."""
+        if self._ponderer is not None:
+            self._ponderer.cancel()
+            self._ponderer = None
+
+    def cancel_ai(self):
+        """Cancel AI search and pondering if they are in progress.
+
+        Cancelled worker is kept until its thread finishes, so it is never destroyed while running.
+        """
+        self.cancel_pondering()
+        if self._worker is not None:
+            worker = self._worker
+            worker.cancel()
+            self._cancelled.add(worker)
+            worker.finished.connect(lambda: self._cancelled.discard(worker))
+            if worker.isFinished():
+                self._cancelled.discard(worker)
+            self._worker = None
+            LOGGER.info("AI search was cancelled.")
+
+    def shutdown(self):
+        """Cancel AI search and pondering and wait for their threads."""
+        ponderer = self._ponderer
+        self.cancel_ai()
+        for worker in list(self._cancelled):
+            worker.wait()
+        if ponderer is not None:
+            ponderer.join()
+
+    def _ai_move_found(self, worker, coords):
+        """Make found AI move, but not earlier than ai_delay seconds after search start."""
+        if worker is not self._worker:
+            return
+        delay = self.ai_delay - (monotonic() - worker.started_at)
+        if delay > 0:
+            QtCore.QTimer.singleShot(int(delay * 1000), lambda: self._make_ai_move(worker, coords))
+        else:
+            self._make_ai_move(worker, coords)
+
+    def _make_ai_move(self, worker, coords):
+        """Make AI move if its search was not cancelled."""
+        if worker is not self._worker:
+            return
+        self._worker = None
+        if worker.stats is not None:
+            self.stats_msg.emit(str(worker.stats))
+        try:
+            self._game.make_move(coords)
+            self._log_move("ai", worker.elapsed, worker.stats)
+            self.send_messages()
+            if self.pondering:
+                self._ponderer = Ponderer(self._game).start()
+        except NoMovesException:
+            self._log_move("ai", worker.elapsed, worker.stats)
+            self.send_messages()
+            LOGGER.info(f"No moves for {self._game.str_player}'s opponent")
+            QtWidgets.QMessageBox.warning(self, "Warning",
+                                          "Next player can't move.", QtWidgets.QMessageBox.Ok)
+            self.start_ai()
+        except GameOverException:
+            self._log_move("ai", worker.elapsed, worker.stats)
+            self._game_over()
+        self.refresh()
+
+    def _log_move(self, source, seconds=None, stats=None):
+        """Log the last move of the game with search stats of AI move if they were collected."""
+        move = self._game.history[-1]
+        LOGGER.info(f"{move.player} made move to {move.coords} place.")
+        if stats is not None:
+            LOGGER.debug(f"AI search: {stats.as_dict()}")
+        gamelog.event("move", player=move.player, coords=move.coords, disk=move.disk, flips=len(move.flipped),
+                      source=source, seconds=seconds, black=self._game.field.black_count,
+                      white=self._game.field.white_count, **({"stats": stats.as_dict()} if stats else {}))
+
+    def _game_over(self):
+        """Show winner."""
+        self.send_messages()
+        self._clock.press(None)
+        self.current_player_msg.emit("Game over!")
+        LOGGER.info(f"Game over. {self._game.winner}.")
+        gamelog.event("game_over", winner=self._game.winner, black=self._game.field.black_count,
+                      white=self._game.field.white_count, moves=len(self._game.history))
+        QtWidgets.QMessageBox.information(self, "Game over",
+                                          f"'{self._game.winner}", QtWidgets.QMessageBox.Ok)
+
     def send_messages(self):
-        """Send messages to main window."""
+        """Send messages to main window and run the clock of the current player."""
+        self._clock.press(self._game.current_player)
         self.white_score_msg.emit(str(self._game.field.white_count))
         self.black_score_msg.emit(str(self._game.field.black_count))
         self.current_player_msg.emit("Current turn: " + self._game.str_player)
-        LOGGER.info("Messages was sent from game frame to main window.")
-
-    def paintEvent(self, event):
-        # draw background
-        qp = QtGui.QPainter(self)
-        qp.setBrush(QtGui.QColor(255, 255, 204))
-        qp.drawRect(QtCore.QRectF(0, 0, self.height(), self.width()))
 
-        for i in range(self._game.field.size):
-            # draw field lines
-            x = self.width() / self._game.field.size * i
+    def _cell(self, y, x):
+        """Get rect of the square in pixels."""
+        size = self._game.field.size
+        left, top = self.width() * x // size, self.height() * y // size
+        return QtCore.QRect(left, top, self.width() * (x + 1) // size - left, self.height() * (y + 1) // size - top)
+
+    def _render_grid(self):
+        """Draw background and field lines."""
+        size = self._game.field.size
+        grid = QtGui.QPixmap(self.size())
+        grid.fill(QtGui.QColor(*self.BACKGROUND_COLOR))
+        qp = QtGui.QPainter(grid)
+        qp.drawRect(0, 0, self.width() - 1, self.height() - 1)
+        for i in range(1, size):
+            x = self.width() * i // size
             qp.drawLine(x, 0, x, self.height())
-
-            y = self.height() / self._game.field.size * i
+            y = self.height() * i // size
             qp.drawLine(0, y, self.width(), y)
+        qp.end()
+        return grid
+
+    def _render_sprites(self):
+        """Draw disk sprites of the square size."""
+        rect = self._cell(0, 0)
+        sprites = {}
+        for disk, color in self.DISK_COLORS.items():
+            sprite = QtGui.QPixmap(rect.size())
+            sprite.fill(QtCore.Qt.transparent)
+            qp = QtGui.QPainter(sprite)
+            qp.setRenderHint(QtGui.QPainter.Antialiasing)
+            qp.setBrush(QtGui.QColor(*color))
+            qp.drawEllipse(QtCore.QRectF(0.5, 0.5, rect.width() - 1, rect.height() - 1))
+            qp.end()
+            sprites[disk] = sprite
+        return sprites
+
+    def _sync(self):
+        """Redraw changed squares on the board pixmap and get rects of changed squares and hints."""
+        field = self._game.field
+        key = (self.width(), self.height(), field.size)
+        masks = field.masks()
+        dirty = []
+        if self._board_key != key:
+            self._grid = self._render_grid()
+            self._sprites = self._render_sprites()
+            self._board = QtGui.QPixmap(self._grid)
+            self._board_key = key
+            self._shown = (0, 0, 0)
+            self._hints = set()
+            dirty.append(self.rect())
+        changed = 0
+        for shown, mask in zip(self._shown, masks):
+            changed |= shown ^ mask
+        if changed:
+            qp = QtGui.QPainter(self._board)
+            for i in bitboard.bits(changed):
+                y, x = bitboard.coords(i, field.size)
+                rect = self._cell(y, x)
+                qp.drawPixmap(rect, self._grid, rect)
+                sprite = self._sprites.get(field[y, x])
+                if sprite is not None:
+                    qp.drawPixmap(rect, sprite)
+                dirty.append(rect)
+            qp.end()
+        self._shown = masks
+        hints = set(self._game.get_correct_moves())
+        dirty.extend(self._cell(y, x) for y, x in hints ^ self._hints)
+        self._hints = hints
+        return dirty
+
+    def refresh(self):
+        """Repaint squares which changed since the last frame."""
+        region = QtGui.QRegion()
+        for rect in self._sync():
+            region += rect
+        if not region.isEmpty():
+            self.update(region)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.refresh()
 
-        for height in range(self._game.field.size):
-            for width in range(self._game.field.size):
-                # draw disks
-                w = self.width() / self._game.field.size
-                h = self.height() / self._game.field.size
-
-                y = h * height
-                x = w * width
-
-                rect = QtCore.QRectF(x, y, w, h)
-
-                disk = self._game.field[height, width]
-                if disk == WHITE:
-                    qp.setBrush(QtGui.QColor(255, 255, 255))
-                    qp.drawEllipse(rect)
-                if disk == BLACK:
-                    qp.setBrush(QtGui.QColor(0, 0, 0))
-                    qp.drawEllipse(rect)
-                if disk == EXTRA:
-                    qp.setBrush(QtGui.QColor(178, 34, 34))
-                    qp.drawEllipse(rect)
-
-        for y, x in self._game.get_correct_moves():
-            # draw possible moves
-            w = self.width() / self._game.field.size
-            h = self.height() / self._game.field.size
-            rect = QtCore.QRectF(x * w, y * h, w, h)
-            qp.setBrush(QtGui.QColor(255, 255, 153))
-            qp.drawRect(rect)
+    def paintEvent(self, event):
+        dirty = QtGui.QRegion()
+        for rect in self._sync():
+            dirty += rect
+        qp = QtGui.QPainter(self)
+        qp.drawPixmap(event.rect(), self._board, event.rect())
+        qp.setBrush(QtGui.QColor(*self.HINT_COLOR))
+        for y, x in self._hints:
+            rect = self._cell(y, x)
+            if rect.intersects(event.rect()):
+                qp.drawRect(rect.adjusted(0, 0, -1, -1))
+        qp.end()
+        dirty -= event.region()
+        if not dirty.isEmpty():
+            self.update(dirty)
+
+    def undo(self):
+        """Take back moves until it is human's turn."""
+        self.cancel_ai()
+        if not self._game.can_unmake():
+            return
+        self._game.unmake_move()
+        while self._game.opponent == "Ai" and self._game.can_unmake() and \
+                self._game.current_player != self._game.first_player:
+            self._game.unmake_move()
+        LOGGER.info(f"Move was taken back, current turn: {self._game.str_player}.")
+        gamelog.event("undo", moves=len(self._game.history))
+        self.send_messages()
+        self.refresh()
+
+    def redo(self):
+        """Make again taken back moves until it is human's turn."""
+        self.cancel_ai()
+        try:
+            while self._game.can_redo():
+                self._game.redo_move()
+                if self._game.opponent != "Ai" or self._game.current_player == self._game.first_player:
+                    break
+        except NoMovesException:
+            pass
+        except GameOverException:
+            self._game_over()
+            self.refresh()
+            return
+        LOGGER.info(f"Move was made again, current turn: {self._game.str_player}.")
+        gamelog.event("redo", moves=len(self._game.history))
+        self.send_messages()
+        self.refresh()
+        self.resume_ai()
 
     def pixels_to_field(self, x, y):
         # x and y in window but y and x in Field [n*n list]
-        field_width = self.width() // self._game.field.size
-        field_height = self.height() // self._game.field.size
-        return y // field_height, x // field_width
+        return y * self._game.field.size // self.height(), x * self._game.field.size // self.width()
 
     def mousePressEvent(self, event):
+        if self._worker is not None:
+            return
         try:
             coords = (self.pixels_to_field(event.x(), event.y()))
             if self._game.mode == "Extra":
@@ -233,23 +530,18 @@ class Frame(QtWidgets.QFrame):
                     self._game.place_extra(coords)
             else:
                 self._game.make_move(coords)
-            LOGGER.info(f"{self.game.str_player} made move to {coords} place.")
+            self._log_move("human")
             self.send_messages()
-            self.repaint()
+            self.refresh()
             if self._game.opponent == "Ai":
-                try:
-                    self._game.ai_move()
-                    LOGGER.info(f"{self.game.str_player} made move to {coords} place.")
-                    self.send_messages()
-                except NoMovesException:
-                    LOGGER.info(f"No moves for {self._game.str_player}'s opponent")
-                    QtWidgets.QMessageBox.warning(self, "Warning",
-                                                  "Next player can't move.", QtWidgets.QMessageBox.Ok)
-                    self._game.ai_move()
-                    LOGGER.info(f"{self.game.str_player} made move to {coords} place.")
-                    self.send_messages()
-                self.repaint()
+                self.start_ai()
         except NoMovesException:
+            self._log_move("human")
+            self.cancel_pondering()
+            if self.pondering and self._game.opponent == "Ai":
+                self._ponderer = Ponderer(self._game).start()
+            self.send_messages()
+            self.refresh()
             LOGGER.info(f"No moves for {self._game.str_player}'s opponent")
             QtWidgets.QMessageBox.warning(self, "Warning",
                                           "Next player can't move.", QtWidgets.QMessageBox.Ok)
@@ -260,11 +552,9 @@ class Frame(QtWidgets.QFrame):
             QtWidgets.QMessageBox.warning(self, "Warning",
                                           "Players haven't extra disks anymore.", QtWidgets.QMessageBox.Ok)
         except GameOverException:
-            self.send_messages()
-            self.current_player_msg.emit("Game over!")
-            LOGGER.info(f"Game over. {self._game.winner}.")
-            QtWidgets.QMessageBox.information(self, "Game over",
-                                              f"'{self._game.winner}", QtWidgets.QMessageBox.Ok)
+            self._log_move("human")
+            self.cancel_pondering()
+            self._game_over()
 
 
 class StartDialog(QtWidgets.QDialog):
@@ -345,10 +635,13 @@ class StartDialog(QtWidgets.QDialog):
         self.medium_button.toggled.connect(self.set_medium)
         self.hard_button = QtWidgets.QRadioButton("Hard", lvl_box)
         self.hard_button.toggled.connect(self.set_hard)
+        self.mcts_button = QtWidgets.QRadioButton("MCTS", lvl_box)
+        self.mcts_button.toggled.connect(self.set_mcts)
 
         lvl_layout.addWidget(self.easy_button)
         lvl_layout.addWidget(self.medium_button)
         lvl_layout.addWidget(self.hard_button)
+        lvl_layout.addWidget(self.mcts_button)
 
         main_layout.addWidget(lvl_box)
 
@@ -408,8 +701,30 @@ class StartDialog(QtWidgets.QDialog):
         self.hard_button.setCheckable(True)
         self._params["lvl"] = "Hard"
 
+    def set_mcts(self):
+        """Set AI lvl to Monte Carlo tree search."""
+        if not self.ai_button.isChecked():
+            self.mcts_button.setCheckable(False)
+        self.mcts_button.setCheckable(True)
+        self._params["lvl"] = "MCTS"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reversi game.")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    parser.add_argument("--log-file", default=gamelog.LOG_FILE)
+    parser.add_argument("--events-file", default=gamelog.EVENTS_FILE, help="JSON lines of game events")
+    parser.add_argument("--no-log", action="store_true", help="write neither log nor events")
+    args, qt_args = parser.parse_known_args()
+    if not args.no_log:
+        gamelog.setup(getattr(logging, args.log_level), args.log_file, args.events_file)
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+    window = MainWindow()
+    status = app.exec()
+    del window
+    gamelog.shutdown()
+    sys.exit(status)
+
 
 if __name__ == "__main__":
-    app = QtWidgets.QApplication(sys.argv)
-    game = MainWindow()
-    sys.exit(app.exec())
+    main()
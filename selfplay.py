@@ -0,0 +1,177 @@
+"""Headless self-play tournament runner.
+
+Plays games between two engines (AI levels or "Random") in a process pool
+and streams every game result as a JSON line. Games go in pairs: both games
+of the pair start from the same seeded random opening and engines swap
+colors, so two engine versions are compared on identical game sets.
+
+Only Classic mode is played: engines never place extra disks, so Extra games
+would be Classic ones. Openings are reproducible by the seed and so are games
+of Easy and Random engines. Medium, Hard and MCTS levels search for a time
+budget, so their moves depend on the machine speed and load.
+
+Example: python selfplay.py Hard Medium --games 200 --sizes 6 8
+"""
+import argparse
+import json
+import math
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from random import Random
+from time import perf_counter
+from driver import Reversi, Status, AI_LEVELS
+from game import BitField, BLACK, WHITE
+from mcts import Mcts
+from transposition import TranspositionTable
+
+ENGINES = tuple(AI_LEVELS) + ("Random",)
+MODES = ("Classic",)
+TABLE_BYTES = 4 << 20
+
+
+def play(move, coords):
+    """Make move with try_move or try_extra and say that game is over."""
+    return move(coords).status is Status.GAME_OVER
+
+
+def opening(size, mode, plies, seed):
+    """Get reproducible random opening moves of the seed."""
+    rnd = Random(seed)
+    game = Reversi(size, mode=mode, backend=BitField)
+    moves = []
+    for _ in range(plies):
+        coords = rnd.choice(game.get_correct_moves())
+        moves.append(coords)
+        if play(game.try_move, coords):
+            break
+    return moves
+
+
+def play_game(number, size, mode, black, white, opening_moves, seed):
+    """Play one game from the opening and return its result record."""
+    rnd = Random(seed)
+    game = Reversi(size, mode=mode, backend=BitField)
+    table = TranspositionTable(TABLE_BYTES)
+    engines = {BLACK: black, WHITE: white}
+    trees = {BLACK: Mcts(seed=seed), WHITE: Mcts(seed=seed + 1)}
+    over = False
+    for coords in opening_moves:
+        over = play(game.try_move, coords)
+    started = perf_counter()
+    searched = 0
+    while not over:
+        engine = engines[game.current_player]
+        if engine == "Random":
+            coords = rnd.choice(game.get_correct_moves())
+        else:
+            coords = game.choose_move(table=table, lvl=engine, book=False, tree=trees[game.current_player])
+        searched += 1
+        over = play(game.try_move, coords)
+    elapsed = perf_counter() - started
+    return {
+        "game": number,
+        "size": size,
+        "mode": mode,
+        "black": black,
+        "white": white,
+        "opening": len(opening_moves),
+        "moves": len(game.history),
+        "searched": searched,
+        "black_count": game.field.black_count,
+        "white_count": game.field.white_count,
+        "winner": game.winner,
+        "time": round(elapsed, 4),
+        "history": [[move.coords[0], move.coords[1]] for move in game.history],
+    }
+
+
+def schedule(first, second, games, sizes, modes, plies, seed):
+    """Get arguments of play_game for every game. Engines swap colors in every pair.
+
+    ValueError is raised for modes which are not in MODES.
+    """
+    if not set(modes) <= set(MODES):
+        raise ValueError(f"Self-play supports only {', '.join(MODES)} mode")
+    tasks = []
+    number = 0
+    for pair in range((games + 1) // 2):
+        size = sizes[pair % len(sizes)]
+        mode = modes[pair // len(sizes) % len(modes)]
+        pair_seed = seed * 1000003 + pair
+        moves = opening(size, mode, plies, pair_seed)
+        for black, white in ((first, second), (second, first)):
+            if number < games:
+                tasks.append((number, size, mode, black, white, moves, pair_seed))
+                number += 1
+    return tasks
+
+
+def score_of(record, engine):
+    """Get 1, 0.5 or 0 points of the engine in the game."""
+    if record["black_count"] == record["white_count"]:
+        return 0.5
+    black_won = record["black_count"] > record["white_count"]
+    return float(black_won == (record["black"] == engine))
+
+
+def wilson(points, games, z=1.96):
+    """Get Wilson confidence interval of the score rate."""
+    if not games:
+        return 0.0, 1.0
+    rate = points / games
+    center = (rate + z * z / (2 * games)) / (1 + z * z / games)
+    margin = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def summary(records, first, second, elapsed):
+    """Get text summary of the tournament."""
+    games = len(records)
+    wins = sum(1 for record in records if score_of(record, first) == 1)
+    draws = sum(1 for record in records if score_of(record, first) == 0.5)
+    points = wins + draws / 2
+    low, high = wilson(points, games)
+    moves = sum(record["moves"] for record in records)
+    searched = sum(record["searched"] for record in records)
+    search_time = sum(record["time"] for record in records)
+    return "\n".join([
+        f"{first} vs {second}: {games} games, +{wins} ={draws} -{games - wins - draws}",
+        f"{first} score: {points / games if games else 0:.3f} (95% CI {low:.3f}..{high:.3f})",
+        f"average game length: {moves / games if games else 0:.1f} moves",
+        f"engine speed: {searched / search_time if search_time else 0:.1f} moves/s per process, "
+        f"{searched / elapsed if elapsed else 0:.1f} moves/s total",
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Reversi self-play tournament.")
+    parser.add_argument("first", choices=ENGINES)
+    parser.add_argument("second", choices=ENGINES)
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8])
+    parser.add_argument("--modes", nargs="+", default=["Classic"], choices=MODES)
+    parser.add_argument("--opening", type=int, default=4, help="count of random opening moves")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes, all cores by default")
+    parser.add_argument("--output", default="-", help="JSON lines file, '-' is stdout")
+    args = parser.parse_args(argv)
+
+    tasks = schedule(args.first, args.second, args.games, args.sizes, args.modes, args.opening, args.seed)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    records = []
+    started = perf_counter()
+    try:
+        with ProcessPoolExecutor(args.workers) as executor:
+            for future in as_completed([executor.submit(play_game, *task) for task in tasks]):
+                record = future.result()
+                records.append(record)
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(summary(records, args.first, args.second, perf_counter() - started), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
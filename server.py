@@ -0,0 +1,257 @@
+"""asyncio game server.
+
+Every TCP connection is a session with one game. Requests and responses
+are lines, a response is a JSON object with "ok" field:
+
+    NEW [size=8] [mode=Classic] [opponent=Human] [lvl=Hard] [player=X]
+    MOVE y x        make move, Ai opponent replies in the same response
+    EXTRA y x       place extra disk in Extra mode, Ai opponent replies too
+    MOVES           legal moves of the current player
+    STATE           board, current player and counts
+    AI              AI makes move for the current player
+    QUIT
+
+Status of MOVE, EXTRA and AI is "ok", "pass" (opponent has no moves and the
+same player moves again) or "game_over". AI moves are searched in a process
+pool, so the event loop never waits for search. Sessions are closed after
+idle_timeout seconds without requests.
+
+    python server.py --port 7777 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from driver import Reversi, Status, AI_LEVELS
+from game import BitField, BLACK, WHITE
+from exceptions import IllegalArgumentError
+import gamefile
+from gamelog import LOGGER
+
+MAX_SIZE = 30
+PLAYERS = {"X": BLACK, "O": WHITE, "black": BLACK, "white": WHITE}
+
+
+class RequestError(Exception):
+    """It throws when request can't be executed."""
+    pass
+
+
+def choose_move(record):
+    """Choose AI move of the game record, it runs in the worker process."""
+    return gamefile.load_game(record, replay=False).choose_move()
+
+
+class Session:
+    """Game of one connection."""
+    def __init__(self):
+        self.game = None
+        self.over = False
+
+    def running_game(self):
+        """Get game which is not over."""
+        if self.game is None:
+            raise RequestError("there is no game, send NEW")
+        if self.over:
+            raise RequestError("game is over")
+        return self.game
+
+
+class Server:
+    """Server of game sessions.
+
+    With workers=0 AI moves are searched in threads instead of processes,
+    it is enough for tests and small boards.
+    """
+    def __init__(self, host="127.0.0.1", port=7777, workers=None, idle_timeout=300.0):
+        self.host = host
+        self.port = port
+        self.workers = multiprocessing.cpu_count() if workers is None else workers
+        self.idle_timeout = idle_timeout
+        self.sessions = 0
+        self.requests = 0
+        self._server = None
+        self._pool = None
+        self._commands = {"NEW": self._new, "MOVE": self._move, "EXTRA": self._extra, "MOVES": self._moves,
+                          "STATE": self._state, "AI": self._ai}
+
+    async def start(self):
+        """Start listening, port 0 is replaced by the bound port."""
+        if self.workers:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        LOGGER.info(f"Server listens on {self.host}:{self.port}.")
+
+    async def serve_forever(self):
+        """Start and serve until cancelled."""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Stop listening and shut the process pool down."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def _handle(self, reader, writer):
+        """Serve requests of one connection."""
+        session = Session()
+        self.sessions += 1
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    writer.write(b'{"ok": false, "error": "idle timeout"}\n')
+                    break
+                except ValueError:
+                    writer.write(b'{"ok": false, "error": "line is too long"}\n')
+                    break
+                if not line:
+                    break
+                words = line.decode("ascii", "replace").split()
+                if words and words[0].upper() == "QUIT":
+                    break
+                response = await self.execute(session, words)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def execute(self, session, words):
+        """Execute request words of the session and get response."""
+        self.requests += 1
+        if not words:
+            return {"ok": False, "error": "empty request"}
+        command = self._commands.get(words[0].upper())
+        if command is None:
+            return {"ok": False, "error": f"unknown command {words[0]}"}
+        try:
+            return dict(ok=True, **await command(session, words[1:]))
+        except RequestError as exception:
+            return {"ok": False, "error": str(exception)}
+        except IllegalArgumentError as exception:
+            return {"ok": False, "error": exception.message}
+
+    @staticmethod
+    def _coords(args):
+        """Parse y and x."""
+        try:
+            y, x = map(int, args)
+        except ValueError:
+            raise RequestError("expected y and x")
+        return y, x
+
+    @staticmethod
+    def _play(session, move, coords):
+        """Make move of try_move kind and get its status."""
+        status = move(coords).status
+        if status is Status.ILLEGAL:
+            raise RequestError(f"illegal move {coords}")
+        if status is Status.NO_EXTRA:
+            raise RequestError("there are no extra disks")
+        session.over = status is Status.GAME_OVER
+        return status.value
+
+    async def _new(self, session, args):
+        params = dict(arg.split("=", 1) for arg in args if "=" in arg)
+        try:
+            size = int(params.get("size", 8))
+        except ValueError:
+            raise RequestError("size must be a number")
+        mode = params.get("mode", "Classic")
+        opponent = params.get("opponent", "Human")
+        lvl = params.get("lvl", "Hard" if opponent == "Ai" else None)
+        player = PLAYERS.get(params.get("player", "X"))
+        if not 4 <= size <= MAX_SIZE or mode not in ("Classic", "Extra") or opponent not in ("Human", "Ai") or \
+                lvl not in AI_LEVELS and lvl is not None or player is None:
+            raise RequestError("wrong game parameters")
+        session.game = Reversi(size, player, mode, opponent, lvl, backend=BitField)
+        session.over = False
+        return self._state_of(session)
+
+    async def _move(self, session, args):
+        game = session.running_game()
+        status, replies = await self._replies(session, self._play(session, game.try_move, self._coords(args)))
+        return {"status": status, "flips": len(game.history[-len(replies) - 1].flipped), "ai": replies,
+                **self._counts(game)}
+
+    async def _extra(self, session, args):
+        game = session.running_game()
+        if game.mode != "Extra":
+            raise RequestError("extra disks are allowed only in Extra mode")
+        status, replies = await self._replies(session, self._play(session, game.try_extra, self._coords(args)))
+        return {"status": status, "ai": replies, **self._counts(game)}
+
+    async def _moves(self, session, args):
+        return {"moves": session.running_game().get_correct_moves()}
+
+    async def _state(self, session, args):
+        if session.game is None:
+            raise RequestError("there is no game, send NEW")
+        return self._state_of(session)
+
+    async def _ai(self, session, args):
+        game = session.running_game()
+        coords = await self._choose(game)
+        return {"status": self._play(session, game.try_move, coords), "coords": coords, **self._counts(game)}
+
+    async def _replies(self, session, status):
+        """Make Ai opponent moves until the player moves again and get the last status and the moves."""
+        game = session.game
+        replies = []
+        while game.opponent == "Ai" and not session.over and game.current_player != game.first_player:
+            coords = await self._choose(game)
+            status = self._play(session, game.try_move, coords)
+            replies.append(coords)
+        return status, replies
+
+    async def _choose(self, game):
+        """Search AI move without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        if self._pool is None:
+            return await loop.run_in_executor(None, lambda: game.choose_move(table=None, tree=None))
+        record = gamefile.record_of(game)._replace(moves=())
+        return tuple(await loop.run_in_executor(self._pool, choose_move, record))
+
+    @staticmethod
+    def _counts(game):
+        """Get disk counts and the current player."""
+        return {"player": game.current_player, "black": game.field.black_count, "white": game.field.white_count}
+
+    def _state_of(self, session):
+        """Get state of the session game."""
+        game = session.game
+        return {"size": game.field.size, "mode": game.mode, "opponent": game.opponent, "lvl": game.lvl,
+                "board": str(game.field).split(), "over": session.over,
+                "winner": game.winner if session.over else None, "extra": game.field.extra_count,
+                **self._counts(game)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reversi game server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--workers", type=int, default=None, help="AI processes, 0 searches in threads")
+    parser.add_argument("--idle-timeout", type=float, default=300.0, help="seconds")
+    args = parser.parse_args(argv)
+    server = Server(args.host, args.port, args.workers, args.idle_timeout)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
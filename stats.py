@@ -0,0 +1,95 @@
+"""Instrumentation of AI moves.
+
+SearchStats is passed to Reversi.choose_move to collect counters and
+timings of one move: nodes, leaf evaluations, cutoffs, transposition table
+hits, max depth reached and wall/CPU time of every phase (book, endgame,
+search). Without it choose_move runs exactly the same code as before and
+search pays nothing. With profile=True the move is run under cProfile.
+"""
+import cProfile
+import io
+import pstats
+from contextlib import contextmanager
+from time import perf_counter, process_time
+import bitboard
+
+
+class SearchStats:
+    """Counters and timings of one AI move."""
+    __slots__ = ("nodes", "leaves", "cutoffs", "cache_hits", "max_depth", "phases", "profile", "profiler")
+
+    def __init__(self, profile=False):
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = 0
+        self.cache_hits = 0
+        self.max_depth = 0
+        self.phases = {}
+        self.profile = profile
+        self.profiler = None
+
+    @property
+    def wall_time(self):
+        """Get wall seconds of all phases."""
+        return sum(wall for wall, _ in self.phases.values())
+
+    @property
+    def cpu_time(self):
+        """Get CPU seconds of all phases in this process."""
+        return sum(cpu for _, cpu in self.phases.values())
+
+    @property
+    def nodes_per_second(self):
+        """Get searched nodes per wall second."""
+        return self.nodes / self.wall_time if self.wall_time else 0.0
+
+    @contextmanager
+    def phase(self, name):
+        """Add wall and CPU time of the block to the phase."""
+        wall, cpu = perf_counter(), process_time()
+        try:
+            yield self
+        finally:
+            old_wall, old_cpu = self.phases.get(name, (0.0, 0.0))
+            self.phases[name] = (old_wall + perf_counter() - wall, old_cpu + process_time() - cpu)
+
+    def count_leaves(self, evaluator, root_empty):
+        """Wrap Engine evaluator to count leaf evaluations and the deepest leaf below the root."""
+        root_empties = bitboard.count(root_empty)
+
+        def counting(own, opp, empty, size):
+            self.leaves += 1
+            depth = root_empties - bitboard.count(empty)
+            if depth > self.max_depth:
+                self.max_depth = depth
+            return evaluator(own, opp, empty, size)
+        return counting
+
+    def run(self, function, *args, **kwargs):
+        """Call function, under cProfile if profile is enabled."""
+        if not self.profile:
+            return function(*args, **kwargs)
+        self.profiler = cProfile.Profile()
+        return self.profiler.runcall(function, *args, **kwargs)
+
+    def profile_report(self, limit=20, sort="cumulative"):
+        """Get text of the profile of the move or None."""
+        if self.profiler is None:
+            return None
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def as_dict(self):
+        """Get counters and timings as a dict."""
+        return {"nodes": self.nodes, "leaves": self.leaves, "cutoffs": self.cutoffs, "cache_hits": self.cache_hits,
+                "max_depth": self.max_depth, "wall_time": round(self.wall_time, 6),
+                "cpu_time": round(self.cpu_time, 6), "nodes_per_second": round(self.nodes_per_second),
+                "phases": {name: [round(wall, 6), round(cpu, 6)] for name, (wall, cpu) in self.phases.items()}}
+
+    def __str__(self):
+        """Short summary for the status line."""
+        return (f"nodes {self.nodes}, {self.nodes_per_second:.0f} n/s\n"
+                f"leaves {self.leaves}, cutoffs {self.cutoffs}\n"
+                f"hits {self.cache_hits}, depth {self.max_depth}\n"
+                f"{self.wall_time:.2f} s wall, {self.cpu_time:.2f} s CPU")
@@ -0,0 +1,157 @@
+"""Dihedral symmetry of square fields.
+
+Square field has eight symmetries: rotations and reflections. Canonical
+form of a position is the transformed position with the least (black,
+white, extra) masks, so all eight orientations of a position share one key
+in caches, books and archives. Side to move and extra disks are kept.
+Moves stored for the canonical form are translated back with to_original.
+
+Masks are transformed with lookup tables of every byte of the mask, so a
+transform costs one table lookup per non-empty byte (8 lookups for 8x8).
+
+Gains on self-play data (see selfplay.py) are measured by:
+
+    python symmetry.py --selfplay games.jsonl
+"""
+import argparse
+import json
+from functools import lru_cache
+from time import perf_counter
+from position import Position, plane_bytes
+import bitboard
+
+TRANSFORMS = ("identity", "rotate90", "rotate180", "rotate270", "flip_vertical", "flip_horizontal", "transpose",
+              "anti_transpose")
+IDENTITY = 0
+_INVERSE = (0, 3, 2, 1, 4, 5, 6, 7)
+
+
+def inverse(transform):
+    """Get transform which undoes the transform."""
+    return _INVERSE[transform]
+
+
+def transform_coords(coords, size, transform):
+    """Get coords of the square after the transform."""
+    y, x = coords
+    last = size - 1
+    return ((y, x), (x, last - y), (last - y, last - x), (last - x, y),
+            (last - y, x), (y, last - x), (x, y), (last - x, last - y))[transform]
+
+
+@lru_cache(maxsize=None)
+def permutation(size, transform):
+    """Get bit indexes of all squares after the transform."""
+    return tuple(bitboard.index(transform_coords(bitboard.coords(i, size), size, transform), size)
+                 for i in range(size * size))
+
+
+@lru_cache(maxsize=None)
+def _tables(size, transform):
+    """Get transformed masks of every value of every byte of the mask."""
+    permutation_ = permutation(size, transform)
+    tables = []
+    for first in range(0, size * size, 8):
+        table = [0] * 256
+        for value in range(1, 256):
+            low = (value & -value).bit_length() - 1
+            square = first + low
+            table[value] = table[value & value - 1] | (1 << permutation_[square] if square < size * size else 0)
+        tables.append(tuple(table))
+    return tuple(tables)
+
+
+def transform_mask(mask, size, transform):
+    """Get mask after the transform."""
+    if transform == IDENTITY or not mask:
+        return mask
+    result = 0
+    for table, byte in zip(_tables(size, transform), mask.to_bytes(plane_bytes(size), "little")):
+        if byte:
+            result |= table[byte]
+    return result
+
+
+def transform_position(position, transform):
+    """Get position after the transform."""
+    size = position.size
+    return Position(size, transform_mask(position.black, size, transform),
+                    transform_mask(position.white, size, transform),
+                    transform_mask(position.extra, size, transform), position.player)
+
+
+def canonical(position):
+    """Get canonical form of the position and the transform which gives it from the position."""
+    size = position.size
+    blacks = [transform_mask(position.black, size, transform) for transform in range(len(TRANSFORMS))]
+    least = min(blacks)
+    candidates = [transform for transform, black in enumerate(blacks) if black == least]
+    if len(candidates) == 1:
+        transform = candidates[0]
+    else:
+        transform = min(candidates, key=lambda transform_: (transform_mask(position.white, size, transform_),
+                                                            transform_mask(position.extra, size, transform_)))
+    return transform_position(position, transform), transform
+
+
+def canonical_hash(position):
+    """Get Zobrist hash of the canonical form of the position and the transform which gives it."""
+    form, transform = canonical(position)
+    return form.hash, transform
+
+
+def to_original(coords, size, transform):
+    """Get coords in the position of a move in its canonical form given by the transform."""
+    return transform_coords(coords, size, inverse(transform))
+
+
+def _positions(record):
+    """Iter trough positions of the self-play record."""
+    from driver import Reversi, Status
+    from game import BitField
+    game = Reversi(record["size"], mode=record["mode"], backend=BitField)
+    for coords in record["history"]:
+        yield game.snapshot()
+        if game.try_move(tuple(coords)).status is Status.GAME_OVER:
+            break
+
+
+def benchmark(records):
+    """Get {size: report} of distinct positions and cache hits with raw and canonical keys."""
+    reports = {}
+    for record in records:
+        report = reports.setdefault(record["size"], {"positions": 0, "raw": set(), "canonical": set(),
+                                                     "raw_hits": 0, "canonical_hits": 0, "seconds": 0.0})
+        for position in _positions(record):
+            report["positions"] += 1
+            report["raw_hits"] += position in report["raw"]
+            report["raw"].add(position)
+            started = perf_counter()
+            form = canonical(position)[0]
+            report["seconds"] += perf_counter() - started
+            report["canonical_hits"] += form in report["canonical"]
+            report["canonical"].add(form)
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure symmetry gains on self-play games.")
+    parser.add_argument("--selfplay", nargs="+", required=True, help="JSON lines of selfplay.py")
+    args = parser.parse_args(argv)
+
+    records = []
+    for path in args.selfplay:
+        with open(path) as file:
+            records.extend(json.loads(line) for line in file)
+    for size, report in sorted(benchmark(records).items()):
+        raw, canonical_ = len(report["raw"]), len(report["canonical"])
+        width = 1 + 2 * plane_bytes(size)
+        print(f"{size}x{size}: {report['positions']} positions, {raw} distinct raw, {canonical_} distinct canonical "
+              f"({raw / max(canonical_, 1):.2f}x fewer, {raw * width} -> {canonical_ * width} packed bytes)")
+        print(f"  cache hit rate: raw {report['raw_hits'] / report['positions']:.1%}, "
+              f"canonical {report['canonical_hits'] / report['positions']:.1%}; "
+              f"canonicalization {report['positions'] / max(report['seconds'], 1e-9):.0f} positions/s")
+
+
+if __name__ == "__main__":
+    main()
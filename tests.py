@@ -1,5 +1,43 @@
+import asyncio
+import io
+import json
+import logging
+import os
+import tempfile
 import unittest
+from collections import defaultdict
+from copy import deepcopy
+from random import Random
 from driver import *
+from exceptions import LoadError, SaveError
+from time import perf_counter
+from clock import Clock
+from engine import Engine, Evaluator, final_score, parallel_search, timed_search
+from endgame import Solver, random_position
+from transposition import TranspositionTable, EXACT, LOWER
+import bitboard
+import book
+import gamedb
+import gamefile
+import gamelog
+import mcts
+import patterns
+import perft
+from ponder import Ponderer
+from position import Position, PositionArray
+import selfplay
+import server
+import stats
+import symmetry
+import zobrist
+try:
+    import batch
+except ImportError:
+    batch = None
+try:
+    from PyQt5 import QtWidgets
+except ImportError:
+    QtWidgets = None
 
 
 class FieldTests(unittest.TestCase):
@@ -46,6 +84,72 @@ class FieldTests(unittest.TestCase):
         self.assertEqual(self.field[2, 3], BLACK)
 
 
+class BitFieldTests(unittest.TestCase):
+    """BitField's method tests."""
+    def setUp(self):
+        self.field = BitField(8)
+
+    def test_init(self):
+        self.assertEqual(str(self.field), str(Field(8)))
+        self.assertEqual(self.field.black_count, 2)
+        self.assertEqual(self.field.white_count, 2)
+        with self.assertRaises(IllegalArgumentError):
+            BitField(9)
+
+    def test_flip(self):
+        self.field.flip((3, 3))
+        self.assertEqual(self.field.white_count, 1)
+        self.assertEqual(self.field.black_count, 3)
+        self.assertEqual(self.field[3, 3], BLACK)
+        with self.assertRaises(TypeError):
+            self.field.flip((0, 0))
+
+    def test_set_and_get(self):
+        self.field[0, 0] = EXTRA
+        self.field[0, 7] = WHITE
+        self.assertEqual(self.field[0, 0], EXTRA)
+        self.assertEqual(self.field[0, 7], WHITE)
+        self.assertEqual(self.field[7, 0], EMPTY)
+        self.assertEqual(self.field.extra_count, 1)
+        with self.assertRaises(IndexError):
+            self.field[8, 0]
+
+    @staticmethod
+    def play(move, coords):
+        """Make move and say that game is over."""
+        try:
+            move(coords)
+        except NoMovesException:
+            pass
+        except GameOverException:
+            return True
+        return False
+
+    def test_same_games(self):
+        rnd = Random(1)
+        for size in (4, 6, 8, 10, 30):
+            games = Reversi(size, mode="Extra"), Reversi(size, mode="Extra", backend=BitField)
+            for turn in range(size * size):
+                self.assertEqual(str(games[0].field), str(games[1].field))
+                moves = games[0].get_correct_moves()
+                self.assertEqual(moves, games[1].get_correct_moves())
+                for coords in moves:
+                    self.assertEqual(sorted(games[0].is_correct_move(coords)),
+                                     sorted(games[1].is_correct_move(coords)))
+                empty = [(y, x) for y in range(size) for x in range(size)
+                         if games[0].field[y, x] == EMPTY and (y, x) not in moves]
+                if turn % 7 == 3 and games[0].field.possibility_extra and empty:
+                    coords = rnd.choice(empty)
+                    over = [self.play(game.place_extra, coords) for game in games]
+                else:
+                    coords = rnd.choice(moves)
+                    over = [self.play(game.make_move, coords) for game in games]
+                self.assertEqual(over[0], over[1])
+                if over[0]:
+                    break
+            self.assertEqual(games[0].field.black_count, games[1].field.black_count)
+
+
 class ReversiTests(unittest.TestCase):
     """Reversi's method tests."""
     def setUp(self):
@@ -61,6 +165,54 @@ class ReversiTests(unittest.TestCase):
         self.reversi.make_move((2, 3))
         self.assertEqual(self.reversi.get_correct_moves(), [(2, 2), (2, 4), (4, 2)])
 
+    def test_moves_cache(self):
+        moves = self.reversi._correct_moves()
+        self.assertIs(self.reversi._correct_moves(), moves)
+        self.assertEqual(self.reversi.is_correct_move((2, 3)), [(3, 3)])
+        self.reversi.make_move((2, 3))
+        self.assertIsNot(self.reversi._correct_moves(), moves)
+        self.assertEqual(self.reversi.field.frontier, {(1, 2), (1, 3), (1, 4), (2, 2), (2, 4), (2, 5),
+                                                       (3, 2), (3, 5), (4, 2), (4, 5), (5, 2), (5, 3), (5, 4), (5, 5)})
+
+    def test_unmake_move(self):
+        rnd = Random(2)
+        for backend in (Field, BitField):
+            reversi = Reversi(6, mode="Extra", backend=backend)
+            states = []
+            while True:
+                states.append((str(reversi.field), reversi.field.black_count, reversi.field.white_count,
+                               reversi.current_player, reversi.get_correct_moves()))
+                try:
+                    if len(states) % 5 == 0 and reversi.field.possibility_extra:
+                        free = reversi.field.frontier - set(reversi.get_correct_moves())
+                        reversi.place_extra(rnd.choice(sorted(free)))
+                    else:
+                        reversi.make_move(rnd.choice(reversi.get_correct_moves()))
+                except NoMovesException:
+                    pass
+                except GameOverException:
+                    break
+            final = str(reversi.field)
+            while reversi.can_unmake():
+                reversi.unmake_move()
+                black, white, extra = reversi.field.masks()
+                self.assertEqual(reversi.hash, zobrist.hash_masks(black, white, extra, 6,
+                                                                  reversi.current_player == WHITE))
+                self.assertEqual(states.pop(), (str(reversi.field), reversi.field.black_count,
+                                                reversi.field.white_count, reversi.current_player,
+                                                reversi.get_correct_moves()))
+            self.assertEqual(reversi.field.frontier, Reversi(6, backend=backend).field.frontier)
+            self.assertEqual(reversi.hash, Reversi(6, backend=backend).hash)
+            with self.assertRaises(MoveError):
+                reversi.unmake_move()
+            with self.assertRaises(GameOverException):
+                while reversi.can_redo():
+                    try:
+                        reversi.redo_move()
+                    except NoMovesException:
+                        pass
+            self.assertEqual(str(reversi.field), final)
+
     def test_game_over(self):
         self.reversi._field._skeleton = [['X' for _ in range(8)] for _ in range(8)]
         with self.assertRaises(GameOverException):
@@ -70,6 +222,762 @@ class ReversiTests(unittest.TestCase):
         with self.assertRaises(MoveError):
             self.reversi.make_move((0, 0))
 
+    def test_try_move(self):
+        hash_ = self.reversi.hash
+        self.assertEqual(self.reversi.try_move((0, 0)), MoveResult(Status.ILLEGAL, 0, 2, 2))
+        self.assertEqual(self.reversi.hash, hash_)
+        self.assertEqual(self.reversi.try_move((2, 3)), MoveResult(Status.OK, 1, 4, 1))
+        self.assertEqual(self.reversi.current_player, WHITE)
+        self.assertEqual(self.reversi.try_extra((2, 3)).status, Status.ILLEGAL)
+        self.assertEqual(self.reversi.try_extra((9, 9)).status, Status.ILLEGAL)
+        self.assertEqual(self.reversi.try_extra((0, 0)).status, Status.OK)
+        self.assertEqual(self.reversi.field[0, 0], EXTRA)
+        game = Reversi(4, mode="Extra")
+        for coords in ((0, 0), (0, 3)):
+            game.try_extra(coords)
+        self.assertEqual(game.try_extra((3, 0)).status, Status.NO_EXTRA)
+        with self.assertRaises(HaveNotExtraException):
+            game.place_extra((3, 0))
+        seen = set()
+        for seed in range(20):
+            rnd = Random(seed)
+            game, wrapped = Reversi(4), Reversi(4)
+            status = None
+            while status is not Status.GAME_OVER:
+                coords, flipped = rnd.choice(sorted(game.get_moves_to_flip().items()))
+                status = game.apply_move(coords, flipped).status
+                try:
+                    wrapped.make_move(coords)
+                    expected = Status.OK
+                except NoMovesException:
+                    expected = Status.PASS
+                except GameOverException:
+                    expected = Status.GAME_OVER
+                self.assertEqual(status, expected)
+                self.assertEqual(game.current_player, wrapped.current_player)
+                seen.add(status)
+        self.assertEqual(seen, {Status.OK, Status.PASS, Status.GAME_OVER})
+
+
+class EngineTests(unittest.TestCase):
+    """Search engine tests."""
+    @staticmethod
+    def minimax(own, opp, empty, depth, size, passed=False):
+        """Plain negamax without pruning."""
+        moves = bitboard.legal_moves(own, opp, empty, size)
+        if not moves:
+            if passed:
+                return final_score(own, opp)
+            return -EngineTests.minimax(opp, own, empty, depth, size, True)
+        if depth == 0:
+            return Evaluator()(own, opp, empty, size)
+        best = None
+        for i in bitboard.bits(moves):
+            flipped = bitboard.flips(1 << i, own, opp, size)
+            score = -EngineTests.minimax(opp ^ flipped, own | flipped | 1 << i, empty ^ 1 << i, depth - 1, size)
+            best = score if best is None else max(best, score)
+        return best
+
+    def test_same_score_as_minimax(self):
+        for size, depth in ((4, 8), (6, 3), (8, 3)):
+            black, white, extra = Field(size).masks()
+            empty = bitboard.full(size) & ~(black | white)
+            score, _ = Engine(size, depth).search(black, white, extra)
+            self.assertEqual(score, self.minimax(black, white, empty, depth, size))
+
+    def test_takes_corner(self):
+        reversi = Reversi(lvl="Easy")
+        reversi._field._skeleton = [list(row) for row in ('........',
+                                                          '.O......',
+                                                          '..OX....',
+                                                          '...XO...',
+                                                          '...OX...',
+                                                          '........',
+                                                          '........',
+                                                          '........')]
+        self.assertEqual(reversi.choose_move(), (0, 0))
+
+    def test_stop(self):
+        black, white, extra = Field(8).masks()
+        with self.assertRaises(SearchCancelled):
+            Engine(8, 8, stop=lambda: True).search(black, white, extra)
+        reversi = Reversi(8, lvl="Hard")
+        reversi.ai_move(stop=lambda: False)
+        self.assertEqual(len(reversi.history), 1)
+
+    def test_parallel_search(self):
+        reversi = Reversi(6)
+        for coords in ((1, 2), (1, 1), (2, 1)):
+            reversi.make_move(coords)
+        black, white, extra = reversi.field.masks()
+        serial = Engine(6, 5).search(white, black, extra, WHITE)
+        with self.assertRaises(SearchCancelled):
+            parallel_search(6, white, black, extra, WHITE, 5, workers=2, stop=lambda: True, table_bytes=0)
+        score, best, nodes = parallel_search(6, white, black, extra, WHITE, 5, workers=2, table_bytes=0)
+        self.assertEqual(score, serial[0])
+        self.assertIn(bitboard.coords(best, 6), reversi.get_correct_moves())
+        self.assertGreater(nodes, 0)
+
+    def test_timed_search(self):
+        reversi = Reversi(30, backend=BitField)
+        black, white, extra = reversi.field.masks()
+        started = perf_counter()
+        result = timed_search(30, black, white, extra, BLACK, 0.1)
+        self.assertLess(perf_counter() - started, 2)
+        self.assertGreater(result.depth, 1)
+        self.assertIn(bitboard.coords(result.move, 30), reversi.get_correct_moves())
+        self.assertEqual(timed_search(30, black, white, extra, BLACK, 0).depth, 1)
+        own, opp, extra = random_position(4, 6, Random(1))
+        result = timed_search(4, own, opp, extra, BLACK, 10)
+        exact = Engine(4, 6).search(own, opp, extra)[0]
+        self.assertLessEqual(result.depth, 6)
+        self.assertEqual((result.score > 0) - (result.score < 0), (exact > 0) - (exact < 0))
+        with self.assertRaises(SearchCancelled):
+            timed_search(8, *Field(8).masks(), BLACK, 10, stop=lambda: True)
+
+    def test_clock(self):
+        clock = Clock(60, increment=1)
+        self.assertEqual((clock.running, clock.remaining(BLACK)), (None, 60))
+        clock.press(BLACK)
+        self.assertLess(clock.remaining(BLACK), 60)
+        clock.press(WHITE)
+        self.assertGreater(clock.remaining(BLACK), 60.9)
+        self.assertAlmostEqual(clock.budget(BLACK, 60), clock.remaining(BLACK) / 30 + 1, 2)
+        self.assertEqual(clock.budget(BLACK, 60, 0.5), 0.5)
+        self.assertLessEqual(clock.budget(BLACK, 2), clock.remaining(BLACK) * 0.25)
+        clock.press(None)
+        self.assertFalse(clock.flagged(WHITE))
+
+    def test_clock_endgame(self):
+        own, opp, extra = random_position(12, 12, Random(0))
+        reversi = Reversi.from_snapshot(Position(12, own, opp, extra, BLACK), lvl="Hard", backend=BitField)
+        search_stats = stats.SearchStats()
+        coords = reversi.choose_move(table=None, stats=search_stats, clock=Clock(0.5))
+        self.assertIn(coords, reversi.get_correct_moves())
+        self.assertLessEqual({"endgame", "search"}, set(search_stats.phases))
+        self.assertLess(search_stats.phases["endgame"][0], 1)
+
+    def test_choose_correct_move(self):
+        for backend in (Field, BitField):
+            for lvl in AI_LEVELS:
+                reversi = Reversi(6, mode="Extra", lvl=lvl, backend=backend)
+                reversi.place_extra((0, 0))
+                self.assertIn(reversi.choose_move(), reversi.get_correct_moves())
+
+
+class SolverTests(unittest.TestCase):
+    """Endgame solver tests."""
+    @staticmethod
+    def minimax(own, opp, empty, size, passed=False):
+        """Final disk differential by plain negamax."""
+        moves = bitboard.legal_moves(own, opp, empty, size)
+        if not moves:
+            if passed:
+                return bitboard.count(own) - bitboard.count(opp)
+            return -SolverTests.minimax(opp, own, empty, size, True)
+        best = None
+        for i in bitboard.bits(moves):
+            flipped = bitboard.flips(1 << i, own, opp, size)
+            score = -SolverTests.minimax(opp ^ flipped, own | flipped | 1 << i, empty ^ 1 << i, size)
+            best = score if best is None else max(best, score)
+        return best
+
+    def test_exact(self):
+        rnd = Random(3)
+        for size, empties in ((4, 10), (6, 7), (8, 7)):
+            for _ in range(4):
+                position = random_position(size, empties, rnd)
+                if position is None:
+                    continue
+                own, opp, extra = position
+                expected = self.minimax(own, opp, bitboard.full(size) & ~(own | opp | extra), size)
+                result = Solver(size).solve(own, opp, extra)
+                self.assertEqual(result.score, expected)
+                self.assertGreater(result.nodes, 0)
+                self.assertEqual(Solver(size, wld=True).solve(own, opp, extra).score,
+                                 (expected > 0) - (expected < 0))
+                if result.move is not None:
+                    move = 1 << bitboard.index(result.move, size)
+                    flipped = bitboard.flips(move, own, opp, size)
+                    self.assertEqual(-Solver(size).solve(opp ^ flipped, own | flipped | move, extra).score,
+                                     expected)
+
+    def test_ai_uses_solver(self):
+        rnd = Random(4)
+        position = random_position(8, 8, rnd)
+        reversi = Reversi(8, lvl="Hard", backend=BitField)
+        reversi._field._black, reversi._field._white, reversi._field._extra = position
+        move = reversi.choose_move()
+        self.assertEqual(move, Solver(8).solve(*position).move)
+
+
+class SelfPlayTests(unittest.TestCase):
+    """Self-play runner tests."""
+    def test_schedule(self):
+        tasks = selfplay.schedule("Easy", "Random", 5, [4, 6], ["Classic"], 2, 7)
+        self.assertEqual(tasks, selfplay.schedule("Easy", "Random", 5, [4, 6], ["Classic"], 2, 7))
+        self.assertEqual(len(tasks), 5)
+        self.assertEqual(tasks[0][3:6], ("Easy", "Random", tasks[1][5]))
+        self.assertEqual(tasks[1][3:5], ("Random", "Easy"))
+        self.assertEqual([task[1:3] for task in tasks[::2]], [(4, "Classic"), (6, "Classic"), (4, "Classic")])
+        self.assertRaises(ValueError, selfplay.schedule, "Easy", "Random", 2, [6], ["Extra"], 2, 7)
+
+    def test_play_game(self):
+        task = selfplay.schedule("Easy", "Random", 1, [6], ["Classic"], 4, 0)[0]
+        record = selfplay.play_game(*task)
+        again = selfplay.play_game(*task)
+        self.assertEqual(json.loads(json.dumps(record))["time"], record["time"])
+        for result in (record, again):
+            self.assertGreaterEqual(result.pop("time"), 0)
+        self.assertEqual(record, again)
+        self.assertIn(selfplay.score_of(record, "Easy"), (0, 0.5, 1))
+        low, high = selfplay.wilson(7, 10)
+        self.assertLess(low, 0.7)
+        self.assertGreater(high, 0.7)
+
+
+class BookTests(unittest.TestCase):
+    """Opening book tests."""
+    def test_book(self):
+        task = selfplay.schedule("Easy", "Random", 1, [6], ["Classic"], 0, 3)[0]
+        record = selfplay.play_game(*task)
+        moves = [tuple(coords) for coords in record["history"]]
+        entries = defaultdict(lambda: [0, 0])
+        self.assertTrue(book.collect(entries, 6, moves, 4))
+        self.assertTrue(book.collect(entries, 6, moves, 4))
+        self.assertFalse(book.collect(entries, 6, moves[:10], 4))
+        self.assertEqual(len(entries), 4)
+        self.assertEqual({count for score, count in entries.values()}, {2})
+        with tempfile.TemporaryDirectory() as directory:
+            path = book.book_path(6, directory)
+            book.write_book(path, 6, entries)
+            opening = book.Book(path)
+            self.assertEqual((opening.size, len(opening)), (6, 4))
+            game = Reversi(6)
+            self.assertEqual([coords for coords, _, _ in opening.lookup(game.hash)], [moves[0]])
+            self.assertEqual(opening.lookup(game.hash ^ 1), [])
+            if entries[game.hash, bitboard.index(moves[0], 6)][0] >= 0:
+                self.assertEqual(opening.choose(game, Random(0)), moves[0])
+            transposed = Reversi(6)
+            transposed.make_move(symmetry.transform_coords(moves[0], 6, 6))
+            key, transform = symmetry.canonical_hash(transposed.snapshot())
+            (coords, _, _), = opening.lookup(key)
+            self.assertEqual(symmetry.to_original(coords, 6, transform), symmetry.transform_coords(moves[1], 6, 6))
+            self.assertIn(opening.choose(transposed, Random(0)), (symmetry.transform_coords(moves[1], 6, 6), None))
+            self.assertIsNone(opening.choose(Reversi(8)))
+            opening.close()
+            with open(path, "r+b") as file:
+                file.write(b"XXXX")
+            with self.assertRaises(LoadError):
+                len(book.Book(path))
+
+
+@unittest.skipUnless(batch, "numpy is not installed")
+class BatchTests(unittest.TestCase):
+    """Batched move generation tests."""
+    def test_analyse(self):
+        games = batch.positions(40, 6, Random(2), "Extra", Field) + batch.positions(20, 8, Random(3))
+        for group in (games[:40], games[40:]):
+            boards, colors = batch.from_games(group)
+            self.assertTrue((boards == batch.stack([game.field.skeleton for game in group])).all())
+            analysis = batch.analyse(boards, colors)
+            self.assertEqual(batch.validate(group, analysis), [])
+            for game, score in zip(group, analysis.scores):
+                black, white, extra = game.field.masks()
+                own, opp = (black, white) if game.current_player == BLACK else (white, black)
+                empty = bitboard.full(game.field.size) & ~(black | white | extra)
+                self.assertEqual(score, Evaluator()(own, opp, empty, game.field.size))
+        analysis = batch.analyse(batch.stack([Field(8).skeleton]), BLACK)
+        self.assertEqual(sorted(zip(*analysis.moves[0].nonzero())), [(2, 3), (3, 2), (4, 5), (5, 4)])
+
+
+class PatternTests(unittest.TestCase):
+    """Pattern evaluation tests."""
+    @staticmethod
+    def square_indices(field):
+        """Get pattern indices square by square."""
+        codes = {BLACK: 1, WHITE: 2}
+        return [sum(codes.get(field[bitboard.coords(i, field.size)], 0) * 3 ** power
+                    for power, i in enumerate(indexes)) for _, indexes in patterns.geometry(field.size).instances]
+
+    def test_indices(self):
+        for size in (4, 8, 10):
+            self.assertEqual(len({kind for kind, _ in patterns.geometry(size).instances}), 3 if size == 4 else 4)
+            for backend in (Field, BitField):
+                game = Reversi(size, mode="Extra", backend=backend)
+                game.place_extra((0, 0))
+                rnd = Random(size)
+                for _ in range(12):
+                    try:
+                        game.make_move(rnd.choice(game.get_correct_moves()))
+                    except NoMovesException:
+                        pass
+                    except GameOverException:
+                        break
+                    self.assertEqual(game.field.pattern_indices, self.square_indices(game.field))
+                while game.can_unmake():
+                    game.unmake_move()
+                self.assertEqual(game.field.pattern_indices, self.square_indices(game.field))
+                black, white, _ = game.field.masks()
+                self.assertEqual(BitField.from_masks(size, black, white, 0).pattern_indices,
+                                 patterns.indices(black, white, size))
+
+    def test_weights(self):
+        self.assertEqual(patterns.swapped(1 + 2 * 3 + 0 * 9, 3), 2 + 1 * 3)
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(patterns.evaluator(6, directory))
+            patterns._evaluators.clear()
+            task = selfplay.schedule("Easy", "Random", 1, [6], ["Classic"], 0, 5)[0]
+            data = patterns.samples(selfplay.play_game(*task))
+            tables = patterns.fit(data, 6, epochs=2)
+            patterns.write_tables(patterns.weights_path(6, directory), 6, tables)
+            evaluator = patterns.evaluator(6, directory)
+            patterns._evaluators.clear()
+            game = Reversi(6, backend=BitField)
+            game.make_move(game.get_correct_moves()[0])
+            black, white, extra = game.field.masks()
+            score = evaluator.evaluate(game.field, WHITE)
+            self.assertEqual(score, evaluator(white, black, game.field.empty, 6))
+            self.assertEqual(score, -evaluator.evaluate(game.field, BLACK))
+            self.assertIsNotNone(Engine(6, 2, evaluator=evaluator).best_move(white, black, extra, WHITE))
+            with open(patterns.weights_path(6, directory), "r+b") as file:
+                file.truncate(100)
+            with self.assertRaises(LoadError):
+                patterns.evaluator(6, directory)
+            patterns._evaluators.clear()
+
+
+class GameLogTests(unittest.TestCase):
+    """Logging tests."""
+    def test_events(self):
+        self.assertFalse(gamelog.EVENTS.isEnabledFor(logging.INFO))
+        with tempfile.TemporaryDirectory() as directory:
+            path, events_path = os.path.join(directory, "reversi.log"), os.path.join(directory, "events.jsonl")
+            gamelog.setup(logging.INFO, path, events_path, max_bytes=200, backups=1)
+            try:
+                gamelog.LOGGER.debug("hidden")
+                gamelog.LOGGER.info("shown")
+                for number in range(5):
+                    gamelog.event("move", coords=(2, 3), flips=number)
+            finally:
+                gamelog.shutdown()
+            gamelog.event("move", flips=10)
+            with open(path) as file:
+                text = file.read()
+            self.assertIn("shown", text)
+            self.assertNotIn("hidden", text)
+            self.assertNotIn("move", text)
+            with open(events_path) as file:
+                events = [json.loads(line) for line in file]
+            self.assertTrue(os.path.exists(events_path + ".1"))
+            self.assertEqual(events[-1]["event"], "move")
+            self.assertEqual((events[-1]["coords"], events[-1]["flips"]), ([2, 3], 4))
+        self.assertFalse(gamelog.EVENTS.isEnabledFor(logging.INFO))
+
+
+class ServerTests(unittest.TestCase):
+    """Game server tests."""
+    def test_session(self):
+        async def run():
+            game_server = server.Server(port=0, workers=0, idle_timeout=0.5)
+            await game_server.start()
+            reader, writer = await asyncio.open_connection("127.0.0.1", game_server.port)
+
+            async def request(line):
+                writer.write(line.encode() + b"\n")
+                return json.loads(await reader.readline())
+            try:
+                self.assertFalse((await request("MOVES"))["ok"])
+                state = await request("NEW size=6 opponent=Ai lvl=Easy")
+                self.assertEqual((state["size"], state["player"], state["black"]), (6, BLACK, 2))
+                self.assertEqual(len(state["board"]), 6)
+                moves = (await request("MOVES"))["moves"]
+                self.assertEqual(len(moves), 4)
+                self.assertFalse((await request("MOVE 0 0"))["ok"])
+                response = await request("MOVE {} {}".format(*moves[0]))
+                self.assertEqual((response["status"], response["flips"], len(response["ai"])), ("ok", 1, 1))
+                self.assertEqual(response["player"], BLACK)
+                self.assertEqual((await request("AI"))["player"], WHITE)
+                self.assertFalse((await request("NEW size=7"))["ok"])
+                self.assertFalse((await request("JUMP"))["ok"])
+                state = await request("STATE")
+                self.assertEqual((state["black"] + state["white"], state["over"]), (7, False))
+                self.assertFalse((await request("EXTRA 0 0"))["ok"])
+                await request("NEW size=6 mode=Extra opponent=Ai lvl=Easy")
+                response = await request("EXTRA 0 0")
+                self.assertEqual((response["status"], len(response["ai"]), response["player"]), ("ok", 1, BLACK))
+                self.assertEqual(response["black"] + response["white"], 5)
+                self.assertEqual(await reader.readline(), b'{"ok": false, "error": "idle timeout"}\n')
+                self.assertEqual(await reader.readline(), b"")
+            finally:
+                writer.close()
+                await game_server.close()
+        asyncio.run(run())
+
+
+class PositionTests(unittest.TestCase):
+    """Position snapshot tests."""
+    def test_snapshot(self):
+        for backend in (Field, BitField):
+            game = Reversi(6, mode="Extra", backend=backend)
+            game.make_move(game.get_correct_moves()[0])
+            game.place_extra((0, 0))
+            position = game.snapshot()
+            self.assertEqual((position.size, position.player, position.extra_count), (6, game.current_player, 1))
+            self.assertEqual(position.hash, game.hash)
+            copy = Reversi.from_snapshot(position, mode="Extra", backend=backend)
+            self.assertEqual(str(copy.field), str(game.field))
+            self.assertEqual((copy.hash, copy.field.extra_count), (game.hash, 1))
+            self.assertEqual(copy.get_correct_moves(), game.get_correct_moves())
+            self.assertEqual(copy.snapshot(), position)
+            self.assertEqual(len({position, copy.snapshot(), Reversi(6).snapshot()}), 2)
+            self.assertEqual(Position.unpack(position.pack()), position)
+        self.assertRaises(LoadError, Position.unpack, b"\x05")
+
+    def test_array(self):
+        game = Reversi(8, backend=BitField)
+        positions = [game.snapshot()]
+        for _ in range(10):
+            game.make_move(game.get_correct_moves()[-1])
+            positions.append(game.snapshot())
+        array = PositionArray(8, positions)
+        self.assertEqual((len(array), array.nbytes), (11, 11 * 17))
+        self.assertEqual(list(array), positions)
+        self.assertEqual(array[-1], positions[-1])
+        self.assertRaises(IndexError, array.__getitem__, 11)
+        self.assertEqual(list(PositionArray.frombytes(8, array.tobytes())), positions)
+        self.assertRaises(IllegalArgumentError, array.append, Reversi(6).snapshot())
+
+
+class SymmetryTests(unittest.TestCase):
+    """Dihedral symmetry tests."""
+    def test_transforms(self):
+        for size in (4, 6, 8, 30):
+            for transform in range(len(symmetry.TRANSFORMS)):
+                permutation = symmetry.permutation(size, transform)
+                self.assertEqual(sorted(permutation), list(range(size * size)))
+                mask = Random(transform).getrandbits(size * size)
+                expected = sum(1 << permutation[i] for i in bitboard.bits(mask))
+                self.assertEqual(symmetry.transform_mask(mask, size, transform), expected)
+                back = symmetry.inverse(transform)
+                self.assertEqual(symmetry.transform_mask(expected, size, back), mask)
+
+    def test_canonical(self):
+        game = Reversi(6, mode="Extra", backend=BitField)
+        game.make_move(game.get_correct_moves()[0])
+        game.place_extra((0, 1))
+        position = game.snapshot()
+        form, transform = symmetry.canonical(position)
+        self.assertEqual((form.extra_count, form.player), (1, position.player))
+        moves = set(game.get_correct_moves())
+        for other in range(len(symmetry.TRANSFORMS)):
+            turned = symmetry.transform_position(position, other)
+            self.assertEqual(symmetry.canonical(turned)[0], form)
+            turned_form, turned_transform = symmetry.canonical(turned)
+            copy = Reversi.from_snapshot(turned_form, mode="Extra", backend=BitField)
+            original = {symmetry.to_original(coords, 6, turned_transform) for coords in copy.get_correct_moves()}
+            self.assertEqual(original, {symmetry.transform_coords(coords, 6, other) for coords in moves})
+        self.assertEqual(symmetry.canonical(Reversi(8).snapshot()), (Reversi(8).snapshot(), symmetry.IDENTITY))
+
+
+class PonderTests(unittest.TestCase):
+    """Pondering tests."""
+    def test_ponder(self):
+        game = Reversi(6, opponent="Ai", lvl="Easy", backend=BitField)
+        ponderer = Ponderer(game, replies=2, table=None).start()
+        ponderer.join(10)
+        self.assertTrue(ponderer.done)
+        replies = ponderer.replies()
+        self.assertEqual(len(replies), 2)
+        for coords in game.get_correct_moves():
+            reply = deepcopy(game)
+            reply.make_move(coords)
+            expected = reply.choose_move(table=None) if coords in replies else None
+            self.assertEqual(ponderer.result(reply), expected)
+
+    def test_cancel(self):
+        game = Reversi(8, opponent="Ai", lvl="Hard", backend=BitField)
+        game.make_move(game.get_correct_moves()[0])
+        ponderer = Ponderer(game, table=None).start()
+        ponderer.cancel()
+        ponderer.join(5)
+        self.assertTrue(ponderer.done)
+
+
+class MctsTests(unittest.TestCase):
+    """Monte Carlo tree search tests."""
+    def test_random_move(self):
+        rnd = Random(0)
+        black, white, extra = BitField(8).masks()
+        empty = bitboard.full(8) & ~(black | white | extra)
+        moves = bitboard.legal_moves(black, white, empty, 8)
+        for _ in range(50):
+            move, flipped = mcts.random_move(black, white, empty, 8, rnd)
+            self.assertTrue(move & moves)
+            self.assertEqual(flipped, bitboard.flips(move, black, white, 8))
+        self.assertEqual(mcts.random_move(black, 0, empty, 8, rnd), (0, 0))
+        diff = mcts.playout(black, white, empty, 8, rnd)
+        self.assertEqual(diff % 2, 0)
+        self.assertLessEqual(abs(diff), 64)
+
+    def test_search(self):
+        game = Reversi(6, backend=BitField)
+        black, white, extra = game.field.masks()
+        tree = mcts.Mcts(seed=0)
+        result = tree.search(6, black, white, extra, BLACK, playouts=200)
+        self.assertEqual(result.playouts, 200)
+        self.assertIn(bitboard.coords(result.move, 6), game.get_correct_moves())
+        self.assertEqual(sum(visits for visits, _ in tree.root_moves().values()), 200)
+        game.make_move(bitboard.coords(result.move, 6))
+        reply = game.get_correct_moves()[0]
+        game.make_move(reply)
+        black, white, extra = game.field.masks()
+        child = next(child for child in tree.root.children if child.move == result.move)
+        visits = sum(node.visits for node in child.children if bitboard.coords(node.move, 6) == reply)
+        self.assertGreater(visits, 0)
+        tree.search(6, black, white, extra, BLACK, playouts=1)
+        self.assertEqual(tree.root.visits, visits + 1)
+
+    def test_parallel(self):
+        black, white, extra = BitField(6).masks()
+        with self.assertRaises(SearchCancelled):
+            mcts.parallel_mcts(6, black, white, extra, BLACK, seconds=10, workers=2, stop=lambda: True)
+        started = perf_counter()
+        result = mcts.parallel_mcts(6, black, white, extra, BLACK, playouts=100, workers=2, seed=0)
+        self.assertLess(perf_counter() - started, 5)
+        self.assertEqual(result.playouts, 100)
+        self.assertIn(bitboard.coords(result.move, 6), Reversi(6).get_correct_moves())
+
+    def test_choose_move(self):
+        game = Reversi(8, lvl="MCTS", backend=BitField)
+        game.make_move(game.get_correct_moves()[0])
+        self.assertIn(game.choose_move(table=None, tree=mcts.Mcts(seed=0)), game.get_correct_moves())
+
+
+class StatsTests(unittest.TestCase):
+    """Search instrumentation tests."""
+    def test_stats(self):
+        game = Reversi(6, lvl="Medium")
+        game.make_move(game.get_correct_moves()[0])
+        plain = game.choose_move(table=None, lvl="Easy")
+        easy_stats = stats.SearchStats()
+        self.assertEqual(game.choose_move(table=None, lvl="Easy", stats=easy_stats), plain)
+        self.assertEqual(easy_stats.leaves, len(game.get_correct_moves()))
+        search_stats = stats.SearchStats()
+        game.choose_move(table=TranspositionTable(1 << 12), book=False, stats=search_stats)
+        self.assertGreater(search_stats.nodes, 0)
+        self.assertGreater(search_stats.leaves, 0)
+        self.assertGreater(search_stats.max_depth, 0)
+        self.assertIn("search", search_stats.phases)
+        self.assertIsNone(search_stats.profile_report())
+        self.assertEqual(json.loads(json.dumps(search_stats.as_dict()))["nodes"], search_stats.nodes)
+
+    def test_profile(self):
+        game = Reversi(4, lvl="Hard")
+        search_stats = stats.SearchStats(profile=True)
+        game.choose_move(table=None, stats=search_stats)
+        self.assertIn("endgame", search_stats.phases)
+        self.assertIn("_choose_move", search_stats.profile_report(5))
+
+
+class PerftTests(unittest.TestCase):
+    """Perft tests."""
+    def test_perft(self):
+        for backend in (Field, BitField):
+            self.assertEqual([perft.perft(Reversi(8, backend=backend), depth) for depth in range(1, 5)],
+                             [4, 12, 56, 244])
+            case = perft.run_case(8, "Extra", 2, backend, memory=False)
+            self.assertEqual(case["nodes"], perft.REFERENCE[8, "Extra", 2])
+            self.assertTrue(case["ok"])
+
+
+class GameFileTests(unittest.TestCase):
+    """Binary game format tests."""
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "games.dat")
+        self.games = []
+        rnd = Random(5)
+        for size, mode in ((4, "Classic"), (8, "Extra"), (30, "Extra")):
+            game = Reversi(size, WHITE, mode, "Ai", "Medium", backend=BitField)
+            for turn in range(size * 2):
+                free = game.field.frontier - set(game.get_correct_moves())
+                move, coords = game.make_move, rnd.choice(game.get_correct_moves())
+                if mode == "Extra" and turn % 3 == 1 and free and game.field.possibility_extra:
+                    move, coords = game.place_extra, rnd.choice(sorted(free))
+                if BitFieldTests.play(move, coords):
+                    break
+            self.games.append(game)
+
+    def tearDown(self):
+        os.remove(self.path)
+        os.rmdir(os.path.dirname(self.path))
+
+    def test_round_trip(self):
+        gamefile.write_games(self.path, self.games)
+        for replay in (True, False):
+            loaded = list(gamefile.read_games(self.path, replay))
+            self.assertEqual(len(loaded), len(self.games))
+            for game, copy in zip(self.games, loaded):
+                self.assertEqual(str(copy.field), str(game.field))
+                self.assertEqual((copy.current_player, copy.mode, copy.opponent, copy.lvl),
+                                 (game.current_player, game.mode, game.opponent, game.lvl))
+                self.assertEqual(copy.hash, game.hash)
+                self.assertEqual(copy.history if replay else (), game.history if replay else ())
+        self.assertEqual(gamefile.load(self.path).history, self.games[0].history)
+
+    def test_errors(self):
+        with open(self.path, "wb") as file:
+            file.write(b"garbage!!!")
+        with self.assertRaises(LoadError):
+            gamefile.load(self.path)
+        data = gamefile.FILE_HEADER.pack(gamefile.MAGIC, gamefile.VERSION, 1) + gamefile.dump_game(self.games[1])
+        with open(self.path, "wb") as file:
+            file.write(data[:-1])
+        with self.assertRaises(LoadError):
+            gamefile.load(self.path)
+        for version in (1, gamefile.VERSION + 1):
+            with open(self.path, "wb") as file:
+                file.write(data[:4] + bytes([version]) + data[5:])
+            if version in gamefile.READ_VERSIONS:
+                self.assertEqual(str(gamefile.load(self.path).field), str(self.games[1].field))
+            else:
+                self.assertRaises(LoadError, gamefile.load, self.path)
+        with self.assertRaises(SaveError):
+            gamefile.save(self.path, Reversi(lvl="Impossible"))
+
+
+class GameDatabaseTests(unittest.TestCase):
+    """Game database tests."""
+    def test_database(self):
+        games = []
+        rnd = Random(8)
+        for mode in ("Classic", "Extra", "Classic"):
+            game = Reversi(6, mode=mode, backend=BitField)
+            while game.try_move(rnd.choice(game.get_correct_moves())).status is not Status.GAME_OVER:
+                if mode == "Extra" and len(game.history) == 3:
+                    game.place_extra(next(coords for coords in game.field.frontier
+                                          if coords not in game.get_correct_moves()))
+            games.append(game)
+        with tempfile.TemporaryDirectory() as directory:
+            dat_path = os.path.join(directory, "games.dat")
+            text_path = os.path.join(directory, "games.txt")
+            gamefile.write_games(dat_path, games[:2])
+            with open(text_path, "w") as file:
+                moves = " ".join(f"{y},{x}" for y, x in (move.coords for move in games[2].history))
+                file.write(f"# comment\n\n6 Classic X {moves}\n6 Classic X 0,0\n6 Classic X 9,9\n")
+            with gamedb.GameDatabase(os.path.join(directory, "games.db")) as database:
+                self.assertEqual(database.import_dat(dat_path), (2, 0))
+                self.assertEqual(database.import_text(text_path), (1, 2))
+                self.assertEqual(len(database), 3)
+                rows = list(database.games())
+                self.assertEqual([row.mode for row in rows], ["Classic", "Extra", "Classic"])
+                self.assertTrue(all(row.finished for row in rows))
+                self.assertEqual((rows[1].black, rows[1].white), (games[1].field.black_count,
+                                                                  games[1].field.white_count))
+                self.assertEqual(len(list(database.games(mode="Extra", size=6))), 1)
+                self.assertRaises(ValueError, list, database.games(colour="X"))
+                start = database.find(Reversi(6).snapshot())
+                self.assertEqual(start, [(1, 0), (2, 0), (3, 0)])
+                first = Reversi(6)
+                first.make_move(games[0].history[0].coords)
+                self.assertIn((1, 1), database.find(first.snapshot(), symmetric=True))
+                for game_id, ply in database.find(first.snapshot(), symmetric=True):
+                    self.assertEqual(ply, 1)
+                loaded = database.load(2)
+                self.assertEqual((str(loaded.field), loaded.history), (str(games[1].field), games[1].history))
+                export = io.StringIO()
+                self.assertEqual(database.export_text(export, mode="Classic"), 2)
+                self.assertEqual(gamedb.parse_line(export.getvalue().splitlines()[0])[3],
+                                 [bitboard.index(move.coords, 6) for move in games[0].history])
+                database.export_dat(dat_path, mode="Extra")
+                broken_path = os.path.join(directory, "broken.dat")
+                gamefile.write_games(broken_path, games[:2])
+                with open(broken_path, "r+b") as file:
+                    file.truncate(os.path.getsize(broken_path) - 7)
+                self.assertEqual(database.import_dat(broken_path), (1, 1))
+                self.assertEqual(database.import_dat(os.path.join(directory, "missing.dat")), (0, 1))
+            self.assertEqual([str(game.field) for game in gamefile.read_games(dat_path)], [str(games[1].field)])
+        self.assertRaises(LoadError, gamedb.parse_line, "7 Classic X")
+        self.assertRaises(LoadError, gamedb.parse_line, "8 Classic X 9,9")
+
+
+class TranspositionTableTests(unittest.TestCase):
+    """Transposition table tests."""
+    def setUp(self):
+        self.table = TranspositionTable(TranspositionTable.ENTRY_SIZE * 4)
+
+    def test_get_and_put(self):
+        self.assertIsNone(self.table.get(1))
+        self.table.put(1, 3, EXACT, 10, 5)
+        self.assertEqual(self.table.get(1).score, 10)
+        self.assertIsNone(self.table.get(5))
+        self.assertEqual(self.table.stats()["collisions"], 1)
+        self.assertEqual(self.table.stats()["hits"], 1)
+
+    def test_replacement(self):
+        self.table.put(1, 5, EXACT, 10, 5)
+        self.table.put(5, 3, LOWER, 20, 6)
+        self.assertEqual(self.table.get(1).depth, 5)
+        self.table.put(5, 5, LOWER, 20, 6)
+        self.assertEqual(self.table.get(5).depth, 5)
+        self.table.new_search()
+        self.table.put(1, 1, EXACT, 10, 5)
+        self.assertEqual(self.table.get(1).depth, 1)
+
+    def test_same_score(self):
+        reversi = Reversi(4)
+        reversi.make_move(reversi.get_correct_moves()[0])
+        black, white, extra = reversi.field.masks()
+        plain = Engine(4, 16).search(white, black, extra, WHITE)
+        engine = Engine(4, 16, table=TranspositionTable(1 << 16))
+        self.assertEqual(engine.search(white, black, extra, WHITE)[0], plain[0])
+        self.assertGreater(engine.table.hits, 0)
+
+
+@unittest.skipUnless(QtWidgets, "PyQt5 is not installed")
+class FrameTests(unittest.TestCase):
+    """Game widget tests, they run without display."""
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        cls.app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        import reversi
+        cls.reversi = reversi
+
+    def test_shutdown(self):
+        frame = self.reversi.Frame(ai_delay=0)
+        frame.set_game(Reversi(30, opponent="Ai", lvl="Hard", backend=BitField))
+        frame.start_ai()
+        worker = frame._worker
+        frame.start_ai()
+        frame.shutdown()
+        self.assertTrue(worker.isFinished())
+        self.assertIsNone(frame._worker)
+
+    def test_redo_starts_ai(self):
+        frame = self.reversi.Frame(ai_delay=0)
+        frame.set_game(Reversi(6, opponent="Ai", lvl="Easy", backend=BitField))
+        frame.game.make_move(frame.game.get_correct_moves()[0])
+        frame.undo()
+        self.assertEqual((len(frame.game.history), frame._worker), (0, None))
+        frame.redo()
+        self.assertEqual(frame.game.current_player, WHITE)
+        self.assertIsNotNone(frame._worker)
+        frame.shutdown()
+
+    def test_loaded_game_starts_ai(self):
+        game = Reversi(6, opponent="Ai", lvl="Easy", backend=BitField)
+        frame = self.reversi.Frame(ai_delay=0)
+        frame.set_game(deepcopy(game))
+        self.assertIsNone(frame._worker)
+        game.make_move(game.get_correct_moves()[0])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "game.dat")
+            gamefile.save(path, game)
+            frame.set_game(gamefile.load(path))
+        self.assertIsNotNone(frame._worker)
+        frame.shutdown()
+
 
 if __name__ == '__main__':
     unittest.main()
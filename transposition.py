@@ -0,0 +1,85 @@
+"""Transposition table with bounded memory."""
+from collections import namedtuple
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+Entry = namedtuple("Entry", "key depth bound score move age")
+
+
+class TranspositionTable:
+    """Fixed-size table of search results keyed by Zobrist hash.
+
+    Slot of the key is key % capacity. Stored entry is replaced by an entry
+    of the same key, by an entry which is searched at least as deep or when
+    it was stored by one of the previous searches (see new_search).
+    """
+    ENTRY_SIZE = 160
+
+    def __init__(self, max_bytes=32 << 20):
+        self._capacity = max(1, max_bytes // self.ENTRY_SIZE)
+        self._slots = [None] * self._capacity
+        self._age = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.evictions = 0
+        self.rejections = 0
+
+    @property
+    def capacity(self):
+        """Get count of slots."""
+        return self._capacity
+
+    def __len__(self):
+        """Get count of stored entries."""
+        return sum(1 for entry in self._slots if entry is not None)
+
+    def new_search(self):
+        """Mark entries of previous searches as old ones."""
+        self._age += 1
+
+    def clear(self):
+        """Remove all entries and reset counters."""
+        self.__init__(self._capacity * self.ENTRY_SIZE)
+
+    def get(self, key):
+        """Get entry of the key or None."""
+        entry = self._slots[key % self._capacity]
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.key != key:
+            self.misses += 1
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, depth, bound, score, move):
+        """Store search result if replacement policy allows it."""
+        index = key % self._capacity
+        old = self._slots[index]
+        if old is not None and old.key != key:
+            if old.age == self._age and old.depth > depth:
+                self.rejections += 1
+                return
+            self.evictions += 1
+        self._slots[index] = Entry(key, depth, bound, score, move, self._age)
+        self.stores += 1
+
+    def stats(self):
+        """Get counters of the table."""
+        probes = self.hits + self.misses
+        return {
+            "capacity": self._capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "rejections": self.rejections,
+            "hit_rate": self.hits / probes if probes else 0.0,
+        }
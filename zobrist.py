@@ -0,0 +1,37 @@
+"""Zobrist keys for fields of every size.
+
+Keys are generated from a fixed seed, so hashes are the same in every
+process and can be stored in files.
+"""
+from collections import namedtuple
+from functools import lru_cache
+from random import Random
+import bitboard
+
+Keys = namedtuple("Keys", "black white extra flip side base")
+
+
+@lru_cache(maxsize=None)
+def keys(size):
+    """Get keys of the field size.
+
+    Every square has key for black, white and extra disk, flip[i] is black[i] ^ white[i].
+    Side is xored when white is to move, base is the hash of the empty field of the size.
+    """
+    rnd = Random(f"reversi-{size}")
+    squares = size * size
+    black = tuple(rnd.getrandbits(64) for _ in range(squares))
+    white = tuple(rnd.getrandbits(64) for _ in range(squares))
+    extra = tuple(rnd.getrandbits(64) for _ in range(squares))
+    flip = tuple(b ^ w for b, w in zip(black, white))
+    return Keys(black, white, extra, flip, rnd.getrandbits(64), rnd.getrandbits(64))
+
+
+def hash_masks(black, white, extra, size, white_to_move=False):
+    """Compute hash of the position from scratch."""
+    keys_ = keys(size)
+    result = keys_.base ^ (keys_.side if white_to_move else 0)
+    for mask, table in ((black, keys_.black), (white, keys_.white), (extra, keys_.extra)):
+        for i in bitboard.bits(mask):
+            result ^= table[i]
+    return result